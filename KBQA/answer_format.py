@@ -0,0 +1,62 @@
+# encoding=utf-8
+
+"""
+
+@file: answer_format.py
+
+@time: 2026/10/19
+
+@desc: 流式输出答案。分页得到的结果边取边写，不再拼接成一个完整的字符串。
+多个(实体, 属性)组合的问题按组合分行输出。
+
+"""
+
+ANSWER_SEP = u'、'
+
+
+def write_answer(pages, out, more=None, sep=ANSWER_SEP, page_size=None):
+    """
+    把分页的结果用sep连接后写入out，每写完一页立即flush
+    :param pages: 迭代每一页的值列表，见JenaFuseki.iter_pages
+    :param out: 文件对象，例如sys.stdout
+    :param more: 写完一页后、取下一页之前调用，返回False时不再取后面的页；为None时写出全部结果
+    :param sep:
+    :param page_size: 页大小，不足一页时是最后一页，不再调用more
+    :return: 写出的值的个数
+    """
+    count = 0
+    pages = iter(pages)
+    while True:
+        # TODO 先询问再取下一页，iter_pages在next时才发送下一页的查询
+        if count > 0 and more is not None and not more():
+            break
+        page = next(pages, None)
+        if page is None:
+            break
+        if count > 0:
+            out.write(sep)
+        out.write(sep.join(page))
+        out.flush()
+        count += len(page)
+        if page_size is not None and len(page) < page_size:
+            break
+    if count > 0:
+        out.write('\n')
+    return count
+
+
+def write_groups(groups, out, sep=ANSWER_SEP, unknown=u'不知道'):
+    """
+    输出合并查询按(实体, 属性)分组的答案，每组一行，例如"水煮鱼的主料：草鱼"
+    :param groups: 见JenaFuseki.group_values
+    :param out:
+    :param sep:
+    :param unknown: 某一组没有答案时输出的内容
+    :return: 写出的值的个数
+    """
+    count = 0
+    for group in groups:
+        out.write(u'{}的{}：{}\n'.format(group['entity'], group['property'], sep.join(group['answer']) or unknown))
+        count += len(group['answer'])
+    out.flush()
+    return count
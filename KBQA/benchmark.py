@@ -0,0 +1,211 @@
+# encoding=utf-8
+
+"""
+
+@file: benchmark.py
+
+@time: 2026/10/19
+
+@desc: KBQA端到端基准测试。
+
+用外部词典中的每个实体和question_temp中的每种问法组合生成问题集，
+依次经过分词(tag)、规则匹配(match)、SPARQL生成(render)、Fuseki查询(query)、结果解析(parse)，
+统计每个阶段的吞吐量和p50/p95/p99延迟。可以保存为基线，并与已保存的基线比较。
+
+用法：
+python benchmark.py --save-baseline ./benchmarks/baseline.json
+python benchmark.py --baseline ./benchmarks/baseline.json
+
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import jena_sparql_endpoint
+import local_fuseki
+import question2sparql
+import question_temp
+
+STAGES = ['tag', 'match', 'render', 'query', 'parse', 'total']
+
+
+# TODO 问题集的生成在question_temp中，与问法定义在一起，问答服务预热时也使用
+load_entities = question_temp.load_entities
+generate_corpus = question_temp.generate_corpus
+
+
+def percentile(sorted_values, p):
+    """
+    最近秩法求百分位数
+    :param sorted_values: 已排序的列表
+    :param p: 0~100
+    :return:
+    """
+    if len(sorted_values) == 0:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples):
+    """
+    :param samples: {stage: [seconds, ...]}
+    :return: {stage: {count, total_s, throughput, p50_ms, p95_ms, p99_ms}}
+    """
+    summary = dict()
+    for stage in STAGES:
+        values = sorted(samples.get(stage, []))
+        total = sum(values)
+        summary[stage] = {
+            'count': len(values),
+            'total_s': total,
+            'throughput': len(values) / total if total > 0 else 0.0,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    return summary
+
+
+def run(corpus, q2s, fuseki, repeat=1):
+    """
+    逐个问题运行问答流程并记录各阶段耗时
+    :return: ({stage: [seconds, ...]}, 统计信息)
+    """
+    samples = {stage: list() for stage in STAGES}
+    stats = {'questions': 0, 'matched': 0, 'answered': 0}
+    clock = time.perf_counter
+
+    for _ in range(repeat):
+        for question in corpus:
+            stats['questions'] += 1
+            t0 = clock()
+            words = q2s.tw.get_word_objects(question)
+            t1 = clock()
+            matched = [(rule, rule.match(words)) for rule in q2s.rules]
+            t2 = clock()
+            queries_dict = dict()
+            for rule, matches in matched:
+                if len(matches) == 0:
+                    continue
+                query = rule.render(matches)
+                if query is not None:
+                    queries_dict[rule.condition_num] = query
+            query = q2s.pick_query(queries_dict)
+            t3 = clock()
+            samples['tag'].append(t1 - t0)
+            samples['match'].append(t2 - t1)
+            samples['render'].append(t3 - t2)
+
+            if query is None:
+                samples['total'].append(t3 - t0)
+                continue
+            stats['matched'] += 1
+
+            result = fuseki.get_sparql_result(query)
+            t4 = clock()
+            value = fuseki.get_sparql_result_value(result)
+            t5 = clock()
+            samples['query'].append(t4 - t3)
+            samples['parse'].append(t5 - t4)
+            samples['total'].append(t5 - t0)
+            if value:
+                stats['answered'] += 1
+
+    return samples, stats
+
+
+def compare(report, baseline, tolerance):
+    """
+    与基线比较，p95变慢或吞吐量下降超过tolerance时视为退化
+    :return: 退化的阶段列表
+    """
+    regressions = list()
+    print('\n{:<8}{:>14}{:>14}{:>14}{:>16}'.format('stage', 'p50', 'p95', 'p99', 'throughput'))
+    for stage in STAGES:
+        cur = report['stages'][stage]
+        old = baseline['stages'].get(stage)
+        if old is None or old['count'] == 0 or cur['count'] == 0:
+            continue
+        cells = list()
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput'):
+            change = (cur[key] - old[key]) / old[key] if old[key] > 0 else 0.0
+            cells.append('{:+.1%}'.format(change))
+        print('{:<8}{:>14}{:>14}{:>14}{:>16}'.format(stage, *cells))
+        if old['p95_ms'] > 0 and (cur['p95_ms'] - old['p95_ms']) / old['p95_ms'] > tolerance:
+            regressions.append(stage)
+        elif old['throughput'] > 0 and (old['throughput'] - cur['throughput']) / old['throughput'] > tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def print_report(report):
+    meta = report['meta']
+    print('questions: {questions}, matched: {matched}, answered: {answered}, wall: {wall_s:.2f}s'.format(**meta))
+    print('\n{:<8}{:>10}{:>14}{:>12}{:>12}{:>12}'.format('stage', 'count', 'ops/s', 'p50(ms)', 'p95(ms)', 'p99(ms)'))
+    for stage in STAGES:
+        s = report['stages'][stage]
+        print('{:<8}{:>10}{:>14.1f}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+            stage, s['count'], s['throughput'], s['p50_ms'], s['p95_ms'], s['p99_ms']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='KBQA端到端基准测试')
+    parser.add_argument('--dict', action='append', default=None, help='外部词典，可以指定多次')
+    parser.add_argument('--nt', default='./data/aifoodtime_ntriples.nt', help='本地Fuseki替身加载的三元组')
+    parser.add_argument('--endpoint', default=None, help='使用真实的Fuseki服务，而不是本地替身')
+    parser.add_argument('--delay', type=float, default=0.0, help='本地替身每次查询的额外延迟(秒)')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=None, help='只使用问题集的前N个问题')
+    parser.add_argument('--save-corpus', default=None)
+    parser.add_argument('--output', default=None, help='把结果写入JSON文件')
+    parser.add_argument('--save-baseline', default=None)
+    parser.add_argument('--baseline', default=None, help='与已保存的基线比较')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    dict_paths = args.dict or ['./external_dict/entities_list.txt']
+    corpus = question_temp.generate_corpus(dict_paths)
+    if args.limit is not None:
+        corpus = corpus[:args.limit]
+    if args.save_corpus is not None:
+        with open(args.save_corpus, 'w', encoding='utf-8') as f:
+            for q in corpus:
+                f.write(q + '\n')
+
+    q2s = question2sparql.Question2Sparql(dict_paths)
+    if args.endpoint is None:
+        server = local_fuseki.start_local_fuseki([args.nt], delay=args.delay)
+        endpoint = server.url
+    else:
+        endpoint = args.endpoint
+    fuseki = jena_sparql_endpoint.JenaFuseki(endpoint)
+
+    start = time.perf_counter()
+    samples, stats = run(corpus, q2s, fuseki, args.repeat)
+    wall = time.perf_counter() - start
+
+    stats['wall_s'] = wall
+    stats['endpoint'] = 'local' if args.endpoint is None else args.endpoint
+    stats['python'] = platform.python_version()
+    stats['time'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    report = {'meta': stats, 'stages': summarize(samples)}
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=4)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print('\nregressions: {}'.format(', '.join(regressions)))
+            sys.exit(1)
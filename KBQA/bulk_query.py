@@ -0,0 +1,221 @@
+# encoding=utf-8
+
+"""
+
+@file: bulk_query.py
+
+@time: 2026/10/19
+
+@desc: 批量问答，用于离线评测和缓存预热。
+
+从文件或标准输入逐行读取问题（纯文本，或带question字段的JSON），分词和规则匹配在进程池中并行，
+SPARQL查询在线程池中以有限的并发发送，结果按输入顺序写为JSONL：
+{"question", "rule", "query", "answer", "timings": {"tag", "match", "render", "query", "parse", "total"}}
+各阶段之间只保留固定大小的窗口，内存占用与输入的问题数无关。运行时在标准错误输出中显示每秒处理的问题数。
+
+用法：
+python bulk_query.py --input questions.txt --output answers.jsonl
+cat questions.txt | python bulk_query.py --endpoint http://localhost:3030/cookbook/query > answers.jsonl
+
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import jena_sparql_endpoint
+import local_fuseki
+import pipeline_metrics
+import question2sparql
+
+
+class StageTimer:
+    """
+    记录一个问题各阶段耗时的钩子，接口与PipelineMetrics相同
+    """
+    def __init__(self):
+        self.timings = dict()
+
+    def on_stage(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def on_rule(self, name, hit):
+        pass
+
+
+# TODO 进程池中每个进程的Question2Sparql
+_q2s = None
+
+
+def init_tagger(dict_paths):
+    global _q2s
+    _q2s = question2sparql.Question2Sparql(dict_paths, hooks=StageTimer())
+
+
+def tag_batch(questions):
+    """
+    对一批问题做分词、规则匹配和查询生成，在子进程中运行
+    :return: [(question, query, rule_name, timings), ...]
+    """
+    results = list()
+    for question in questions:
+        _q2s.hooks.timings = dict()
+        query, rule = _q2s.get_sparql_rule(question)
+        results.append((question, query, pipeline_metrics.rule_name(rule) if rule is not None else None,
+                        _q2s.hooks.timings))
+    return results
+
+
+def read_questions(f):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('{'):
+            yield json.loads(line)['question']
+        else:
+            yield line
+
+
+def batches(iterable, size):
+    batch = list()
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = list()
+    if batch:
+        yield batch
+
+
+class BulkAnswerer:
+    def __init__(self, dict_paths, endpoint, tag_workers=None, concurrency=8, batch_size=32, window=64):
+        """
+        :param dict_paths: 外部词典
+        :param endpoint: 查询地址或地址列表，见JenaFuseki
+        :param tag_workers: 分词进程数，为0时在当前进程中分词
+        :param concurrency: 同时进行的SPARQL查询数
+        :param batch_size: 每次提交给分词进程的问题数
+        :param window: 每个阶段最多同时进行的批数
+        """
+        self.dict_paths = dict_paths
+        self.endpoint = endpoint
+        self.tag_workers = tag_workers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.window = window
+        self._local = threading.local()
+
+    def fuseki(self):
+        # TODO SPARQLWrapper的连接对象不是线程安全的，每个线程使用自己的JenaFuseki
+        fuseki = getattr(self._local, 'fuseki', None)
+        if fuseki is None:
+            fuseki = self._local.fuseki = jena_sparql_endpoint.JenaFuseki(self.endpoint)
+        return fuseki
+
+    def answer(self, question, query, rule, timings):
+        record = {'question': question, 'rule': rule, 'query': query, 'answer': None}
+        if query is not None:
+            fuseki = self.fuseki()
+            try:
+                t0 = time.perf_counter()
+                result = fuseki.get_sparql_result(query)
+                t1 = time.perf_counter()
+                record['answer'] = fuseki.get_sparql_result_value(result)
+                timings['query'] = t1 - t0
+                timings['parse'] = time.perf_counter() - t1
+            except Exception as e:
+                record['error'] = '{}: {}'.format(type(e).__name__, e)
+        timings['total'] = sum(timings.values())
+        record['timings'] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+        return record
+
+    def answer_batch(self, tagged, pool):
+        return [pool.submit(self.answer, *item) for item in tagged]
+
+    def run(self, questions):
+        """
+        :param questions: 问题的迭代器
+        :return: 按输入顺序迭代结果
+        """
+        if self.tag_workers == 0:
+            init_tagger(self.dict_paths)
+            tag_pool = None
+        else:
+            tag_pool = ProcessPoolExecutor(self.tag_workers, initializer=init_tagger,
+                                           initargs=(self.dict_paths,))
+        query_pool = ThreadPoolExecutor(self.concurrency)
+        tagging = deque()
+        querying = deque()
+        try:
+            for batch in batches(questions, self.batch_size):
+                if tag_pool is None:
+                    querying.append(self.answer_batch(tag_batch(batch), query_pool))
+                else:
+                    tagging.append(tag_pool.submit(tag_batch, batch))
+                    if len(tagging) >= self.window:
+                        querying.append(self.answer_batch(tagging.popleft().result(), query_pool))
+                while len(querying) >= self.window:
+                    for future in querying.popleft():
+                        yield future.result()
+            while tagging:
+                querying.append(self.answer_batch(tagging.popleft().result(), query_pool))
+            while querying:
+                for future in querying.popleft():
+                    yield future.result()
+        finally:
+            query_pool.shutdown(wait=False)
+            if tag_pool is not None:
+                tag_pool.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量问答，输出JSONL')
+    parser.add_argument('--input', default='-', help='问题文件，每行一个问题或{"question": ...}，默认为标准输入')
+    parser.add_argument('--output', default='-', help='默认为标准输出')
+    parser.add_argument('--dict', action='append', default=None, help='外部词典，可以指定多次')
+    parser.add_argument('--endpoint', action='append', default=None,
+                        help='Fuseki的查询地址，可以指定多次；不指定时启动本地替身')
+    parser.add_argument('--nt', default='./data/aifoodtime_ntriples.nt', help='本地Fuseki替身加载的三元组')
+    parser.add_argument('--tag-workers', type=int, default=None, help='分词进程数，默认为CPU个数，0表示不用进程池')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时进行的SPARQL查询数')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--window', type=int, default=64)
+    parser.add_argument('--progress', type=float, default=2.0, help='显示进度的间隔(秒)，0表示不显示')
+    args = parser.parse_args()
+
+    if args.endpoint is None:
+        server = local_fuseki.start_local_fuseki([args.nt])
+        endpoint = server.url
+    else:
+        endpoint = args.endpoint if len(args.endpoint) > 1 else args.endpoint[0]
+
+    answerer = BulkAnswerer(args.dict or ['./external_dict/entities_list.txt'], endpoint,
+                            args.tag_workers if args.tag_workers is not None else os.cpu_count(),
+                            args.concurrency, args.batch_size, args.window)
+    fin = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    fout = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    count = unmatched = errors = 0
+    start = last = time.perf_counter()
+    try:
+        for record in answerer.run(read_questions(fin)):
+            fout.write(json.dumps(record, ensure_ascii=False) + '\n')
+            count += 1
+            unmatched += record['query'] is None
+            errors += 'error' in record
+            now = time.perf_counter()
+            if args.progress > 0 and now - last >= args.progress:
+                print('{} questions, {:.1f} q/s'.format(count, count / (now - start)), file=sys.stderr)
+                last = now
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+    elapsed = time.perf_counter() - start
+    print('{} questions, {} unmatched, {} errors, {:.1f}s, {:.1f} q/s'.format(
+        count, unmatched, errors, elapsed, count / elapsed if elapsed > 0 else 0.0), file=sys.stderr)
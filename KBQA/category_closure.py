@@ -0,0 +1,165 @@
+# encoding=utf-8
+
+"""
+
+@file: category_closure.py
+
+@time: 2026/10/19
+
+@desc: 菜品大类的层次结构和预先计算的传递闭包。
+
+大类的三元组为<大类> :属于 "名称"，名称也是大类时表示子类，例如川菜 :属于 "水煮类"，水煮类 :属于 "水煮鱼类"。
+从根大类开始深度优先遍历，按先序把菜品排成一个数组leaves，每个大类记录它的所有后代菜品在leaves中的区间[lo, hi)，
+"川菜包括哪些菜"只需取leaves[lo:hi]，不需要向Fuseki发送:属于+的属性路径查询。
+有多个上级的大类在每个上级下各展开一次（大类的数量很少），一个菜品属于多个大类时同样重复出现，取区间时去重。
+同时保存祖先表（大类 -> 所有上级大类），增量更新时用于清除上级大类的缓存答案，见kg_update.py。
+
+"""
+import re
+from collections import OrderedDict
+
+from local_fuseki import URI, LITERAL, TripleStore
+
+NAMESPACE = 'http://kg.course/ai-food-time/'
+NAME = (URI, NAMESPACE + '名称')
+BELONG = (URI, NAMESPACE + '属于')
+
+# TODO question_temp为"某个大类包括哪些菜"生成的单个大类的查询
+CATEGORY_QUERY_RE = re.compile(r"SELECT DISTINCT \?x WHERE \{\s*\?s :名称 '((?:[^'\\]|\\.)*)'\.\s*"
+                               r"\?s :属于 \?x\.\s*\}\s*$")
+
+
+def category_members(store):
+    """
+    :param store: local_fuseki.TripleStore
+    :return: OrderedDict {大类名称: [成员名称, ...]}，成员可以是菜品或子类
+    """
+    members = OrderedDict()
+    for s, _, o in store.match(None, BELONG, None):
+        if o[0] != LITERAL:
+            continue
+        for _, _, name in store.match(s, NAME, None):
+            members.setdefault(name[1], list()).append(o[1])
+    return members
+
+
+def parse_category_query(query):
+    """
+    :return: 查询某个大类包括哪些菜时返回大类名称，否则为None
+    """
+    if query is None:
+        return None
+    m = CATEGORY_QUERY_RE.search(query)
+    return m.group(1) if m is not None else None
+
+
+class CategoryHierarchy:
+    def __init__(self, members=None):
+        """
+        :param members: {大类名称: [成员名称, ...]}
+        """
+        # TODO (leaves, intervals, ancestors)，重建时整体替换，读取时只取一次
+        self.labels = (list(), dict(), dict())
+        self.rebuild(members or dict())
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(category_members(store))
+
+    @classmethod
+    def from_nt(cls, nt_paths):
+        store = TripleStore()
+        for p in nt_paths:
+            store.load(p)
+        return cls.from_store(store)
+
+    def rebuild(self, members):
+        """
+        计算区间标号和祖先表
+        :param members: {大类名称: [成员名称, ...]}
+        """
+        children = {c: [m for m in ms if m in members and m != c] for c, ms in members.items()}
+        dishes = {c: [m for m in ms if m not in members] for c, ms in members.items()}
+        has_parent = set(m for cs in children.values() for m in cs)
+        leaves = list()
+        intervals = dict()
+        ancestors = {c: set() for c in members}
+
+        # TODO 先从根大类开始；只在环中的大类（没有根）之后单独作为根
+        for root in [c for c in members if c not in has_parent] + list(members):
+            if root in intervals:
+                continue
+            path = [root]
+            starts = [len(leaves)]
+            leaves.extend(dishes[root])
+            stack = [iter(children[root])]
+            while stack:
+                child = next(stack[-1], None)
+                if child is None:
+                    c = path.pop()
+                    lo = starts.pop()
+                    stack.pop()
+                    # TODO 第一次展开时的区间，其它上级下的展开内容相同
+                    intervals.setdefault(c, (lo, len(leaves)))
+                    continue
+                if child in path:
+                    # TODO 环
+                    continue
+                ancestors[child].update(path)
+                path.append(child)
+                starts.append(len(leaves))
+                leaves.extend(dishes[child])
+                stack.append(iter(children[child]))
+
+        self.labels = (leaves, intervals, {c: tuple(a) for c, a in ancestors.items()})
+
+    def update(self, store):
+        """
+        知识图谱增量更新后由三元组重建
+        """
+        self.rebuild(category_members(store))
+
+    def is_category(self, name):
+        return name in self.labels[1]
+
+    def dishes(self, name):
+        """
+        大类的所有后代菜品，包括各级子类中的菜品
+        :return: [菜品, ...]，不是大类时为None
+        """
+        leaves, intervals, _ = self.labels
+        span = intervals.get(name)
+        if span is None:
+            return None
+        return list(dict.fromkeys(leaves[span[0]:span[1]]))
+
+    def ancestors_of(self, names):
+        """
+        :return: 这些大类的所有上级大类
+        """
+        ancestors = self.labels[2]
+        found = set()
+        for name in names:
+            found.update(ancestors.get(name, ()))
+        return found
+
+    def answer(self, query):
+        """
+        用区间回答某个大类包括哪些菜的查询
+        :return: [菜品, ...]，不是这类查询或不是大类时为None
+        """
+        name = parse_category_query(query)
+        return self.dishes(name) if name is not None else None
+
+    def stats(self):
+        leaves, intervals, ancestors = self.labels
+        return {'categories': len(intervals), 'leaves': len(leaves),
+                'nested': sum(1 for a in ancestors.values() if a),
+                'max_depth': max((len(a) for a in ancestors.values()), default=0) + 1 if intervals else 0}
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    hierarchy = CategoryHierarchy.from_nt(['./data/aifoodtime_ntriples.nt'])
+    print(hierarchy.stats())
+    print(hierarchy.dishes('红烧肉类'))
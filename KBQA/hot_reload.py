@@ -0,0 +1,172 @@
+# encoding=utf-8
+
+"""
+
+@file: hot_reload.py
+
+@time: 2026/10/19
+
+@desc: 热加载外部词典、问题规则和补全索引，不需要重启服务。
+
+修改external_dict中的词典或data/question_rules.json后，在调用的线程（或监视线程）中建立新的分词器、
+规则和补全前缀树，完成后整体替换，并清空答案缓存；建立期间的请求仍然用旧的状态回答，不会失败。
+报告中给出各部分的耗时。
+
+用法：
++ qa_server.py中POST /reload，或者--reload-interval秒检查一次文件的修改时间
++ --workers时向主进程发送SIGHUP：主进程重新加载后再替换工作进程，见prefork.py
+
+知识图谱本身的变化不需要重新加载，见kg_update.py；重新加载时把增量更新以来的词语变化（KGUpdater.replay）
+重放到新的分词器和补全索引上再替换，不会丢失/update加入或删除的实体。
+
+"""
+import json
+import os
+import threading
+import time
+
+import kg_update
+import question_suggest
+import question_temp
+
+
+def file_stamp(path):
+    """
+    :return: (修改时间, 大小)，文件不存在时为None
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class HotReloader:
+    def __init__(self, service, suggester=None, updater=None, on_swap=None):
+        """
+        :param service: qa_service.QAService
+        :param suggester: 当前的question_suggest.QuestionSuggester，为None时不重建补全索引
+        :param updater: kg_update.KGUpdater，替换后改用新的分词器和补全索引
+        :param on_swap: 补全索引替换后的回调，参数为新的QuestionSuggester
+        """
+        self.service = service
+        self.suggester = suggester
+        self.updater = updater
+        self.on_swap = on_swap
+        # TODO 与增量更新互斥，避免更新加入的词语只进入旧的分词器
+        self.lock = threading.Lock()
+        self.last_report = None
+        self._stamps = self.stamps()
+
+    def watched_paths(self, dict_paths=None):
+        paths = list(self.service.dict_paths if dict_paths is None else dict_paths) + [question_temp.RULES_PATH]
+        if self.suggester is not None and self.suggester.vizdata_path is not None:
+            paths.append(self.suggester.vizdata_path)
+        return paths
+
+    def stamps(self, dict_paths=None):
+        return {p: file_stamp(p) for p in self.watched_paths(dict_paths)}
+
+    def changed(self):
+        """
+        :return: 上次加载以后修改过的文件
+        """
+        stamps = self.stamps()
+        return sorted(p for p in stamps if stamps[p] != self._stamps.get(p))
+
+    def reload(self, dict_paths=None):
+        """
+        重新加载词典、规则和补全索引，出错时保留旧的状态并抛出异常
+        :param dict_paths: 外部词典，为None时使用原来的词典
+        :return: 报告
+        """
+        with self.lock:
+            start = time.perf_counter()
+            if dict_paths is None:
+                dict_paths = self.service.dict_paths
+            # TODO 加载之前记录，加载期间再次修改的文件在下一次检查时重新加载
+            stamps = self.stamps(dict_paths)
+
+            suggester = None
+            suggester_s = 0.0
+            if self.suggester is not None:
+                t = time.perf_counter()
+                suggester = question_suggest.QuestionSuggester(dict_paths, self.suggester.vizdata_path,
+                                                               self.suggester.max_cache)
+                suggester_s = time.perf_counter() - t
+
+            replayed = [0]
+
+            def prepare(state):
+                if self.updater is not None:
+                    replayed[0] = self.updater.replay(state.tagger, suggester)
+
+            report = self.service.reload(dict_paths, prepare)
+            if suggester is not None:
+                self.suggester = suggester
+                if self.on_swap is not None:
+                    self.on_swap(suggester)
+            if self.updater is not None:
+                self.updater.tagger = self.service.q2s.tw
+                # TODO 更换词典后，增量更新的词语写入新的词典
+                self.updater.dict_path = kg_update.writable_dict(dict_paths)
+                if suggester is not None:
+                    self.updater.suggester = suggester
+
+            self._stamps = stamps
+            report['suggester_ms'] = round(suggester_s * 1000, 3)
+            report['replayed'] = replayed[0]
+            report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.last_report = report
+        return report
+
+    def try_reload(self, changed=None):
+        """
+        重新加载并输出报告，出错时输出错误并记录文件的修改时间，文件再次修改后才重试
+        :param changed: 修改过的文件，写入报告
+        :return: 报告，出错时为None
+        """
+        try:
+            report = self.reload()
+        except Exception as e:
+            # TODO 例如规则文件有语法错误，继续使用旧的状态
+            self._stamps = self.stamps()
+            print('reload failed: {}: {}'.format(type(e).__name__, e), flush=True)
+            return None
+        if changed is not None:
+            report['files'] = changed
+        print('reload: {}'.format(json.dumps(report, ensure_ascii=False)), flush=True)
+        return report
+
+    def watch(self, interval=5.0, notify=None):
+        """
+        启动监视线程，每隔interval秒检查文件的修改时间，有变化时重新加载
+        :param notify: 不为None时只调用notify()，由调用方重新加载（prefork的主进程向自己发送SIGHUP）
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                changed = self.changed()
+                if not changed:
+                    continue
+                if notify is not None:
+                    notify()
+                else:
+                    self.try_reload(changed)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    import local_fuseki
+    import qa_service
+
+    server = local_fuseki.start_local_fuseki(['./data/aifoodtime_ntriples.nt'])
+    service = qa_service.QAService(['./external_dict/entities_list.txt'], server.url)
+    reloader = HotReloader(service, question_suggest.QuestionSuggester(service.dict_paths))
+    print(service.answer('元宝红烧肉的主料是什么？'))
+    print(reloader.reload())
+    print(service.answer('元宝红烧肉的主料是什么？'))
@@ -14,18 +14,369 @@
 
 """
 
-from SPARQLWrapper import SPARQLWrapper, JSON
+import codecs
+import json
+import time
+
+from SPARQLWrapper import SPARQLWrapper, JSON, POST
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
 from collections import OrderedDict
 
+import sparql_pool
+
+# TODO 分页查询模板，拼接在SELECT查询之后
+SPARQL_PAGE_TEM = u"ORDER BY {order}\n" + \
+    u"LIMIT {limit}\n" + \
+    u"OFFSET {offset}\n"
+
+SPARQL_KEYSET_TEM = u"ORDER BY {order}\n" + \
+    u"LIMIT {limit}\n"
+
+SPARQL_KEYSET_FILTER_TEM = u"FILTER(STR({var}) > '{after}')\n"
+
+# TODO 多个(实体, 属性)组合的合并查询（见question_temp.has_basic_food_info_question）返回的变量，结果按组合分组
+GROUP_VARS = ('food', 'p', 'x')
+
+
+def paginate_query(query, page_size, offset=0, var=u'?x'):
+    """
+    LIMIT/OFFSET分页，按var排序保证每页结果稳定
+    :param query: question_temp生成的SELECT查询
+    :param page_size:
+    :param offset:
+    :param var:
+    :return:
+    """
+    return query + SPARQL_PAGE_TEM.format(order=var, limit=page_size, offset=offset)
+
+
+def keyset_query(query, page_size, after=None, var=u'?x'):
+    """
+    键集分页，只取var大于上一页最后一个值的结果，翻页的代价与页码无关
+    :param query: question_temp生成的SELECT查询
+    :param page_size:
+    :param after: 上一页最后一行的var值，第一页为None
+    :param var:
+    :return:
+    """
+    if after is not None:
+        end = query.rfind('}')
+        after = after.replace('\\', '\\\\').replace("'", "\\'")
+        query = query[:end] + SPARQL_KEYSET_FILTER_TEM.format(var=var, after=after) + query[end:]
+    return query + SPARQL_KEYSET_TEM.format(order=var, limit=page_size)
+
+
+class SparqlJsonStream:
+    """
+    从响应的字节流中流式解析SPARQL JSON结果，不生成完整的结果字典。
+
+    逐个解码bindings数组中的元素，已解析的部分会从缓冲区中丢弃，内存占用与单行结果的大小有关，
+    与结果行数无关。head需要出现在results之前（Fuseki的输出即如此），否则会先缓存bindings。
+    """
+    def __init__(self, stream, chunk_size=65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.vars = None
+        self.boolean = None
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._consumed = False
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buf += self._utf8.decode(b'', final=True)
+            return False
+        # TODO 丢弃已经解析过的部分
+        if self._pos > self.chunk_size:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        self._buf += self._utf8.decode(chunk)
+        return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError('unexpected end of SPARQL JSON result')
+
+    def _expect(self, ch):
+        if self._peek() != ch:
+            raise ValueError('expected {!r} at position {}'.format(ch, self._pos))
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # TODO 值正好在缓冲区末尾时可能被截断（例如true/数字），读入更多再确认
+                if end == len(self._buf) and not self._eof:
+                    raise ValueError
+                self._pos = end
+                return value
+            except ValueError:
+                if not self._fill():
+                    value, self._pos = self._decoder.raw_decode(self._buf, self._pos)
+                    return value
+
+    def _members(self):
+        """
+        迭代对象的键，调用方需要在每次迭代中消费对应的值
+        """
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key
+            ch = self._peek()
+            self._pos += 1
+            if ch == '}':
+                return
+            if ch != ',':
+                raise ValueError('expected , or }} at position {}'.format(self._pos - 1))
+
+    def _bindings(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._value()
+            ch = self._peek()
+            self._pos += 1
+            if ch == ']':
+                return
+            if ch != ',':
+                raise ValueError('expected , or ] at position {}'.format(self._pos - 1))
+
+    def bindings(self):
+        """
+        迭代每一行的binding字典 {var: {'type':..., 'value':...}}
+        """
+        if self._consumed:
+            raise RuntimeError('SPARQL result stream can only be iterated once')
+        self._consumed = True
+        pending = list()
+        try:
+            for key in self._members():
+                if key == 'head':
+                    head = self._value()
+                    self.vars = head.get('vars', list())
+                    for b in pending:
+                        yield b
+                    pending = list()
+                elif key == 'boolean':
+                    self.boolean = self._value()
+                elif key == 'results':
+                    for rkey in self._members():
+                        if rkey != 'bindings':
+                            self._value()
+                            continue
+                        for b in self._bindings():
+                            if self.vars is None:
+                                pending.append(b)
+                            else:
+                                yield b
+                else:
+                    self._value()
+            for b in pending:
+                yield b
+        finally:
+            close = getattr(self.stream, 'close', None)
+            if close is not None:
+                close()
+
+    def rows(self):
+        """
+        迭代每一行的值，按head中变量的顺序组成元组，未绑定的变量为None
+        """
+        for b in self.bindings():
+            yield tuple(b[h]['value'] if h in b else None for h in self.vars)
+
+    def values(self):
+        """
+        按行依次迭代所有已绑定的值，顺序与get_sparql_result_value相同
+        """
+        for b in self.bindings():
+            for h in self.vars:
+                if h in b:
+                    yield b[h]['value']
+
+    def columns(self):
+        """
+        列式结果 {var: [value, ...]}，未绑定的变量为None
+        """
+        cols = None
+        for b in self.bindings():
+            if cols is None:
+                cols = OrderedDict((h, list()) for h in self.vars)
+            for h, col in cols.items():
+                v = b.get(h)
+                col.append(v['value'] if v is not None else None)
+        if cols is None:
+            cols = OrderedDict((h, list()) for h in (self.vars or []))
+        return cols
+
+
+def update_endpoint(endpoint_url):
+    """
+    Fuseki数据集的查询地址为.../query，更新地址为.../update
+    """
+    if endpoint_url.endswith('/query'):
+        return endpoint_url[:-len('query')] + 'update'
+    return endpoint_url
+
+
+def close_response(response):
+    close = getattr(response, 'close', None)
+    if close is not None:
+        close()
+
 
 class JenaFuseki:
-    def __init__(self, endpoint_url='http://localhost:3030/cookbook/query'):
-        self.sparql_conn = SPARQLWrapper(endpoint_url)
+    def __init__(self, endpoint_url='http://localhost:3030/cookbook/query', hooks=None, **pool_options):
+        """
+        :param endpoint_url: 查询地址，传入多个地址的列表时在副本之间负载均衡，见sparql_pool.py
+        :param hooks:
+        :param pool_options: 传给sparql_pool.ReplicaPool的参数
+        """
+        self.endpoint_url = endpoint_url
+        if isinstance(endpoint_url, (list, tuple)):
+            self.pool = sparql_pool.ReplicaPool(endpoint_url, **pool_options)
+            self.sparql_conn = None
+        else:
+            self.pool = None
+            self.sparql_conn = SPARQLWrapper(endpoint_url)
+        # TODO 计时钩子，见pipeline_metrics.py，为None时不计时
+        self.hooks = hooks
+
+    def _query(self, query, read):
+        """
+        发送查询，read从QueryResult中读取结果。有多个副本时每个请求使用单独的连接对象
+        """
+        if self.pool is None:
+            self.sparql_conn.setQuery(query)
+            self.sparql_conn.setReturnFormat(JSON)
+            return read(self.sparql_conn.query())
+
+        def send(url):
+            conn = SPARQLWrapper(url)
+            conn.setQuery(query)
+            conn.setReturnFormat(JSON)
+            return read(conn.query())
+        return self.pool.execute(send, client_errors=(QueryBadFormed,), discard=close_response)
+
+    def update(self, update):
+        """
+        发送SPARQL UPDATE（例如INSERT DATA/DELETE DATA），有多个副本时依次发给每个副本
+        :param update:
+        :return:
+        """
+        urls = [r.url for r in self.pool.replicas] if self.pool is not None else [self.endpoint_url]
+        for url in urls:
+            conn = SPARQLWrapper(url, updateEndpoint=update_endpoint(url))
+            conn.setMethod(POST)
+            conn.setQuery(update)
+            close_response(conn.query().response)
 
     def get_sparql_result(self, query):
-        self.sparql_conn.setQuery(query)
-        self.sparql_conn.setReturnFormat(JSON)
-        return self.sparql_conn.query().convert()
+        if self.hooks is not None:
+            start = time.perf_counter()
+        result = self._query(query, lambda r: r.convert())
+        if self.hooks is not None:
+            self.hooks.on_stage('query', time.perf_counter() - start)
+        return result
+
+    def get_sparql_result_stream(self, query, chunk_size=65536):
+        """
+        发送查询并返回流式的结果解析器，响应体在迭代时才读取。ASK查询的结果在迭代结束后见stream.boolean
+        :param query:
+        :param chunk_size:
+        :return: SparqlJsonStream
+        """
+        if self.hooks is not None:
+            start = time.perf_counter()
+        response = self._query(query, lambda r: r.response)
+        if self.hooks is not None:
+            self.hooks.on_stage('query', time.perf_counter() - start)
+        return SparqlJsonStream(response, chunk_size)
+
+    def iter_result_rows(self, query):
+        """
+        流式返回每一行结果的元组
+        :param query:
+        :return:
+        """
+        return self.get_sparql_result_stream(query).rows()
+
+    def iter_result_values(self, query):
+        """
+        流式返回所有结果的值，适合只有一个变量的查询
+        :param query:
+        :return:
+        """
+        return self.get_sparql_result_stream(query).values()
+
+    def get_result_columns(self, query):
+        """
+        列式返回结果 {var: [value, ...]}
+        :param query:
+        :return:
+        """
+        return self.get_sparql_result_stream(query).columns()
+
+    def iter_pages(self, query, page_size=50, keyset=True, var=u'?x'):
+        """
+        分页发送查询，逐页返回结果的值，内存占用只与页大小有关
+        :param query: question_temp生成的SELECT查询
+        :param page_size:
+        :param keyset: True使用键集分页，False使用LIMIT/OFFSET
+        :param var: 排序和键集所用的变量
+        :return: 迭代每一页的值列表
+        """
+        after = None
+        offset = 0
+        while True:
+            if keyset:
+                page_query = keyset_query(query, page_size, after, var)
+            else:
+                page_query = paginate_query(query, page_size, offset, var)
+            stream = self.get_sparql_result_stream(page_query)
+            page = list()
+            rows = 0
+            for row in stream.rows():
+                rows += 1
+                page.extend(v for v in row if v is not None)
+                after = row[stream.vars.index(var.lstrip('?$'))]
+            if page:
+                yield page
+            if rows < page_size:
+                return
+            offset += page_size
+
+    @staticmethod
+    def iter_rows(query_result):
+        """
+        按head中变量的顺序迭代已解析结果的每一行，未绑定的变量为None
+        :param query_result:
+        :return:
+        """
+        query_head = query_result['head']['vars']
+        for r in query_result['results']['bindings']:
+            yield tuple(r[h]['value'] if h in r else None for h in query_head)
 
     @staticmethod
     def parse_result(query_result):
@@ -34,17 +385,10 @@ class JenaFuseki:
         :param query_result:
         :return:
         """
-        try:
-            query_head = query_result['head']['vars']
-            query_results = list()
-            for r in query_result['results']['bindings']:
-                temp_dict = OrderedDict()
-                for h in query_head:
-                    temp_dict[h] = r[h]['value']
-                query_results.append(temp_dict)
-            return query_head, query_results
-        except KeyError:
+        if 'boolean' in query_result:
             return None, query_result['boolean']
+        query_head = query_result['head']['vars']
+        return query_head, [OrderedDict(zip(query_head, r)) for r in JenaFuseki.iter_rows(query_result)]
 
     def print_result_to_string(self, query_result):
         """
@@ -69,21 +413,43 @@ class JenaFuseki:
                     print(value, ' ', end=' ')
                 print()
 
+    @staticmethod
+    def group_values(query_result, group_vars=GROUP_VARS):
+        """
+        按(实体, 属性)把合并查询的结果分组，组的顺序为组合首次出现的顺序
+        :param query_result:
+        :param group_vars: (实体变量, 属性变量, 值变量)
+        :return: [{'entity', 'property', 'answer': [值, ...]}, ...]，property为属性URI的本地名称，例如主料
+        """
+        entity, prop, value = group_vars
+        groups = OrderedDict()
+        for r in query_result['results']['bindings']:
+            if entity not in r or prop not in r:
+                continue
+            key = (r[entity]['value'], r[prop]['value'])
+            answer = groups.setdefault(key, list())
+            if value in r:
+                answer.append(r[value]['value'])
+        return [{'entity': e, 'property': p.rsplit('/', 1)[-1], 'answer': answer}
+                for (e, p), answer in groups.items()]
+
     def get_sparql_result_value(self, query_result):
         """
-        用列表存储结果的值
+        用列表存储结果的值；合并查询的结果按组合分组，见group_values
         :param query_result:
         :return:
         """
-        query_head, query_result = self.parse_result(query_result)
-        if query_head is None:
-            return query_result
+        if self.hooks is not None:
+            start = time.perf_counter()
+        if 'boolean' in query_result:
+            values = query_result['boolean']
+        elif tuple(query_result['head']['vars']) == GROUP_VARS:
+            values = self.group_values(query_result)
         else:
-            values = list()
-            for qr in query_result:
-                for _, value in qr.items():
-                    values.append(value)
-            return values
+            values = [v for r in self.iter_rows(query_result) for v in r if v is not None]
+        if self.hooks is not None:
+            self.hooks.on_stage('parse', time.perf_counter() - start)
+        return values
 
 
 # TODO 用于测试
@@ -0,0 +1,290 @@
+# encoding=utf-8
+
+"""
+
+@file: kg_subgraph.py
+
+@time: 2026/10/19
+
+@desc: 按需返回实体的k跳邻域子图，供网页端只渲染用户关心的部分。
+
+从三元组文件中读取属于、选材两种关系，建立CSR形式的邻接数组（offsets/adj，使用array节省内存），
+结点和边的格式与visualization/vizdata.json相同：大类id为"序号-名称"，菜品和原料id为名称，
+与菜品同名的原料共用一个结点。盐、姜这类原料连接大量菜品，展开时每个结点最多取cap个邻居，
+被截断的结点和它的实际度数放在结果的truncated中。
+
+增量更新（见kg_update.py）时不重建CSR：删除的边记在removed中，新增的边记在各结点的extra中，
+只清除包含变化结点的缓存结果；增量部分超过边数的overlay_ratio时再重建。
+
+"""
+import threading
+from array import array
+
+from local_fuseki import NT_LINE_RE, parse_nt_term
+
+RELATIONS = ('属于', '选材')
+
+# TODO 与vizdata.json中各类结点的class、group、size一致
+GROUP_CATEGORY = 0
+GROUP_DISH = 1
+GROUP_MATERIAL = 2
+GROUP_CLASS = ['菜品大类', '精品特色菜', '原料']
+GROUP_SIZE = ['16', '10', '8']
+
+
+def local_name(uri):
+    return uri.rsplit('/', 1)[-1]
+
+
+class KGSubgraph:
+    def __init__(self, nt_paths, max_cache=4096, overlay_ratio=0.1):
+        self.max_cache = max_cache
+        self.overlay_ratio = overlay_ratio
+        self._cache = dict()
+        # TODO 缓存结果中的结点，用于按结点清除缓存
+        self._cache_nodes = dict()
+        self._lock = threading.Lock()
+        self.ids = list()
+        self.groups = array('b')
+        self.index = dict()
+        # TODO 边：src[e] -(rel[e])-> dst[e]；offsets[u]:offsets[u+1]是结点u在adj中的边号
+        self.src = array('i')
+        self.dst = array('i')
+        self.rel = array('b')
+        self.offsets = array('i')
+        self.adj = array('i')
+        # TODO 增量更新：已删除的边号，结点 -> 新增的边号
+        self.removed = set()
+        self.extra = dict()
+        # TODO 三元组的主语 -> 名称、大类id、由它的三元组产生的边号
+        self.names = dict()
+        self.category_keys = dict()
+        self.subject_edges = dict()
+        self.load(nt_paths)
+
+    def node(self, name, group):
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.ids)
+            self.ids.append(name)
+            self.groups.append(group)
+        elif group < self.groups[i]:
+            # TODO 同名时按大类、菜品、原料的优先级确定类型
+            self.groups[i] = group
+        return i
+
+    def load(self, nt_paths):
+        names = self.names
+        raw = list()
+        for path in nt_paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    m = NT_LINE_RE.match(line)
+                    if m is None:
+                        continue
+                    s = parse_nt_term(m.group(1))[1]
+                    p = local_name(parse_nt_term(m.group(2))[1])
+                    o = parse_nt_term(m.group(3))[1]
+                    if p == '名称':
+                        names[s] = o
+                    elif p in RELATIONS:
+                        raw.append((s, RELATIONS.index(p), o))
+
+        # TODO 大类按在三元组文件中出现的顺序编号，与vizdata.json中的"1-红烧肉类"一致
+        categories = self.category_keys
+        for s, r, _ in raw:
+            if RELATIONS[r] == '属于' and s not in categories:
+                categories[s] = '{}-{}'.format(len(categories) + 1, names.get(s, s))
+        # TODO 大类也可以用不带序号的名称查询
+        self.aliases = {names.get(s, s): key for s, key in categories.items()}
+
+        for s, r, o in raw:
+            self.add_edge(s, r, o)
+        self.build()
+
+    def add_edge(self, s, r, o):
+        """
+        由主语s的三元组(s, RELATIONS[r], o)加入一条边
+        :return: 边号
+        """
+        if RELATIONS[r] == '属于':
+            u = self.node(self.category_keys[s], GROUP_CATEGORY)
+            # TODO 嵌套的大类：宾语是子类的名称
+            v = self.node(self.aliases[o], GROUP_CATEGORY) if o in self.aliases else self.node(o, GROUP_DISH)
+        else:
+            u = self.node(self.names.get(s, s), GROUP_DISH)
+            v = self.node(o, GROUP_MATERIAL)
+        e = len(self.src)
+        self.src.append(u)
+        self.dst.append(v)
+        self.rel.append(r)
+        self.subject_edges.setdefault(s, list()).append(e)
+        return e
+
+    def build(self):
+        """
+        由所有未删除的边建立CSR，之后增量部分清空
+        """
+        n = len(self.ids)
+        removed = self.removed
+        degree = array('i', [0]) * (n + 1)
+        for e in range(len(self.src)):
+            if e not in removed:
+                degree[self.src[e] + 1] += 1
+                degree[self.dst[e] + 1] += 1
+        for u in range(n):
+            degree[u + 1] += degree[u]
+        self.offsets = degree
+        fill = array('i', degree)
+        self.adj = array('i', [0]) * degree[n]
+        for e in range(len(self.src)):
+            if e in removed:
+                continue
+            for u in (self.src[e], self.dst[e]):
+                self.adj[fill[u]] = e
+                fill[u] += 1
+        # TODO 已删除的边留在src/dst/rel中，边号保持不变
+        self.removed = set()
+        self.extra = dict()
+
+    def edges_of(self, u):
+        if u + 1 >= len(self.offsets):
+            edges = list()
+        else:
+            edges = self.adj[self.offsets[u]:self.offsets[u + 1]]
+        extra = self.extra.get(u)
+        if extra:
+            edges = list(edges) + extra
+        if self.removed:
+            edges = [e for e in edges if e not in self.removed]
+        return edges
+
+    def degree(self, u):
+        return len(self.edges_of(u))
+
+    def update(self, subjects):
+        """
+        用主语的最新三元组替换它原来产生的边
+        :param subjects: {主语IRI: [(谓语的本地名, 宾语), ...]}，列表为空表示该主语已删除
+        :return: 变化的结点数
+        """
+        with self._lock:
+            touched = set()
+            for s, pairs in subjects.items():
+                for e in self.subject_edges.pop(s, ()):
+                    self.removed.add(e)
+                    touched.update((self.src[e], self.dst[e]))
+                name = next((o for p, o in pairs if p == '名称'), None)
+                if name is None:
+                    self.names.pop(s, None)
+                else:
+                    self.names[s] = name
+                key = self.category_keys.get(s)
+                if key is not None and name is not None and key.split('-', 1)[-1] != name:
+                    # TODO 大类改名时保留序号
+                    self.aliases.pop(key.split('-', 1)[-1], None)
+                    key = self.category_keys[s] = '{}-{}'.format(key.split('-', 1)[0], name)
+                for p, o in pairs:
+                    if p not in RELATIONS:
+                        continue
+                    r = RELATIONS.index(p)
+                    if RELATIONS[r] == '属于' and s not in self.category_keys:
+                        self.category_keys[s] = '{}-{}'.format(len(self.category_keys) + 1, name or s)
+                    e = self.add_edge(s, r, o)
+                    for u in (self.src[e], self.dst[e]):
+                        self.extra.setdefault(u, list()).append(e)
+                        touched.add(u)
+                if s in self.category_keys:
+                    self.aliases[self.names.get(s, s)] = self.category_keys[s]
+
+            # TODO 没有边的结点不能再被查到
+            for u in touched:
+                if self.degree(u) == 0 and self.index.get(self.ids[u]) == u:
+                    del self.index[self.ids[u]]
+
+            for key in [k for k, nodes in self._cache_nodes.items() if not nodes.isdisjoint(touched)]:
+                del self._cache[key]
+                del self._cache_nodes[key]
+
+            overlay = len(self.removed) + sum(len(v) for v in self.extra.values()) // 2
+            if overlay > self.overlay_ratio * len(self.src):
+                self.build()
+            return len(touched)
+
+    def node_dict(self, u):
+        g = self.groups[u]
+        return {'class': GROUP_CLASS[g], 'group': str(g), 'id': self.ids[u], 'size': GROUP_SIZE[g]}
+
+    def resolve(self, name):
+        name = self.aliases.get(name, name)
+        if name not in self.index:
+            raise KeyError('unknown entity: {}'.format(name))
+        return self.index[name]
+
+    def subgraph(self, name, k=1, cap=30, max_nodes=500):
+        """
+        广度优先展开k跳邻域
+        :param name: 菜品、原料或大类名称
+        :param k: 跳数
+        :param cap: 每个结点最多展开的邻居数
+        :param max_nodes: 子图的最大结点数
+        :return: {'links': [...], 'nodes': [...], 'truncated': {id: 度数}}
+        """
+        key = (name, k, cap, max_nodes)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            return self._subgraph(key, name, k, cap, max_nodes)
+
+    def _subgraph(self, key, name, k, cap, max_nodes):
+        seed = self.resolve(name)
+        depth = {seed: 0}
+        order = [seed]
+        edges = list()
+        truncated = dict()
+        head = 0
+        while head < len(order):
+            u = order[head]
+            head += 1
+            if depth[u] >= k:
+                continue
+            neighbors = self.edges_of(u)
+            if len(neighbors) > cap:
+                truncated[self.ids[u]] = len(neighbors)
+                neighbors = neighbors[:cap]
+            for e in neighbors:
+                v = self.dst[e] if self.src[e] == u else self.src[e]
+                if v not in depth:
+                    if len(order) >= max_nodes:
+                        truncated[self.ids[u]] = self.degree(u)
+                        continue
+                    depth[v] = depth[u] + 1
+                    order.append(v)
+                edges.append(e)
+
+        seen = set()
+        links = list()
+        for e in edges:
+            if e in seen:
+                continue
+            seen.add(e)
+            links.append({'relation': RELATIONS[self.rel[e]], 'source': self.ids[self.src[e]],
+                          'target': self.ids[self.dst[e]], 'value': 3})
+        result = {'links': links, 'nodes': [self.node_dict(u) for u in order], 'truncated': truncated}
+
+        if len(self._cache) >= self.max_cache:
+            self._cache.clear()
+            self._cache_nodes.clear()
+        self._cache[key] = result
+        self._cache_nodes[key] = frozenset(order)
+        return result
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    kg = KGSubgraph(['./data/aifoodtime_ntriples.nt'])
+    print('{} nodes, {} edges'.format(len(kg.ids), len(kg.src)))
+    for name in ['元宝红烧肉', '姜', '红烧肉类']:
+        sub = kg.subgraph(name, k=2, cap=10)
+        print(name, len(sub['nodes']), len(sub['links']), sub['truncated'])
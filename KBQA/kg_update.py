@@ -0,0 +1,482 @@
+# encoding=utf-8
+
+"""
+
+@file: kg_update.py
+
+@time: 2026/10/19
+
+@desc: 知识图谱的增量更新：菜谱变化时只计算变化的三元组，不再重新生成、上传整个数据集并重启服务。
+
+1. 计算差异：两个版本的三元组文件逐条比较，或者按entities_item.json中的菜品重新生成该菜品的三元组后与当前的比较
+2. 应用差异：分批发送DELETE DATA/INSERT DATA到Fuseki（或直接修改内存中的TripleStore）
+3. 更新词典：新出现的菜品、大类、原料加入jieba词典，不再出现的删除，不重新加载词典
+4. 清除缓存：只删除涉及变化实体的缓存答案（qa_service.py）、子图缓存（kg_subgraph.py）和补全缓存（question_suggest.py）
+
+菜品的制作步骤除了整段的字面量，还生成步骤结点：<菜品> :步骤 <菜品-步骤N>，步骤结点有:序号、:内容和:时长（从步骤文本中
+提取的"10分钟"、"半小时"等提示，可以有多个），用于"水煮鱼第三步是什么"、"水煮鱼要几步"这类只取一步或步骤数的问题。
+已有的三元组文件可以用--steps按entities_item.json补上步骤结点，其它三元组不变。
+
+用法：
+python kg_update.py --old ./data/aifoodtime_ntriples.nt --new ./new_ntriples.nt --endpoint http://localhost:3030/cookbook/query
+python kg_update.py --old ./data/aifoodtime_ntriples.nt --items ./entities_item.json --dish 元宝红烧肉 --write --dict ./external_dict/entities_list.txt
+python kg_update.py --old ./data/aifoodtime_ntriples.nt --items ./data/entities_item_mimini.json --steps --write
+加上--server http://127.0.0.1:8000 时把差异发给qa_server.py的/update接口，由服务更新词典并清除缓存。
+
+"""
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from urllib.request import Request, urlopen
+
+import jena_sparql_endpoint
+from local_fuseki import NT_LINE_RE, URI, LITERAL, TripleStore, parse_nt_term, format_nt_term
+from recipe_text import SECTIONS, material_names, parse_steps
+
+NAMESPACE = 'http://kg.course/ai-food-time/'
+
+
+def predicate(name):
+    return URI, NAMESPACE + name
+
+
+def local_name(uri):
+    return uri.rsplit('/', 1)[-1]
+
+
+def parse_nt_line(line):
+    m = NT_LINE_RE.match(line)
+    if m is None:
+        return None
+    return parse_nt_term(m.group(1)), parse_nt_term(m.group(2)), parse_nt_term(m.group(3))
+
+
+def format_nt_line(triple):
+    return '{} {} {} .'.format(*[format_nt_term(t) for t in triple])
+
+
+def read_nt(path):
+    """
+    :return: [(s, p, o), ...]，结点为(类型, 值)
+    """
+    triples = list()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            triple = parse_nt_line(line)
+            if triple is not None:
+                triples.append(triple)
+    return triples
+
+
+def writable_dict(dict_paths):
+    """
+    外部词典中第一个可以改写的文件（文件和所在目录都可写，改写时先写临时文件再替换），都不可写时为None
+    """
+    for p in dict_paths:
+        if os.access(p, os.W_OK) and os.access(os.path.dirname(os.path.abspath(p)), os.W_OK):
+            return p
+    return None
+
+
+def item_triples(subject, name, item):
+    """
+    按aifoodtime_ntriples.nt的格式生成一个菜品或大类的三元组
+    :param subject: 主语IRI
+    :param name: 名称
+    :param item: entities_item.json中的一项；大类为{'子菜品': ['1. 菜名', ...]}；
+                 可以直接给出'选材'列表，否则取各食材分区中冒号前的名称并对齐（recipe_text.align_material）
+    :return: [(s, p, o), ...]
+    """
+    s = (URI, subject)
+    triples = [(s, predicate('名称'), (LITERAL, name))]
+    if '子菜品' in item:
+        for sub in item['子菜品']:
+            triples.append((s, predicate('属于'), (LITERAL, sub.split('. ', 1)[-1])))
+        return triples
+    for section in SECTIONS:
+        for value in item.get(section, []):
+            triples.append((s, predicate(section), (LITERAL, value)))
+    for value in item.get('特色', []):
+        triples.append((s, predicate('特色'), (LITERAL, value)))
+    if item.get('制作步骤'):
+        triples.append((s, predicate('制作步骤'), (LITERAL, ''.join(item['制作步骤']))))
+    materials = item.get('选材')
+    if materials is None:
+        materials = material_names(value for section in SECTIONS for value in item.get(section, []))
+    for m in materials:
+        triples.append((s, predicate('选材'), (LITERAL, m)))
+    triples += step_triples(subject, item.get('制作步骤', []))
+    return triples
+
+
+def step_triples(subject, steps):
+    """
+    步骤结点的三元组：<菜品> :步骤 <菜品-步骤N>，<菜品-步骤N> :序号/:内容/:时长
+    """
+    s = (URI, subject)
+    triples = list()
+    for n, text, durations in parse_steps(steps):
+        step = (URI, '{}-步骤{}'.format(subject, n))
+        triples.append((s, predicate('步骤'), step))
+        triples.append((step, predicate('序号'), (LITERAL, str(n))))
+        triples.append((step, predicate('内容'), (LITERAL, text)))
+        for d in durations:
+            triples.append((step, predicate('时长'), (LITERAL, d)))
+    return triples
+
+
+class TripleDelta:
+    def __init__(self, removed, added):
+        self.removed = removed
+        self.added = added
+
+    @classmethod
+    def diff(cls, old, new):
+        """
+        :param old: 旧的三元组
+        :param new: 新的三元组
+        """
+        old_set = set(old)
+        new_set = set(new)
+        return cls([t for t in old if t not in new_set], [t for t in new if t not in old_set])
+
+    def __len__(self):
+        return len(self.removed) + len(self.added)
+
+    def subjects(self):
+        return set(t[0] for t in self.removed) | set(t[0] for t in self.added)
+
+    def to_updates(self, batch_size=500):
+        """
+        生成SPARQL UPDATE，每个请求最多包含batch_size个三元组，先删除后插入
+        :return: [update, ...]
+        """
+        updates = list()
+        for op, triples in (('DELETE', self.removed), ('INSERT', self.added)):
+            for i in range(0, len(triples), batch_size):
+                body = '\n'.join(format_nt_line(t) for t in triples[i:i + batch_size])
+                updates.append('{} DATA {{\n{}\n}}'.format(op, body))
+        return updates
+
+    def to_dict(self):
+        return {'removed': [format_nt_line(t) for t in self.removed],
+                'added': [format_nt_line(t) for t in self.added]}
+
+    @classmethod
+    def from_dict(cls, obj):
+        def parse(lines):
+            triples = list()
+            for line in lines:
+                triple = parse_nt_line(line)
+                if triple is None:
+                    raise ValueError('bad N-Triples line: {}'.format(line))
+                triples.append(triple)
+            return triples
+        return cls(parse(obj.get('removed', [])), parse(obj.get('added', [])))
+
+
+class KGUpdater:
+    def __init__(self, store, fuseki=None, tagger=None, service=None, subgraph=None, suggester=None,
+                 dict_path=None, batch_size=500, hierarchy=None):
+        """
+        :param store: 当前知识图谱的TripleStore，用于计算差异和判断实体是否仍然存在
+        :param fuseki: JenaFuseki，为None时不发送SPARQL UPDATE
+        :param tagger: word_tagging.Tagger，为None时不更新词典
+        :param service: qa_service.QAService
+        :param subgraph: kg_subgraph.KGSubgraph
+        :param suggester: question_suggest.QuestionSuggester
+        :param dict_path: 外部词典文件，不为None时同时改写该文件，重启后仍然有效
+        :param batch_size: 每个SPARQL UPDATE请求的三元组数
+        :param hierarchy: category_closure.CategoryHierarchy，属于或名称变化时重建
+        """
+        self.store = store
+        self.fuseki = fuseki
+        self.tagger = tagger
+        self.service = service
+        self.subgraph = subgraph
+        self.suggester = suggester
+        self.dict_path = dict_path
+        self.batch_size = batch_size
+        self.hierarchy = hierarchy
+        self._last_id = None
+        # TODO 增量更新以来实体类型变化的名称 -> 类型，None表示不再是实体；重新加载词典后重放，见replay
+        self.changes = OrderedDict()
+
+    def subject_of(self, name):
+        """
+        :return: 名称为name的主语IRI，不存在时为None
+        """
+        subjects = self.store.pos.get(predicate('名称'), dict()).get((LITERAL, name))
+        return subjects[0][1] if subjects else None
+
+    def next_subject(self):
+        """
+        新建菜品的主语IRI，编号接在已有的最大编号之后
+        """
+        if self._last_id is None:
+            self._last_id = max((int(local_name(s[1])) for s in self.store.spo if local_name(s[1]).isdigit()),
+                                default=0)
+        self._last_id += 1
+        return NAMESPACE + str(self._last_id)
+
+    def subject_triples(self, subject):
+        """
+        主语的三元组，包括它的步骤结点的三元组
+        """
+        triples = list(self.store.match((URI, subject), None, None))
+        for _, _, step in list(self.store.match((URI, subject), predicate('步骤'), None)):
+            if step[0] == URI:
+                triples += self.store.match(step, None, None)
+        return triples
+
+    def dish_delta(self, name, item):
+        """
+        用entities_item.json中的一项替换名称为name的菜品或大类，item为None表示删除，不存在时新建
+        """
+        subject = self.subject_of(name)
+        old = self.subject_triples(subject) if subject is not None else list()
+        if item is None:
+            return TripleDelta(old, list())
+        if subject is not None and '子菜品' not in item and '选材' not in item:
+            item = dict(item, 选材=self.selected_materials(subject, item))
+        return TripleDelta.diff(old, item_triples(subject or self.next_subject(), name, item))
+
+    def selected_materials(self, subject, item):
+        """
+        已有菜品的选材只是对齐后原料的一部分（例如元宝红烧肉没有选八角、花椒），按食材的变化更新：
+        食材没有变化的原料保持原来是否选用，新增的原料选用，不再出现的原料去掉
+        :return: [原料名称, ...]
+        """
+        s = (URI, subject)
+        old_names = material_names(o[1] for section in SECTIONS for _, _, o in self.store.match(s, predicate(section), None))
+        new_names = material_names(value for section in SECTIONS for value in item.get(section, []))
+        selected = [o[1] for _, _, o in self.store.match(s, predicate('选材'), None)]
+        # TODO 不是由食材对齐得到的选材是手工加入的，保留
+        kept = [m for m in selected if m in new_names or m not in old_names]
+        return kept + [m for m in new_names if m not in old_names and m not in kept]
+
+    def step_delta(self, name, steps):
+        """
+        只重新生成名称为name的菜品的步骤结点，菜品不存在时为空
+        """
+        subject = self.subject_of(name)
+        if subject is None:
+            return TripleDelta(list(), list())
+        s = (URI, subject)
+        old = list()
+        for triple in list(self.store.match(s, predicate('步骤'), None)):
+            old.append(triple)
+            if triple[2][0] == URI:
+                old += self.store.match(triple[2], None, None)
+        return TripleDelta.diff(old, step_triples(subject, steps))
+
+    def file_delta(self, nt_path):
+        return TripleDelta.diff(list(self.store.match(None, None, None)), read_nt(nt_path))
+
+    def entity_kind(self, name):
+        """
+        名称的实体类型，不再是实体时为None
+        """
+        kinds = [None]
+        for s in self.store.pos.get(predicate('名称'), dict()).get((LITERAL, name), ()):
+            kinds.append('category' if self.store.spo.get(s, dict()).get(predicate('属于')) else 'dish')
+        if self.store.pos.get(predicate('选材'), dict()).get((LITERAL, name)):
+            kinds.append('material')
+        return min(kinds[1:], key=['category', 'dish', 'material'].index) if len(kinds) > 1 else None
+
+    def entity_names(self, delta):
+        """
+        可能成为或不再是实体的名称：变化主语的名称，变化的选材、属于三元组的宾语
+        """
+        names = set()
+        for s in delta.subjects():
+            names.update(o[1] for _, _, o in self.store.match(s, predicate('名称'), None))
+        for s, p, o in delta.removed + delta.added:
+            if p in (predicate('名称'), predicate('选材'), predicate('属于')):
+                names.add(o[1])
+        return names
+
+    def apply(self, delta):
+        """
+        应用差异并更新词典和缓存
+        :return: 报告
+        """
+        start = time.perf_counter()
+        names = self.entity_names(delta)
+        before = {name: self.entity_kind(name) for name in names}
+        # TODO 子类的变化也会改变上级大类的答案
+        related = self.hierarchy.ancestors_of(names) if self.hierarchy is not None else set()
+
+        fuseki_s = 0.0
+        if self.fuseki is not None:
+            t = time.perf_counter()
+            for update in delta.to_updates(self.batch_size):
+                self.fuseki.update(update)
+            fuseki_s = time.perf_counter() - t
+        for triple in delta.removed:
+            self.store.remove(*triple)
+        for triple in delta.added:
+            self.store.add(*triple)
+
+        names |= self.entity_names(delta)
+        if self.hierarchy is not None and any(p in (predicate('属于'), predicate('名称'))
+                                              for _, p, _ in delta.removed + delta.added):
+            self.hierarchy.update(self.store)
+            related |= self.hierarchy.ancestors_of(names)
+        after = {name: self.entity_kind(name) for name in names}
+        added_words = sorted(n for n in names if after[n] is not None and before.get(n) is None)
+        removed_words = sorted(n for n in names if after[n] is None and before.get(n) is not None)
+        for name in sorted(names):
+            if after[name] != before.get(name):
+                self.changes.pop(name, None)
+                self.changes[name] = after[name]
+
+        if self.tagger is not None:
+            self.tagger.add_words(added_words)
+            self.tagger.del_words(removed_words)
+        if self.dict_path is not None and (added_words or removed_words):
+            self.rewrite_dict(added_words, removed_words)
+
+        invalidated = 0
+        if self.service is not None:
+            # TODO 查询中的字面量只会是实体名称，答案中可能列出菜品、原料的名称
+            invalidated = self.service.invalidate(names | related, unmatched=len(added_words) > 0)
+        touched = 0
+        if self.subgraph is not None:
+            touched = self.subgraph.update({s[1]: [(local_name(p[1]), o[1]) for _, p, o in self.subject_triples(s[1])]
+                                            for s in delta.subjects()})
+        if self.suggester is not None:
+            for name in removed_words:
+                self.suggester.remove_entity(name)
+            for name in names:
+                if after[name] is not None and after[name] != before.get(name):
+                    self.suggester.add_entity(name, after[name])
+
+        return {
+            'removed': len(delta.removed),
+            'added': len(delta.added),
+            'subjects': len(delta.subjects()),
+            'words_added': added_words,
+            'words_removed': removed_words,
+            'answers_invalidated': invalidated,
+            'subgraph_nodes_touched': touched,
+            'fuseki_ms': round(fuseki_s * 1000, 3),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def replay(self, tagger=None, suggester=None):
+        """
+        把增量更新以来的词语变化重放到重新加载的分词器和补全索引上：外部词典中只有词语，
+        补全索引的实体类型来自可视化数据，都不包含增量更新后的状态
+        :param tagger: 新的word_tagging.Tagger
+        :param suggester: 新的question_suggest.QuestionSuggester
+        :return: 重放的名称数
+        """
+        added = [name for name, kind in self.changes.items() if kind is not None]
+        removed = [name for name, kind in self.changes.items() if kind is None]
+        if tagger is not None:
+            tagger.add_words(added)
+            tagger.del_words(removed)
+        if suggester is not None:
+            for name in removed:
+                suggester.remove_entity(name)
+            for name in added:
+                suggester.add_entity(name, self.changes[name])
+        return len(self.changes)
+
+    def rewrite_dict(self, added_words, removed_words):
+        words = list()
+        with open(self.dict_path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    words.append(parts[0])
+        words = sorted(set(words) - set(removed_words) | set(added_words))
+        tmp_path = self.dict_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for w in words:
+                f.write(w + ' ai' + '\n')
+        os.replace(tmp_path, self.dict_path)
+
+    def write_nt(self, path):
+        """
+        把当前的三元组写回文件，主语按原来的顺序，新建的主语在最后
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for triple in self.store.match(None, None, None):
+                f.write(format_nt_line(triple) + '\n')
+        os.replace(tmp_path, path)
+
+
+def post_delta(server_url, delta):
+    """
+    把差异发给qa_server.py的/update接口
+    :return: 服务返回的报告
+    """
+    body = json.dumps(delta.to_dict(), ensure_ascii=False).encode('utf-8')
+    request = Request(server_url.rstrip('/') + '/update', data=body,
+                      headers={'Content-Type': 'application/json; charset=utf-8'})
+    with urlopen(request) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='知识图谱的增量更新')
+    parser.add_argument('--old', default='./data/aifoodtime_ntriples.nt', help='当前的三元组文件')
+    parser.add_argument('--new', default=None, help='新的三元组文件，与--items二选一')
+    parser.add_argument('--items', default=None, help='entities_item.json，与--dish一起使用')
+    parser.add_argument('--dish', action='append', default=[],
+                        help='需要更新的菜品或大类名称，可以指定多次；不在--items中的表示删除')
+    parser.add_argument('--endpoint', action='append', default=None, help='Fuseki的查询地址，可以指定多次')
+    parser.add_argument('--server', action='append', default=[], help='qa_server.py的地址，可以指定多次')
+    parser.add_argument('--steps', action='store_true', help='按--items重新生成所有菜品的步骤结点，不改变其它三元组')
+    parser.add_argument('--dict', default=None, help='同时改写的外部词典文件')
+    parser.add_argument('--write', action='store_true', help='把更新后的三元组写回--old')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    store = TripleStore()
+    store.load(args.old)
+    fuseki = None
+    if args.endpoint is not None:
+        fuseki = jena_sparql_endpoint.JenaFuseki(args.endpoint if len(args.endpoint) > 1 else args.endpoint[0])
+    updater = KGUpdater(store, fuseki, dict_path=args.dict, batch_size=args.batch_size)
+
+    if args.new is not None:
+        delta = updater.file_delta(args.new)
+    elif args.steps:
+        with open(args.items, encoding='utf-8') as f:
+            items = json.load(f)
+        removed, added = list(), list()
+        for name, item in items.items():
+            if '制作步骤' in item:
+                d = updater.step_delta(name, item['制作步骤'])
+                removed += d.removed
+                added += d.added
+        delta = TripleDelta(removed, added)
+    else:
+        items = dict()
+        if args.items is not None:
+            with open(args.items, encoding='utf-8') as f:
+                items = json.load(f)
+        removed, added = list(), list()
+        for name in args.dish:
+            # TODO 大类在entities_item.json中的键形如"1-红烧肉类"
+            item = items.get(name)
+            if item is None:
+                item = next((v for k, v in items.items() if k.split('-', 1)[-1] == name and '子菜品' in v), None)
+            d = updater.dish_delta(name, item)
+            removed += d.removed
+            added += d.added
+        delta = TripleDelta(removed, added)
+
+    report = updater.apply(delta)
+    print('kg: {}'.format(json.dumps(report, ensure_ascii=False)))
+    for url in args.server:
+        print('{}: {}'.format(url, json.dumps(post_delta(url, delta), ensure_ascii=False)))
+    if args.write:
+        updater.write_nt(args.old)
+        print('write path: {}'.format(args.old))
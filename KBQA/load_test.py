@@ -0,0 +1,290 @@
+# encoding=utf-8
+
+"""
+
+@file: load_test.py
+
+@time: 2026/10/19
+
+@desc: 问答服务的压力测试，测量并发负载下问题->答案整个流程的延迟。
+
+问题按Zipf分布从外部词典中的菜品里抽取（排名第r的菜品权重为1/r^s），问法均匀抽取。用asyncio按目标速率发出请求
+（开环：不等上一个请求返回，延迟从计划发出的时刻算起，避免协调遗漏），依次测试--rates中的每个速率，
+每个速率报告吞吐量、p50/p99/p999延迟和错误率。实际吞吐量低于目标速率的95%或p99超过--slo-p99-ms时
+视为饱和，第一个饱和的速率即饱和点。
+
+请求可以发给进程内的QAService（默认，Fuseki使用本地替身，延迟可设置），也可以用--url发给运行中的qa_server.py。
+
+用法：
+python load_test.py --rates 50 100 200 400 --duration 10 --delay 0.005 --jitter 0.005 --output ./benchmarks/load.json
+python load_test.py --url http://127.0.0.1:8000 --rates 100 200 --compare ./benchmarks/load.json
+
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, quote
+
+import benchmark
+import local_fuseki
+import qa_service
+import question_suggest
+import question_temp
+
+
+def load_dishes(dict_paths, vizdata_path):
+    """
+    外部词典中的菜品（可视化数据中group为"1"的结点）
+    """
+    kinds = question_suggest.QuestionSuggester.load_kinds(vizdata_path)
+    return [e for e in question_temp.load_entities(dict_paths) if kinds.get(e) == question_suggest.KIND_DISH]
+
+
+class QuestionMix:
+    def __init__(self, dishes, forms=None, zipf_s=1.1, seed=0):
+        """
+        :param dishes: 菜品名称，打乱后按顺序排名
+        :param forms: 问法，默认为question_temp.food_question_forms
+        :param zipf_s: Zipf分布的指数
+        """
+        self.rng = random.Random(seed)
+        self.dishes = list(dishes)
+        self.rng.shuffle(self.dishes)
+        self.forms = forms or question_temp.food_question_forms
+        self.weights = [1.0 / (r + 1) ** zipf_s for r in range(len(self.dishes))]
+
+    def sample(self, n):
+        dishes = self.rng.choices(self.dishes, weights=self.weights, k=n)
+        return [self.rng.choice(self.forms).format(food=d) for d in dishes]
+
+
+class LocalTarget:
+    """
+    进程内的QAService，用线程池模拟服务端的工作线程
+    """
+    def __init__(self, service, concurrency):
+        self.service = service
+        self.pool = ThreadPoolExecutor(concurrency)
+
+    async def ask(self, question):
+        await asyncio.get_running_loop().run_in_executor(self.pool, self.service.answer, question)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+class HttpTarget:
+    """
+    qa_server.py的/answer接口，每个请求使用一个新连接
+    """
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path.rstrip('/') + '/answer?q='
+
+    async def ask(self, question):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write('GET {}{} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n'.format(
+                self.path, quote(question), self.host).encode('ascii'))
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        parts = status_line.split()
+        if len(parts) < 2 or parts[1] != b'200':
+            raise IOError('HTTP {}'.format(parts[1].decode() if len(parts) > 1 else 'no response'))
+
+    def close(self):
+        pass
+
+
+async def run_step(target, questions, rate, timeout, max_inflight):
+    """
+    按固定速率发出questions中的请求
+    :return: (延迟列表（秒）, {错误类型: 次数}, 用时)
+    """
+    loop = asyncio.get_running_loop()
+    latencies = list()
+    errors = dict()
+    inflight = [0]
+
+    async def one(question, scheduled):
+        inflight[0] += 1
+        try:
+            await asyncio.wait_for(target.ask(question), timeout)
+            latencies.append(loop.time() - scheduled)
+        except asyncio.TimeoutError:
+            errors['timeout'] = errors.get('timeout', 0) + 1
+        except Exception as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        finally:
+            inflight[0] -= 1
+
+    tasks = list()
+    start = loop.time()
+    for i, question in enumerate(questions):
+        scheduled = start + i / rate
+        await asyncio.sleep(max(0.0, scheduled - loop.time()))
+        # TODO 进行中的请求过多时直接计为过载，避免客户端本身无限堆积
+        if inflight[0] >= max_inflight:
+            errors['overload'] = errors.get('overload', 0) + 1
+            continue
+        tasks.append(asyncio.ensure_future(one(question, scheduled)))
+    if tasks:
+        await asyncio.gather(*tasks)
+    return latencies, errors, loop.time() - start
+
+
+def summarize_step(rate, sent, latencies, errors, elapsed):
+    values = sorted(latencies)
+    failed = sum(errors.values())
+    return {
+        'target_rps': rate,
+        'sent': sent,
+        'completed': len(values),
+        'errors': errors,
+        'error_rate': failed / float(sent) if sent else 0.0,
+        'achieved_rps': len(values) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': benchmark.percentile(values, 50) * 1000,
+        'p99_ms': benchmark.percentile(values, 99) * 1000,
+        'p999_ms': benchmark.percentile(values, 99.9) * 1000,
+        'max_ms': values[-1] * 1000 if values else 0.0,
+    }
+
+
+def saturation(step, slo_p99_ms, max_error_rate):
+    """
+    :return: 饱和的原因，未饱和时为None
+    """
+    if step['achieved_rps'] < 0.95 * step['target_rps']:
+        return 'throughput'
+    if step['error_rate'] > max_error_rate:
+        return 'errors'
+    if slo_p99_ms is not None and step['p99_ms'] > slo_p99_ms:
+        return 'p99'
+    return None
+
+
+async def run(target, mix, rates, duration, timeout, max_inflight, slo_p99_ms, max_error_rate, stop_on_saturation):
+    steps = list()
+    saturated = None
+    for rate in rates:
+        questions = mix.sample(max(1, int(rate * duration)))
+        latencies, errors, elapsed = await run_step(target, questions, rate, timeout, max_inflight)
+        step = summarize_step(rate, len(questions), latencies, errors, elapsed)
+        step['saturated'] = saturation(step, slo_p99_ms, max_error_rate)
+        steps.append(step)
+        print_step(step)
+        if step['saturated'] is not None and saturated is None:
+            saturated = {'target_rps': rate, 'reason': step['saturated'],
+                         'max_sustained_rps': max([s['target_rps'] for s in steps if s['saturated'] is None],
+                                                  default=None)}
+            if stop_on_saturation:
+                break
+    return steps, saturated
+
+
+def print_step(step):
+    print('{:>8}{:>10.1f}{:>10}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.2%}  {}'.format(
+        step['target_rps'], step['achieved_rps'], step['completed'], step['p50_ms'], step['p99_ms'],
+        step['p999_ms'], step['error_rate'], step['saturated'] or ''), flush=True)
+
+
+def compare(report, baseline):
+    """
+    按目标速率对比两次运行的吞吐量和延迟
+    """
+    old_steps = {s['target_rps']: s for s in baseline['steps']}
+    print('\n{:>8}{:>14}{:>14}{:>14}{:>14}'.format('rate', 'achieved', 'p50', 'p99', 'p999'))
+    for step in report['steps']:
+        old = old_steps.get(step['target_rps'])
+        if old is None:
+            continue
+        cells = ['{:+.1%}'.format((step[k] - old[k]) / old[k]) if old[k] > 0 else '-'
+                 for k in ('achieved_rps', 'p50_ms', 'p99_ms', 'p999_ms')]
+        print('{:>8}{:>14}{:>14}{:>14}{:>14}'.format(step['target_rps'], *cells))
+    print('saturation: {} -> {}'.format(baseline.get('saturation'), report.get('saturation')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='问答服务的压力测试')
+    parser.add_argument('--dict', action='append', default=None, help='外部词典，可以指定多次')
+    parser.add_argument('--vizdata', default='./data/vizdata_mimini_aglin.json', help='用于区分菜品和原料')
+    parser.add_argument('--nt', default='./data/aifoodtime_ntriples.nt', help='本地Fuseki替身加载的三元组')
+    parser.add_argument('--url', default=None, help='qa_server.py的地址，不指定时测试进程内的QAService')
+    parser.add_argument('--endpoint', action='append', default=None,
+                        help='进程内测试时使用的Fuseki查询地址，可以指定多次；不指定时启动本地替身')
+    parser.add_argument('--delay', type=float, default=0.005, help='本地替身每次查询的固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='本地替身的随机延迟上限(秒)')
+    parser.add_argument('--cache-size', type=int, default=65536, help='进程内测试时的答案缓存大小，0表示不缓存')
+    parser.add_argument('--concurrency', type=int, default=8, help='进程内测试时的工作线程数')
+    parser.add_argument('--rates', type=float, nargs='+', default=[25, 50, 100, 200, 400], help='依次测试的目标速率(请求/秒)')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个速率持续的时间(秒)')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf分布的指数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=5.0, help='单个请求的超时(秒)')
+    parser.add_argument('--max-inflight', type=int, default=1000, help='客户端同时进行的请求数上限')
+    parser.add_argument('--slo-p99-ms', type=float, default=None, help='p99的目标，超过时视为饱和')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='错误率超过时视为饱和')
+    parser.add_argument('--keep-going', action='store_true', help='饱和后继续测试更高的速率')
+    parser.add_argument('--output', default=None, help='把结果写入JSON文件')
+    parser.add_argument('--compare', default=None, help='与之前保存的结果比较')
+    args = parser.parse_args()
+
+    dict_paths = args.dict or ['./external_dict/entities_list.txt']
+    mix = QuestionMix(load_dishes(dict_paths, args.vizdata), zipf_s=args.zipf, seed=args.seed)
+    if args.url is not None:
+        target = HttpTarget(args.url)
+        entry = args.url
+    else:
+        if args.endpoint is None:
+            server = local_fuseki.start_local_fuseki([args.nt], delay=args.delay, jitter=args.jitter)
+            endpoint = server.url
+        else:
+            endpoint = args.endpoint if len(args.endpoint) > 1 else args.endpoint[0]
+        target = LocalTarget(qa_service.QAService(dict_paths, endpoint, max_cache=args.cache_size),
+                             args.concurrency)
+        entry = 'local'
+
+    print('{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+        'rate', 'achieved', 'completed', 'p50(ms)', 'p99(ms)', 'p999(ms)', 'errors'))
+    try:
+        steps, saturated = asyncio.run(run(target, mix, args.rates, args.duration, args.timeout, args.max_inflight,
+                                           args.slo_p99_ms, args.max_error_rate, not args.keep_going))
+    finally:
+        target.close()
+    print('saturation: {}'.format(saturated))
+
+    report = {
+        'meta': {
+            'target': entry,
+            'dishes': len(mix.dishes),
+            'zipf': args.zipf,
+            'duration_s': args.duration,
+            'delay_s': args.delay if args.url is None and args.endpoint is None else None,
+            'jitter_s': args.jitter if args.url is None and args.endpoint is None else None,
+            'cache_size': args.cache_size if args.url is None else None,
+            'concurrency': args.concurrency if args.url is None else None,
+            'slo_p99_ms': args.slo_p99_ms,
+            'python': platform.python_version(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'steps': steps,
+        'saturation': saturated,
+    }
+    if args.output is not None:
+        if os.path.dirname(args.output):
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+    if args.compare is not None:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
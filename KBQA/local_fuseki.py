@@ -0,0 +1,561 @@
+# encoding=utf-8
+
+"""
+
+@file: local_fuseki.py
+
+@time: 2026/10/19
+
+@desc: 本地的Fuseki替身服务，用于基准测试和压力测试。
+
+从N-Triples文件加载三元组，支持question_temp生成的查询形式：
+PREFIX、SELECT [DISTINCT] 变量/*/COUNT、ASK、基本图模式（三元组模式用"."分隔）、
+FILTER(STR(?x) > '...')形式的比较、VALUES（单变量或多变量的行内数据）、ORDER BY、LIMIT、OFFSET。返回SPARQL JSON结果格式，可以设置固定延迟和随机抖动，
+以及按一定概率出现的长时间停顿（模拟GC停顿）。
+更新地址（/cookbook/update）支持用";"分隔的INSERT DATA和DELETE DATA，见kg_update.py。
+
+"""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+NT_LINE_RE = re.compile(r'^(<[^>]*>)\s+(<[^>]*>)\s+(<[^>]*>|"(?:[^"\\]|\\.)*")\s*\.\s*$')
+
+TOKEN_RE = re.compile(r"""
+    (?P<iri><[^>\s]*>)
+  | (?P<var>[?$]\w+)
+  | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<pname>[\w\-]*:[\w\-]*)
+  | (?P<num>\d+)
+  | (?P<word>\w+)
+  | (?P<op>[<>!]=|[<>=])
+  | (?P<punct>[{}().,;*])
+""", re.X)
+
+# TODO 三元组中的结点用(类型, 值)表示，类型为uri或literal
+URI = 'uri'
+LITERAL = 'literal'
+
+
+def unquote(text):
+    return text[1:-1].replace('\\"', '"').replace("\\'", "'").replace('\\\\', '\\')
+
+
+def parse_nt_term(text):
+    if text.startswith('<'):
+        return URI, text[1:-1]
+    return LITERAL, unquote(text)
+
+
+def format_nt_term(term):
+    """
+    parse_nt_term的逆操作
+    """
+    kind, value = term
+    if kind == URI:
+        return '<{}>'.format(value)
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+class SparqlSyntaxError(ValueError):
+    pass
+
+
+class TripleStore:
+    def __init__(self):
+        # TODO spo: s -> p -> [o]，pos: p -> o -> [s]
+        self.spo = dict()
+        self.pos = dict()
+        self.size = 0
+
+    def load(self, nt_path):
+        with open(nt_path, encoding='utf-8') as f:
+            for line in f:
+                m = NT_LINE_RE.match(line)
+                if m is None:
+                    continue
+                self.add(parse_nt_term(m.group(1)), parse_nt_term(m.group(2)), parse_nt_term(m.group(3)))
+
+    def add(self, s, p, o):
+        objects = self.spo.setdefault(s, dict()).setdefault(p, list())
+        if o in objects:
+            return False
+        objects.append(o)
+        self.pos.setdefault(p, dict()).setdefault(o, list()).append(s)
+        self.size += 1
+        return True
+
+    def remove(self, s, p, o):
+        objects = self.spo.get(s, dict()).get(p)
+        if objects is None or o not in objects:
+            return False
+        objects.remove(o)
+        self.pos[p][o].remove(s)
+        self.size -= 1
+        return True
+
+    def match(self, s, p, o):
+        """
+        匹配三元组模式，None表示未绑定
+        :return: 迭代(s, p, o)
+        """
+        if s is not None:
+            by_p = self.spo.get(s, dict())
+            preds = [p] if p is not None else list(by_p)
+            for pred in preds:
+                for obj in by_p.get(pred, ()):
+                    if o is None or o == obj:
+                        yield s, pred, obj
+        elif p is not None:
+            by_o = self.pos.get(p, dict())
+            objs = [o] if o is not None else list(by_o)
+            for obj in objs:
+                for subj in by_o.get(obj, ()):
+                    yield subj, p, obj
+        else:
+            for subj, by_p in self.spo.items():
+                for pred, objects in by_p.items():
+                    for obj in objects:
+                        if o is None or o == obj:
+                            yield subj, pred, obj
+
+
+class SparqlQuery:
+    """
+    解析后的查询
+    """
+    def __init__(self):
+        self.form = 'SELECT'
+        self.distinct = False
+        self.select = list()
+        self.count = None
+        self.patterns = list()
+        self.filters = list()
+        # TODO VALUES给出的初始解，[{var: term}, ...]，None表示没有VALUES
+        self.values = None
+        self.order_by = None
+        self.limit = None
+        self.offset = 0
+
+
+def tokenize(query):
+    tokens = list()
+    for m in TOKEN_RE.finditer(query):
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+    return tokens
+
+
+def parse_query(query):
+    tokens = tokenize(query)
+    prefixes = dict()
+    q = SparqlQuery()
+    i = 0
+
+    def expect(value):
+        if i >= len(tokens) or tokens[i][1].upper() != value:
+            raise SparqlSyntaxError('expected {}'.format(value))
+
+    def term(token):
+        kind, value = token
+        if kind == 'var':
+            return value[1:]
+        if kind == 'iri':
+            return URI, value[1:-1]
+        if kind == 'str':
+            return LITERAL, unquote(value)
+        if kind == 'num':
+            return LITERAL, value
+        if kind == 'pname':
+            prefix, local = value.split(':', 1)
+            if prefix not in prefixes:
+                raise SparqlSyntaxError('unknown prefix {}'.format(prefix))
+            return URI, prefixes[prefix] + local
+        raise SparqlSyntaxError('unexpected token {}'.format(value))
+
+    while i < len(tokens) and tokens[i][1].upper() == 'PREFIX':
+        prefixes[tokens[i + 1][1].rstrip(':')] = tokens[i + 2][1][1:-1]
+        i += 3
+
+    q.form = tokens[i][1].upper()
+    i += 1
+    if q.form == 'SELECT':
+        if tokens[i][1].upper() == 'DISTINCT':
+            q.distinct = True
+            i += 1
+        while tokens[i][1].upper() != 'WHERE' and tokens[i][1] != '{':
+            kind, value = tokens[i]
+            if value.upper() == 'COUNT':
+                q.count = tokens[i + 2][1][1:]
+                i += 4
+            elif kind == 'var':
+                q.select.append(value[1:])
+                i += 1
+            elif value == '*':
+                i += 1
+            else:
+                raise SparqlSyntaxError('unexpected token {}'.format(value))
+        if tokens[i][1].upper() == 'WHERE':
+            i += 1
+    elif q.form != 'ASK':
+        raise SparqlSyntaxError('unsupported query form {}'.format(q.form))
+
+    expect('{')
+    i += 1
+    triple = list()
+    while tokens[i][1] != '}':
+        if tokens[i][1] == '.':
+            i += 1
+            continue
+        if tokens[i][1].upper() == 'FILTER':
+            i = parse_filter(tokens, i + 1, q)
+            continue
+        if tokens[i][1].upper() == 'VALUES':
+            i = parse_values(tokens, i + 1, q, term)
+            continue
+        triple.append(term(tokens[i]))
+        i += 1
+        if len(triple) == 3:
+            q.patterns.append(tuple(triple))
+            triple = list()
+    i += 1
+
+    while i < len(tokens):
+        word = tokens[i][1].upper()
+        if word == 'ORDER':
+            q.order_by = tokens[i + 2][1][1:]
+            i += 3
+        elif word == 'LIMIT':
+            q.limit = int(tokens[i + 1][1])
+            i += 2
+        elif word == 'OFFSET':
+            q.offset = int(tokens[i + 1][1])
+            i += 2
+        else:
+            raise SparqlSyntaxError('unexpected token {}'.format(tokens[i][1]))
+
+    if q.form == 'SELECT' and len(q.select) == 0 and q.count is None:
+        for pattern in q.patterns:
+            for t in pattern:
+                if isinstance(t, str) and t not in q.select:
+                    q.select.append(t)
+    return q
+
+
+def parse_filter(tokens, i, q):
+    """
+    解析FILTER([STR(]?var[)] op 字面量)，返回FILTER之后的位置
+    """
+    if tokens[i][1] != '(':
+        raise SparqlSyntaxError('expected ( after FILTER')
+    i += 1
+    if tokens[i][1].upper() == 'STR':
+        var = tokens[i + 2][1][1:]
+        i += 4
+    else:
+        var = tokens[i][1][1:]
+        i += 1
+    kind, op = tokens[i]
+    if kind != 'op':
+        raise SparqlSyntaxError('unsupported FILTER expression')
+    kind, value = tokens[i + 1]
+    value = unquote(value) if kind == 'str' else value
+    if tokens[i + 2][1] != ')':
+        raise SparqlSyntaxError('expected ) after FILTER expression')
+    q.filters.append((var, op, value))
+    return i + 3
+
+
+def parse_values(tokens, i, q, term):
+    """
+    解析VALUES ?var {t ...}或VALUES (?a ?b) {(t t) ...}，UNDEF表示不绑定，返回VALUES之后的位置
+    """
+    if tokens[i][1] == '(':
+        variables = list()
+        i += 1
+        while tokens[i][1] != ')':
+            variables.append(tokens[i][1][1:])
+            i += 1
+        i += 1
+        multi = True
+    else:
+        variables = [tokens[i][1][1:]]
+        i += 1
+        multi = False
+    if tokens[i][1] != '{':
+        raise SparqlSyntaxError('expected { after VALUES variables')
+    i += 1
+    rows = list()
+    while tokens[i][1] != '}':
+        if multi:
+            if tokens[i][1] != '(':
+                raise SparqlSyntaxError('expected ( in VALUES block')
+            i += 1
+            row = list()
+            while tokens[i][1] != ')':
+                row.append(None if tokens[i][1].upper() == 'UNDEF' else term(tokens[i]))
+                i += 1
+            i += 1
+        else:
+            row = [None if tokens[i][1].upper() == 'UNDEF' else term(tokens[i])]
+            i += 1
+        if len(row) != len(variables):
+            raise SparqlSyntaxError('VALUES row has {} terms, expected {}'.format(len(row), len(variables)))
+        rows.append({v: t for v, t in zip(variables, row) if t is not None})
+    q.values = rows if q.values is None else [dict(a, **b) for a in q.values for b in rows
+                                              if all(a[k] == b[k] for k in a if k in b)]
+    return i + 1
+
+
+def parse_update(update):
+    """
+    解析[PREFIX ...] INSERT DATA {...} ; DELETE DATA {...} ...，数据块中只能是具体的三元组
+    :return: [('INSERT'或'DELETE', [(s, p, o), ...]), ...]
+    """
+    tokens = tokenize(update)
+    prefixes = dict()
+    operations = list()
+    i = 0
+    while i < len(tokens):
+        word = tokens[i][1].upper()
+        if word == ';':
+            i += 1
+        elif word == 'PREFIX':
+            prefixes[tokens[i + 1][1].rstrip(':')] = tokens[i + 2][1][1:-1]
+            i += 3
+        elif word in ('INSERT', 'DELETE'):
+            if i + 2 >= len(tokens) or tokens[i + 1][1].upper() != 'DATA' or tokens[i + 2][1] != '{':
+                raise SparqlSyntaxError('only INSERT DATA and DELETE DATA are supported')
+            i += 3
+            triples = list()
+            triple = list()
+            while tokens[i][1] != '}':
+                kind, value = tokens[i]
+                i += 1
+                if value == '.':
+                    continue
+                if kind == 'iri':
+                    triple.append((URI, value[1:-1]))
+                elif kind == 'str':
+                    triple.append((LITERAL, unquote(value)))
+                elif kind == 'pname':
+                    prefix, local = value.split(':', 1)
+                    if prefix not in prefixes:
+                        raise SparqlSyntaxError('unknown prefix {}'.format(prefix))
+                    triple.append((URI, prefixes[prefix] + local))
+                else:
+                    raise SparqlSyntaxError('unexpected token {} in DATA block'.format(value))
+                if len(triple) == 3:
+                    triples.append(tuple(triple))
+                    triple = list()
+            i += 1
+            operations.append((word, triples))
+        else:
+            raise SparqlSyntaxError('unexpected token {}'.format(tokens[i][1]))
+    return operations
+
+
+def apply_update(store, update):
+    """
+    执行更新，返回实际删除和插入的三元组数
+    """
+    removed = added = 0
+    for op, triples in parse_update(update):
+        for s, p, o in triples:
+            if op == 'INSERT':
+                added += store.add(s, p, o)
+            else:
+                removed += store.remove(s, p, o)
+    return removed, added
+
+
+FILTER_OPS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def evaluate(store, patterns, values=None):
+    """
+    基本图模式求值，每一步优先选择已绑定结点最多的三元组模式
+    :param values: VALUES给出的初始解，None表示从空解开始
+    :return: [{var: term}, ...]
+    """
+    solutions = [dict()] if values is None else [dict(v) for v in values]
+    remaining = list(patterns)
+    while remaining:
+        bound = solutions[0] if solutions else dict()
+        remaining.sort(key=lambda pt: -sum(1 for t in pt if not isinstance(t, str) or t in bound))
+        pattern = remaining.pop(0)
+        new_solutions = list()
+        for sol in solutions:
+            s, p, o = [sol.get(t) if isinstance(t, str) else t for t in pattern]
+            for triple in store.match(s, p, o):
+                new_sol = dict(sol)
+                ok = True
+                for t, value in zip(pattern, triple):
+                    if isinstance(t, str):
+                        if new_sol.setdefault(t, value) != value:
+                            ok = False
+                            break
+                if ok:
+                    new_solutions.append(new_sol)
+        solutions = new_solutions
+        if not solutions:
+            break
+    return solutions
+
+
+def execute(store, query):
+    """
+    执行查询，返回SPARQL JSON结果格式的字典
+    """
+    q = parse_query(query)
+    solutions = evaluate(store, q.patterns, q.values)
+    for var, op, value in q.filters:
+        compare = FILTER_OPS[op]
+        solutions = [s for s in solutions if var in s and compare(s[var][1], value)]
+
+    if q.form == 'ASK':
+        return {'head': {}, 'boolean': len(solutions) > 0}
+
+    if q.count is not None:
+        n = len(solutions) if q.count == '*' else sum(1 for s in solutions if q.count in s)
+        return {'head': {'vars': ['.1']},
+                'results': {'bindings': [{'.1': {'type': LITERAL, 'value': str(n),
+                                                 'datatype': 'http://www.w3.org/2001/XMLSchema#integer'}}]}}
+
+    rows = [tuple(s.get(v) for v in q.select) for s in solutions]
+    if q.distinct:
+        rows = list(dict.fromkeys(rows))
+    if q.order_by is not None and q.order_by in q.select:
+        k = q.select.index(q.order_by)
+        rows.sort(key=lambda r: (r[k] is None, r[k][1] if r[k] is not None else ''))
+    rows = rows[q.offset:]
+    if q.limit is not None:
+        rows = rows[:q.limit]
+
+    bindings = list()
+    for r in rows:
+        bindings.append({v: {'type': t[0], 'value': t[1]} for v, t in zip(q.select, r) if t is not None})
+    return {'head': {'vars': q.select}, 'results': {'bindings': bindings}}
+
+
+class LocalFusekiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        self.answer(params.get('query', [None])[0])
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        content_type = self.headers.get('Content-Type', '')
+        if urlparse(self.path).path.endswith('/update'):
+            if content_type.startswith('application/sparql-update'):
+                self.update(body)
+            else:
+                self.update(parse_qs(body).get('update', [None])[0])
+        elif content_type.startswith('application/sparql-query'):
+            self.answer(body)
+        else:
+            self.answer(parse_qs(body).get('query', [None])[0])
+
+    def update(self, update):
+        if update is None:
+            self.send_error(400, 'missing update')
+            return
+        try:
+            with self.server.lock:
+                apply_update(self.server.store, update)
+        except (SparqlSyntaxError, IndexError) as e:
+            self.send_error(400, 'bad update: {}'.format(e))
+            return
+        self.send_response(204)
+        self.end_headers()
+
+    def answer(self, query):
+        self.server.inject_delay()
+        if query is None:
+            self.send_error(400, 'missing query')
+            return
+        try:
+            # TODO 与更新互斥，避免查询时遍历的字典被修改
+            with self.server.lock:
+                result = execute(self.server.store, query)
+        except (SparqlSyntaxError, IndexError) as e:
+            self.send_error(400, 'bad query: {}'.format(e))
+            return
+        body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/sparql-results+json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalFusekiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, store, delay=0.0, jitter=0.0, pause=0.0, pause_rate=0.0):
+        super(LocalFusekiServer, self).__init__(address, LocalFusekiHandler)
+        self.store = store
+        self.delay = delay
+        self.jitter = jitter
+        self.pause = pause
+        self.pause_rate = pause_rate
+        self.lock = threading.Lock()
+
+    def inject_delay(self):
+        wait = self.delay
+        if self.jitter > 0:
+            wait += random.uniform(0, self.jitter)
+        if self.pause_rate > 0 and random.random() < self.pause_rate:
+            wait += self.pause
+        if wait > 0:
+            time.sleep(wait)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/cookbook/query'.format(host, port)
+
+    @property
+    def update_url(self):
+        host, port = self.server_address[:2]
+        return 'http://{}:{}/cookbook/update'.format(host, port)
+
+
+def start_local_fuseki(nt_paths, host='127.0.0.1', port=0, delay=0.0, jitter=0.0, store=None,
+                       pause=0.0, pause_rate=0.0):
+    """
+    在后台线程中启动本地Fuseki替身，port为0时自动选择端口
+    :param pause: 停顿的时长（秒）
+    :param pause_rate: 每个请求出现停顿的概率
+    :return: LocalFusekiServer，查询地址为server.url
+    """
+    if store is None:
+        store = TripleStore()
+        for p in nt_paths:
+            store.load(p)
+    server = LocalFusekiServer((host, port), store, delay, jitter, pause, pause_rate)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    server = start_local_fuseki(['./data/aifoodtime_ntriples.nt'], port=3030)
+    print('{} triples, endpoint {}'.format(server.store.size, server.url))
+    threading.Event().wait()
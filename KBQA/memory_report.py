@@ -0,0 +1,353 @@
+# encoding=utf-8
+
+"""
+
+@file: memory_report.py
+
+@time: 2026/10/19
+
+@desc: 问答服务中长期存在的各部分占用的内存，用于估算容器的内存大小。
+
+用tracemalloc记录建立每个部分前后仍未释放的内存（retained）和建立过程中的峰值，并按分配所在的文件归类
+（例如jieba/__init__.py是前缀词典，jieba/posseg是词性表，refo是编译后的规则）。统计的部分：
+
++ jieba词典：jieba的前缀词典和词性表，与外部词典无关
++ 外部词典：Tagger加载entities_list.txt增加的部分
++ 问题规则：每个领域编译后的规则
++ SPARQL连接：JenaFuseki/SPARQLWrapper
++ 补全索引、子图、增量更新使用的三元组副本、大类层次的传递闭包
++ 答案缓存：用实体×问法生成的问题预热后，平均每个问题的大小
+
+--scale给出kg_generator.py生成的若干个目录（entities_list.txt、vizdata.json、ntriples.nt），
+分别统计与知识图谱规模有关的部分，按实体数拟合每个实体增加的字节数，--project预估指定实体数时的大小。
+
+用法：
+python memory_report.py
+python memory_report.py --scale ../synthetic/1000 ../synthetic/10000 --project 100000
+
+qa_server.py --mem-report在启动时统计各部分的大小，并在/memory中返回，缓存的当前大小用deep_sizeof估算。
+
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import category_closure
+import jena_sparql_endpoint
+import kg_subgraph
+import local_fuseki
+import qa_service
+import question_suggest
+import question_temp
+import word_tagging
+
+
+def short_filename(filename):
+    """
+    .../site-packages/jieba/posseg/__init__.py -> jieba/posseg/__init__.py，本项目的文件只保留文件名
+    """
+    parts = filename.replace('\\', '/').split('/')
+    if 'site-packages' in parts:
+        return '/'.join(parts[parts.index('site-packages') + 1:])
+    if os.path.dirname(os.path.abspath(filename)) == os.path.dirname(os.path.abspath(__file__)):
+        return parts[-1]
+    return '/'.join(parts[-2:])
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    对象及其引用的容器、字符串等的大小（字节），共享的对象只计算一次；用于运行中缓存大小的估算
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, '__dict__'):
+            stack.append(o.__dict__)
+    return size
+
+
+class MemoryTracker:
+    def __init__(self, top=5):
+        """
+        :param top: 每个部分按文件归类后保留的条数
+        """
+        self.top = top
+        self.components = OrderedDict()
+        self._started = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    @staticmethod
+    def snapshot():
+        gc.collect()
+        return tracemalloc.take_snapshot().filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                                          tracemalloc.Filter(False, __file__)))
+
+    @contextmanager
+    def measure(self, name, count=None, attribute=True):
+        """
+        统计with块中建立的对象仍然占用的内存，结果保存在self.components[name]
+        :param name: 部分的名称
+        :param count: 元素个数（例如实体数），不为None时同时给出平均每个元素的字节数
+        :param attribute: 是否按文件归类；需要对整个堆做两次快照，堆很大时较慢
+        """
+        before = self.snapshot() if attribute else None
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - current
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - current
+        by_file = list()
+        if attribute:
+            stats = [s for s in self.snapshot().compare_to(before, 'filename') if s.size_diff > 0]
+            by_file = [(short_filename(s.traceback[0].filename), s.size_diff) for s in stats[:self.top]]
+        report = OrderedDict([
+            ('retained_bytes', retained),
+            ('peak_bytes', peak),
+            ('build_ms', round(elapsed * 1000, 3)),
+            ('by_file', by_file),
+        ])
+        if count is not None:
+            report['count'] = count
+            report['bytes_per_item'] = round(retained / float(count), 1) if count else None
+        self.components[name] = report
+
+    def stop(self):
+        """
+        统计完成后停止tracemalloc，避免影响之后的运行速度
+        """
+        if self._started and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def report(self):
+        return OrderedDict((name, dict(r)) for name, r in self.components.items())
+
+
+@contextmanager
+def null_measure(name, count=None):
+    yield
+
+
+def cache_sizes(service=None, suggester=None, subgraph=None):
+    """
+    运行中各缓存的条数和估算的字节数；list(dict.items())在CPython中不会与其它线程的写入交错
+    :return: {name: {'entries', 'bytes'}}
+    """
+    caches = OrderedDict()
+    if service is not None:
+        caches['answers'] = service.cache
+        caches['answer_index'] = service.entity_index
+    if suggester is not None:
+        caches['completions'] = suggester._completion_cache
+    if subgraph is not None:
+        caches['subgraphs'] = subgraph._cache
+    sizes = OrderedDict()
+    for name, cache in caches.items():
+        items = list(cache.items())
+        sizes[name] = {'entries': len(items), 'bytes': deep_sizeof(items) - sys.getsizeof(items)}
+    return sizes
+
+
+def count_entities(dict_paths):
+    count = 0
+    for p in dict_paths:
+        with open(p, encoding='utf-8') as f:
+            count += sum(1 for line in f if line.strip())
+    return count
+
+
+def measure_components(dict_paths, nt_paths, vizdata_path, endpoint='http://localhost:3030/cookbook/query',
+                       warm_budget=10.0, tracker=None):
+    """
+    依次建立问答服务的各部分并统计内存
+    :param warm_budget: 答案缓存预热的时间预算（秒），0表示不统计答案缓存
+    :return: MemoryTracker
+    """
+    tracker = tracker or MemoryTracker()
+    entities = count_entities(dict_paths)
+
+    with tracker.measure('jieba_dict'):
+        tagger = word_tagging.Tagger([])
+        tagger.warm_up()
+    with tracker.measure('user_dict', entities):
+        for p in dict_paths:
+            tagger.dt.load_userdict(p)
+        tagger.warm_up()
+    spec = question_temp.rule_spec()
+    profiles = list()
+    for name in question_temp.profile_names():
+        with tracker.measure('rules.' + name, len(spec['profiles'][name]['rules'])):
+            profiles.append(question_temp.compile_profile(name, spec['profiles'][name]))
+    with tracker.measure('sparql_client'):
+        fuseki = jena_sparql_endpoint.JenaFuseki(endpoint)
+    with tracker.measure('suggester', entities):
+        suggester = question_suggest.QuestionSuggester(dict_paths, vizdata_path)
+    with tracker.measure('subgraph', entities):
+        subgraph = kg_subgraph.KGSubgraph(nt_paths)
+    with tracker.measure('triple_store', entities):
+        store = local_fuseki.TripleStore()
+        for p in nt_paths:
+            store.load(p)
+    with tracker.measure('category_closure', entities):
+        hierarchy = category_closure.CategoryHierarchy.from_store(store)
+
+    if warm_budget > 0:
+        server = local_fuseki.start_local_fuseki(nt_paths, store=store)
+        service = qa_service.QAService(dict_paths, server.url)
+        service.q2s.get_sparql('如何制作水煮鱼？')
+        # TODO 只统计预热后缓存中的答案，预热线程的连接对象在预热结束后释放
+        with tracker.measure('answer_cache'):
+            service.warm_up_from_corpus(warm_budget, concurrency=1)
+        entry = tracker.components['answer_cache']
+        entry['count'] = len(service.cache)
+        entry['bytes_per_item'] = round(entry['retained_bytes'] / float(len(service.cache)), 1) \
+            if service.cache else None
+        server.shutdown()
+        server.server_close()
+    # TODO 以上变量只用于在统计期间保持引用
+    del tagger, profiles, fuseki, suggester, subgraph, hierarchy
+    return tracker
+
+
+def measure_scaling(data_dirs):
+    """
+    分别统计kg_generator.py生成的各个目录中与规模有关的部分
+    :return: [{'dir', 'entities', 'components': {name: retained_bytes}}, ...]，按实体数排序
+    """
+    rows = list()
+    # TODO 前缀词典也要在tracemalloc开始之后建立，否则加入外部词典时字典扩容会把整个新表计入外部词典
+    tracker = MemoryTracker()
+    for d in data_dirs:
+        dict_paths = [os.path.join(d, 'entities_list.txt')]
+        nt_paths = [os.path.join(d, 'ntriples.nt')]
+        entities = count_entities(dict_paths)
+        # TODO jieba的前缀词典与外部词典无关，在统计之外建立，只统计外部词典增加的部分
+        tagger = word_tagging.Tagger([])
+        tagger.warm_up()
+        tracker.components.clear()
+        with tracker.measure('user_dict', entities, attribute=False):
+            for p in dict_paths:
+                tagger.dt.load_userdict(p)
+            tagger.warm_up()
+        with tracker.measure('suggester', entities, attribute=False):
+            suggester = question_suggest.QuestionSuggester(dict_paths, os.path.join(d, 'vizdata.json'))
+        with tracker.measure('subgraph', entities, attribute=False):
+            subgraph = kg_subgraph.KGSubgraph(nt_paths)
+        with tracker.measure('triple_store', entities, attribute=False):
+            store = local_fuseki.TripleStore()
+            for p in nt_paths:
+                store.load(p)
+        rows.append({'dir': d, 'entities': entities,
+                     'components': {name: r['retained_bytes'] for name, r in tracker.components.items()}})
+        del tagger, suggester, subgraph, store
+    tracker.stop()
+    rows.sort(key=lambda r: r['entities'])
+    return rows
+
+
+def fit_growth(rows):
+    """
+    按实体数对每个部分做最小二乘直线拟合
+    :return: {name: (每个实体的字节数, 截距)}
+    """
+    growth = dict()
+    if len(rows) == 0:
+        return growth
+    for name in rows[0]['components']:
+        xs = [float(r['entities']) for r in rows]
+        ys = [float(r['components'][name]) for r in rows]
+        n = len(xs)
+        mx, my = sum(xs) / n, sum(ys) / n
+        var = sum((x - mx) ** 2 for x in xs)
+        slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var if var else (my / mx if mx else 0.0)
+        growth[name] = (slope, my - slope * mx)
+    return growth
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(n) < 1024:
+            return '{:.1f}{}'.format(n, unit)
+        n /= 1024.0
+    return '{:.1f}GB'.format(n)
+
+
+def print_components(tracker):
+    print('{:<16}{:>12}{:>12}{:>10}{:>14}  {}'.format('component', 'retained', 'peak', 'ms', 'bytes/item',
+                                                      'top files'))
+    total = 0
+    for name, r in tracker.components.items():
+        total += r['retained_bytes']
+        print('{:<16}{:>12}{:>12}{:>10.1f}{:>14}  {}'.format(
+            name, format_bytes(r['retained_bytes']), format_bytes(r['peak_bytes']), r['build_ms'],
+            '-' if r.get('bytes_per_item') is None else r['bytes_per_item'],
+            ', '.join('{} {}'.format(f, format_bytes(s)) for f, s in r['by_file'][:3])))
+    print('total retained {}'.format(format_bytes(total)))
+
+
+def print_scaling(rows, project=None):
+    names = list(rows[0]['components']) if rows else list()
+    print('{:<28}{:>10}'.format('data', 'entities') + ''.join('{:>14}'.format(n) for n in names))
+    for r in rows:
+        print('{:<28}{:>10}'.format(r['dir'][-28:], r['entities']) +
+              ''.join('{:>14}'.format(format_bytes(r['components'][n])) for n in names))
+    growth = fit_growth(rows)
+    # TODO 每个实体增加最多的部分排在前面，优先缩减
+    print('growth per entity (largest first):')
+    for name, (slope, intercept) in sorted(growth.items(), key=lambda x: -x[1][0]):
+        line = '  {:<14}{:>10.1f} B/entity'.format(name, slope)
+        if project:
+            line += '  ~{} at {} entities'.format(format_bytes(slope * project + intercept), project)
+        print(line)
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='问答服务各部分的内存占用')
+    parser.add_argument('--dict', action='append', default=None)
+    parser.add_argument('--nt', action='append', default=None)
+    parser.add_argument('--vizdata', default='./data/vizdata_mimini_aglin.json')
+    parser.add_argument('--warm-budget', type=float, default=10.0, help='答案缓存预热的时间预算(秒)，0表示不统计')
+    parser.add_argument('--scale', nargs='+', default=None, help='kg_generator.py生成的目录，统计随规模的增长')
+    parser.add_argument('--project', type=int, default=None, help='按拟合结果预估该实体数时的大小')
+    parser.add_argument('--json', action='store_true', help='输出JSON')
+    args = parser.parse_args()
+
+    if args.scale:
+        rows = measure_scaling(args.scale)
+        if args.json:
+            print(json.dumps({'rows': rows, 'growth': fit_growth(rows)}, ensure_ascii=False, indent=2))
+        else:
+            print_scaling(rows, args.project)
+    else:
+        tracker = measure_components(args.dict or ['./external_dict/entities_list.txt'],
+                                     args.nt or ['./data/aifoodtime_ntriples.nt'], args.vizdata,
+                                     warm_budget=args.warm_budget)
+        tracker.stop()
+        if args.json:
+            print(json.dumps(tracker.report(), ensure_ascii=False, indent=2))
+        else:
+            print_components(tracker)
@@ -0,0 +1,140 @@
+# encoding=utf-8
+
+"""
+
+@file: pipeline_metrics.py
+
+@time: 2026/10/19
+
+@desc: 问答流程的计时钩子。
+
+Question2Sparql和JenaFuseki接受hooks参数，钩子对象需要实现：
+    on_stage(stage, seconds)   记录一个阶段的耗时，阶段包括tag/match/render/query/parse
+    on_rule(rule_name, hit)    记录一条规则是否匹配
+hooks为None时不计时。PipelineMetrics把数据汇总到固定分桶的直方图中，可以导出为JSON或Prometheus文本格式。
+
+"""
+import bisect
+import json
+import threading
+
+# TODO 直方图分桶上界（秒），从50微秒到约52秒按2倍递增
+DEFAULT_BUCKETS = tuple(0.00005 * 2 ** i for i in range(21))
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # TODO 最后一个桶对应+Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        用分桶上界估计分位数
+        :param q: 0~1
+        :return:
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c > 0:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+        }
+
+
+class PipelineMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.stages = dict()
+        self.rules = dict()
+        self._lock = threading.Lock()
+
+    def on_stage(self, stage, seconds):
+        with self._lock:
+            h = self.stages.get(stage)
+            if h is None:
+                h = self.stages[stage] = Histogram(self.buckets)
+            h.observe(seconds)
+
+    def on_rule(self, rule_name, hit):
+        with self._lock:
+            counter = self.rules.get(rule_name)
+            if counter is None:
+                counter = self.rules[rule_name] = [0, 0]
+            counter[0 if hit else 1] += 1
+
+    def reset(self):
+        with self._lock:
+            self.stages = dict()
+            self.rules = dict()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'stages': {name: h.to_dict() for name, h in self.stages.items()},
+                'rules': {name: {'hit': c[0], 'miss': c[1]} for name, c in self.rules.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=4)
+
+    def to_prometheus(self, prefix='kbqa'):
+        """
+        导出为Prometheus文本格式
+        :param prefix: 指标名前缀
+        :return:
+        """
+        lines = list()
+        with self._lock:
+            name = prefix + '_stage_seconds'
+            lines.append('# HELP {} Latency of each question answering stage.'.format(name))
+            lines.append('# TYPE {} histogram'.format(name))
+            for stage, h in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, c in zip(h.buckets, h.counts):
+                    cumulative += c
+                    lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(name, stage, repr(bound), cumulative))
+                lines.append('{}_bucket{{stage="{}",le="+Inf"}} {}'.format(name, stage, h.count))
+                lines.append('{}_sum{{stage="{}"}} {}'.format(name, stage, repr(h.sum)))
+                lines.append('{}_count{{stage="{}"}} {}'.format(name, stage, h.count))
+
+            name = prefix + '_rule_matches_total'
+            lines.append('# HELP {} Times each question template rule matched or missed.'.format(name))
+            lines.append('# TYPE {} counter'.format(name))
+            for rule, c in sorted(self.rules.items()):
+                lines.append('{}{{rule="{}",result="hit"}} {}'.format(name, rule, c[0]))
+                lines.append('{}{{rule="{}",result="miss"}} {}'.format(name, rule, c[1]))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, fmt='json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus() if fmt == 'prometheus' else self.to_json())
+
+
+def rule_name(rule):
+    """
+    用规则对应的QuestionSet方法名作为规则名
+    :param rule:
+    :return:
+    """
+    return getattr(rule.action, '__name__', repr(rule))
@@ -0,0 +1,224 @@
+# encoding=utf-8
+
+"""
+
+@file: prefork.py
+
+@time: 2026/10/19
+
+@desc: 多进程(prefork)运行HTTP服务，用于qa_server.py --workers。
+
+主进程先建立好所有状态（jieba词典、编译后的规则、实体索引、子图的邻接数组、预热后的答案缓存）并监听端口，
+调用gc.freeze()后fork出多个工作进程，各进程在同一个监听套接字上接收请求，与主进程以写时复制的方式共享内存页。
+
++ 工作进程处理max_requests个请求后优雅退出（不再接收新连接，等待进行中的请求完成），由主进程补充新的进程
++ 主进程收到SIGHUP时先启动一组新的工作进程，再让旧的进程优雅退出；收到SIGTERM/SIGINT时全部退出。
+  设置了on_reload时，先在主进程中重新加载词典和规则（见hot_reload.py），新的工作进程从重新加载后的状态fork，
+  重新加载失败时不替换工作进程
++ 主进程收到SIGUSR1时（以及每隔report_interval秒）输出各进程的RSS/PSS，PSS之和小于RSS之和的部分即共享的内存
+
+"""
+import gc
+import os
+import signal
+import threading
+import time
+
+
+def memory_usage(pid):
+    """
+    读取/proc/<pid>/smaps_rollup中的内存统计（kB），不支持时只返回RSS
+    :return: {'rss', 'pss', 'shared', 'private'}，无法读取时为None
+    """
+    fields = dict()
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        try:
+            with open('/proc/{}/status'.format(pid)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return {'rss': int(line.split()[1]), 'pss': None, 'shared': None, 'private': None}
+        except OSError:
+            return None
+        return None
+    return {
+        'rss': fields.get('Rss'),
+        'pss': fields.get('Pss'),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+class PreforkServer:
+    def __init__(self, server, workers=2, max_requests=0, graceful_timeout=30.0, report_interval=0.0,
+                 on_reload=None):
+        """
+        :param server: 已经绑定端口的socketserver（例如ThreadingHTTPServer）
+        :param workers: 工作进程数
+        :param max_requests: 每个工作进程最多处理的请求数，0表示不限
+        :param graceful_timeout: 优雅退出时等待进行中请求的时间（秒）
+        :param report_interval: 定时输出内存报告的间隔（秒），0表示只在SIGUSR1时输出
+        :param on_reload: 收到SIGHUP时在替换工作进程之前调用，返回False时不替换
+        """
+        self.server = server
+        self.num_workers = workers
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.report_interval = report_interval
+        self.on_reload = on_reload
+        self.workers = dict()
+        self.retiring = set()
+        self.stopping = False
+        self._recycle = False
+        self._report = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.run_worker()
+            finally:
+                os._exit(0)
+        self.workers[pid] = time.time()
+        return pid
+
+    def run_worker(self):
+        for sig in (signal.SIGHUP, signal.SIGUSR1, signal.SIGINT):
+            signal.signal(sig, signal.SIG_IGN)
+        server = self.server
+        stopped = threading.Event()
+
+        def stop(*args):
+            if not stopped.is_set():
+                stopped.set()
+                # TODO shutdown会等待serve_forever退出，不能在serve_forever所在的线程中调用
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        gc.enable()
+
+        handled = [0]
+        process_request = server.process_request
+
+        def counted(request, client_address):
+            process_request(request, client_address)
+            handled[0] += 1
+            if self.max_requests and handled[0] >= self.max_requests:
+                stop()
+        server.process_request = counted
+
+        server.serve_forever()
+        # TODO 等待进行中的请求完成
+        deadline = time.time() + self.graceful_timeout
+        while threading.active_count() > 1 and time.time() < deadline:
+            time.sleep(0.05)
+
+    def recycle(self):
+        """
+        先启动新的工作进程，再让旧的进程优雅退出
+        """
+        old = list(self.workers)
+        if hasattr(gc, 'freeze'):
+            # TODO 重新加载后新建立的对象
+            gc.collect()
+            gc.freeze()
+        for _ in range(self.num_workers):
+            self.spawn()
+        for pid in old:
+            self.retiring.add(pid)
+            self.kill(pid, signal.SIGTERM)
+
+    @staticmethod
+    def kill(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def report(self):
+        """
+        :return: [(角色, pid, 内存统计), ...]
+        """
+        rows = [('master', os.getpid(), memory_usage(os.getpid()))]
+        rows += [('worker', pid, memory_usage(pid)) for pid in sorted(self.workers)]
+        return rows
+
+    def print_report(self):
+        rows = self.report()
+        print('{:<8}{:>8}{:>12}{:>12}{:>12}{:>12}'.format('role', 'pid', 'rss(kB)', 'pss(kB)', 'shared(kB)',
+                                                          'private(kB)'))
+        for role, pid, mem in rows:
+            if mem is None:
+                continue
+            print('{:<8}{:>8}{:>12}{:>12}{:>12}{:>12}'.format(role, pid, *[
+                '-' if mem[k] is None else mem[k] for k in ('rss', 'pss', 'shared', 'private')]))
+        rss = sum(m['rss'] or 0 for _, _, m in rows if m is not None)
+        pss = sum(m['pss'] or 0 for _, _, m in rows if m is not None)
+        print('total rss {} kB, total pss {} kB'.format(rss, pss), flush=True)
+
+    def run(self):
+        def on_stop(*args):
+            self.stopping = True
+
+        def on_hup(*args):
+            self._recycle = True
+
+        def on_usr1(*args):
+            self._report = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_hup)
+        signal.signal(signal.SIGUSR1, on_usr1)
+
+        # TODO 主进程中已建立的对象移入永久代，子进程的垃圾回收不再访问（写入）这些对象所在的内存页
+        if hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        last_report = time.time()
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid != 0 and pid in self.workers:
+                del self.workers[pid]
+                if pid in self.retiring:
+                    self.retiring.discard(pid)
+                else:
+                    # TODO 达到max_requests或异常退出的工作进程
+                    self.spawn()
+                continue
+            if self._recycle:
+                self._recycle = False
+                if self.on_reload is None or self.on_reload():
+                    self.recycle()
+            if self._report or (self.report_interval and time.time() - last_report >= self.report_interval):
+                self._report = False
+                last_report = time.time()
+                self.print_report()
+            time.sleep(0.1)
+
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout
+        while self.workers and time.time() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.05)
+            else:
+                self.workers.pop(pid, None)
+        for pid in list(self.workers):
+            self.kill(pid, signal.SIGKILL)
+        self.server.server_close()
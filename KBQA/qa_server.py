@@ -0,0 +1,219 @@
+# encoding=utf-8
+
+"""
+
+@file: qa_server.py
+
+@time: 2026/10/19
+
+@desc: 问答服务的HTTP接口，供网页端调用。目前提供：
+
+1. /suggest?q=部分问题   问题补全提示，适合每次按键调用
+2. /subgraph?id=实体&k=1&cap=30   实体的k跳邻域子图，格式与vizdata.json相同
+3. /answer?q=问题   回答问题，结果带缓存，见qa_service.py；启动时可以先预热缓存。
+   "某个大类包括哪些菜"用大类层次的传递闭包回答，包括各级子类中的菜品，见category_closure.py
+4. /memory   当前进程的RSS/PSS；--mem-report时还有启动时各部分占用的内存和各缓存当前的大小，见memory_report.py
+5. POST /update   知识图谱的增量更新，请求体为kg_update.py生成的差异{"removed": [...], "added": [...]}，
+   更新词典、子图和补全索引，只清除涉及变化实体的缓存答案（Fuseki由kg_update.py更新）；
+   新增和删除的词语同时写入第一个可写的外部词典，重新加载后仍然有效，没有可写的词典时拒绝更新
+6. POST /reload   重新加载外部词典、问题规则和补全索引，见hot_reload.py；请求体可以为{"dict": [词典, ...]}
+   更换词典，返回各部分的耗时；加载期间的请求仍然用旧的状态回答
+
+--workers大于0时以prefork方式运行，见prefork.py；此时各进程的状态相互独立，不支持/update和/reload，
+向主进程发送SIGHUP重新加载。
+
+"""
+import argparse
+import json
+import os
+import signal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import category_closure
+import hot_reload
+import kg_subgraph
+import kg_update
+import local_fuseki
+import memory_report
+import prefork
+import qa_service
+import question_suggest
+
+
+class QAHandler(BaseHTTPRequestHandler):
+    # TODO 由QAServer在启动前设置
+    suggester = None
+    subgraph = None
+    service = None
+    updater = None
+    reloader = None
+    tracker = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        route = getattr(self, 'route_' + url.path.strip('/'), None)
+        if route is None:
+            self.send_json({'error': 'not found'}, status=404)
+            return
+        try:
+            self.send_json(route(params))
+        except (KeyError, ValueError) as e:
+            self.send_json({'error': str(e)}, status=400)
+        except Exception as e:
+            # TODO Fuseki无法连接等服务端错误
+            self.send_json({'error': '{}: {}'.format(type(e).__name__, e)}, status=500)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        route = getattr(self, 'post_' + url.path.strip('/'), None)
+        if route is None:
+            self.send_json({'error': 'not found'}, status=404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            self.send_json(route(json.loads(self.rfile.read(length).decode('utf-8'))))
+        except (KeyError, ValueError) as e:
+            self.send_json({'error': str(e)}, status=400)
+        except Exception as e:
+            self.send_json({'error': '{}: {}'.format(type(e).__name__, e)}, status=500)
+
+    def post_update(self, body):
+        if self.updater is None:
+            raise ValueError('incremental update is not supported with --workers')
+        if self.updater.dict_path is None:
+            raise ValueError('no writable external dictionary: words added by /update would be lost on reload')
+        with self.reloader.lock:
+            return self.updater.apply(kg_update.TripleDelta.from_dict(body))
+
+    def post_reload(self, body):
+        if self.reloader is None:
+            raise ValueError('send SIGHUP to the master process to reload with --workers')
+        return self.reloader.reload(body.get('dict'))
+
+    def route_suggest(self, params):
+        partial = params.get('q', [''])[0]
+        limit = int(params.get('limit', ['10'])[0])
+        return {'q': partial, 'suggestions': self.suggester.suggest(partial, limit)}
+
+    def route_answer(self, params):
+        return self.service.answer(params['q'][0])
+
+    def route_memory(self, params):
+        report = {'pid': os.getpid(), 'memory_kb': prefork.memory_usage(os.getpid())}
+        if self.tracker is not None:
+            report['components'] = self.tracker.report()
+            report['caches'] = memory_report.cache_sizes(self.service, self.suggester, self.subgraph)
+        return report
+
+    def route_subgraph(self, params):
+        name = params['id'][0]
+        k = int(params.get('k', ['1'])[0])
+        cap = int(params.get('cap', ['30'])[0])
+        max_nodes = int(params.get('max_nodes', ['500'])[0])
+        if k < 0 or cap <= 0 or max_nodes <= 0:
+            raise ValueError('k, cap and max_nodes must be positive')
+        return self.subgraph.subgraph(name, k, cap, max_nodes)
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host, port, dict_paths, nt_paths, endpoint='http://localhost:3030/cookbook/query', tracker=None):
+    """
+    :param tracker: memory_report.MemoryTracker，不为None时统计各部分建立后占用的内存
+    """
+    measure = tracker.measure if tracker is not None else memory_report.null_measure
+    QAHandler.tracker = tracker
+    with measure('suggester'):
+        QAHandler.suggester = question_suggest.QuestionSuggester(dict_paths)
+    with measure('subgraph'):
+        QAHandler.subgraph = kg_subgraph.KGSubgraph(nt_paths)
+    # TODO 增量更新时用于计算实体是否仍然存在的三元组副本
+    with measure('triple_store'):
+        store = local_fuseki.TripleStore()
+        for p in nt_paths:
+            store.load(p)
+    with measure('category_closure'):
+        hierarchy = category_closure.CategoryHierarchy.from_store(store)
+    # TODO jieba词典、外部词典、问题规则和SPARQL连接
+    with measure('qa_service'):
+        QAHandler.service = qa_service.QAService(dict_paths, endpoint, hierarchy=hierarchy)
+    QAHandler.updater = kg_update.KGUpdater(store, tagger=QAHandler.service.q2s.tw, service=QAHandler.service,
+                                            subgraph=QAHandler.subgraph, suggester=QAHandler.suggester,
+                                            dict_path=kg_update.writable_dict(dict_paths), hierarchy=hierarchy)
+
+    def swap_suggester(suggester):
+        QAHandler.suggester = suggester
+    QAHandler.reloader = hot_reload.HotReloader(QAHandler.service, QAHandler.suggester, QAHandler.updater,
+                                                on_swap=swap_suggester)
+    return ThreadingHTTPServer((host, port), QAHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='爱食光问答服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--dict', action='append', default=None,
+                        help='外部词典，可以指定多次')
+    parser.add_argument('--nt', action='append', default=None,
+                        help='子图使用的三元组文件，可以指定多次')
+    parser.add_argument('--endpoint', action='append', default=None,
+                        help='Fuseki的查询地址，指定多次时在多个副本之间负载均衡')
+    parser.add_argument('--warm-log', default=None, help='用历史问题日志预热答案缓存')
+    parser.add_argument('--warm-top', type=int, default=1000, help='预热日志中出现次数最多的N个问题')
+    parser.add_argument('--warm-corpus', action='store_true', help='用实体×问法生成的问题集预热')
+    parser.add_argument('--warm-budget', type=float, default=30.0, help='预热的时间预算(秒)')
+    parser.add_argument('--workers', type=int, default=0, help='prefork的工作进程数，0表示单进程')
+    parser.add_argument('--max-requests', type=int, default=0, help='工作进程处理多少个请求后重启，0表示不限')
+    parser.add_argument('--report-interval', type=float, default=0.0,
+                        help='prefork时每隔多少秒输出各进程的内存，0表示只在收到SIGUSR1时输出')
+    parser.add_argument('--mem-report', action='store_true',
+                        help='启动时用tracemalloc统计各部分占用的内存（启动会变慢），输出并在/memory中返回')
+    parser.add_argument('--reload-interval', type=float, default=0.0,
+                        help='每隔多少秒检查词典和规则文件，有修改时重新加载，0表示只通过/reload或SIGHUP重新加载')
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or ['http://localhost:3030/cookbook/query']
+    tracker = memory_report.MemoryTracker() if args.mem_report else None
+    server = make_server(args.host, args.port, args.dict or ['./external_dict/entities_list.txt'],
+                         args.nt or ['./data/aifoodtime_ntriples.nt'],
+                         endpoints if len(endpoints) > 1 else endpoints[0], tracker)
+    if tracker is not None:
+        tracker.stop()
+        memory_report.print_components(tracker)
+    # TODO 预热完成后再开始接收请求
+    if args.warm_log is not None:
+        report = QAHandler.service.warm_up_from_log(args.warm_log, args.warm_top, args.warm_budget)
+        print('warm up: {}'.format(json.dumps(report, ensure_ascii=False)))
+    elif args.warm_corpus:
+        report = QAHandler.service.warm_up_from_corpus(args.warm_budget)
+        print('warm up: {}'.format(json.dumps(report, ensure_ascii=False)))
+    print('listening on http://{}:{}'.format(args.host, args.port), flush=True)
+    if args.workers > 0:
+        # TODO jieba的词性标注数据在第一次分词时才加载，在fork之前完成
+        QAHandler.service.q2s.get_sparql('如何制作水煮鱼？')
+        QAHandler.updater = None
+        reloader = QAHandler.reloader
+        QAHandler.reloader = None
+        master = prefork.PreforkServer(server, args.workers, args.max_requests,
+                                       report_interval=args.report_interval,
+                                       on_reload=lambda: reloader.try_reload() is not None)
+        if args.reload_interval > 0:
+            # TODO 监视线程只发送SIGHUP，由主循环重新加载后替换工作进程
+            reloader.watch(args.reload_interval, notify=lambda: os.kill(os.getpid(), signal.SIGHUP))
+        master.run()
+    else:
+        if args.reload_interval > 0:
+            QAHandler.reloader.watch(args.reload_interval)
+        server.serve_forever()
@@ -0,0 +1,309 @@
+# encoding=utf-8
+
+"""
+
+@file: qa_service.py
+
+@time: 2026/10/19
+
+@desc: 问答服务：问题 -> SPARQL -> 答案，带答案缓存，供qa_server.py和其它调用方使用。
+
+启动后、接收请求之前可以预热缓存：从历史问题日志中按出现次数取前N个问题，或者使用实体×问法生成的问题集，
+在限定的时间内依次回答，结束时报告已缓存的问题占预期流量的比例。
+
+缓存按实体建立索引（查询中的字面量和答案中的值），知识图谱增量更新时只删除涉及变化实体的答案，见kg_update.py。
+词典或规则重新加载后清空缓存，见hot_reload.py。
+给出大类层次（category_closure.py）时，"某个大类包括哪些菜"直接用预先计算的区间回答，包括各级子类中的菜品，不查询Fuseki。
+
+"""
+import json
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import jena_sparql_endpoint
+import local_fuseki
+import pipeline_metrics
+import question2sparql
+import question_temp
+
+
+# TODO question_temp生成的查询中，实体名称以单引号字面量出现
+QUERY_LITERAL_RE = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+def normalize(question):
+    return question.strip()
+
+
+def entry_entities(entry):
+    """
+    缓存的答案涉及的实体：查询中的字面量和答案中的值（合并查询为各组的值）；没有匹配到模板的问题用None表示
+    """
+    if entry['query'] is None:
+        return {None}
+    names = set(QUERY_LITERAL_RE.findall(entry['query']))
+    if isinstance(entry['answer'], list):
+        for v in entry['answer']:
+            if isinstance(v, dict):
+                names.update(v['answer'])
+            elif isinstance(v, str):
+                names.add(v)
+    return names
+
+
+def read_question_log(path):
+    """
+    读取历史问题日志，每行一个问题或带question字段的JSON（例如bulk_query.py的输出）
+    :return: Counter {question: 出现次数}
+    """
+    counts = Counter()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                line = json.loads(line)['question']
+            counts[normalize(line)] += 1
+    return counts
+
+
+class QAService:
+    def __init__(self, dict_paths, endpoint='http://localhost:3030/cookbook/query', max_cache=65536,
+                 hierarchy=None):
+        """
+        :param dict_paths: 外部词典
+        :param endpoint: 查询地址或地址列表，见JenaFuseki
+        :param max_cache: 最多缓存的问题数，超过时淘汰最久未使用的
+        :param hierarchy: category_closure.CategoryHierarchy，为None时大类的问题也查询Fuseki
+        """
+        self.dict_paths = dict_paths
+        self.hierarchy = hierarchy
+        self.q2s = question2sparql.Question2Sparql(dict_paths)
+        self.endpoint = endpoint
+        self.max_cache = max_cache
+        self.cache = OrderedDict()
+        # TODO 实体 -> 涉及该实体的缓存问题
+        self.entity_index = dict()
+        # TODO 每次清除缓存后加一，清除之前开始计算的答案不再写入缓存
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def fuseki(self):
+        # TODO SPARQLWrapper的连接对象不是线程安全的，每个线程使用自己的JenaFuseki
+        fuseki = getattr(self._local, 'fuseki', None)
+        if fuseki is None:
+            fuseki = self._local.fuseki = jena_sparql_endpoint.JenaFuseki(self.endpoint)
+        return fuseki
+
+    def lookup(self, question):
+        with self._lock:
+            entry = self.cache.get(question)
+            if entry is not None:
+                self.cache.move_to_end(question)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def store(self, question, entry, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self.cache.get(question)
+            if old is not None:
+                self._unindex(question, old)
+            self.cache[question] = entry
+            self.cache.move_to_end(question)
+            for name in entry_entities(entry):
+                self.entity_index.setdefault(name, set()).add(question)
+            while len(self.cache) > self.max_cache:
+                self._unindex(*self.cache.popitem(last=False))
+
+    def _unindex(self, question, entry):
+        for name in entry_entities(entry):
+            questions = self.entity_index.get(name)
+            if questions is not None:
+                questions.discard(question)
+                if len(questions) == 0:
+                    del self.entity_index[name]
+
+    def invalidate(self, names, unmatched=False):
+        """
+        删除涉及这些实体的缓存答案
+        :param names: 实体名称
+        :param unmatched: 是否同时删除没有匹配到模板的问题（词典中加入了新实体时，这些问题可能可以回答了）
+        :return: 删除的问题数
+        """
+        names = set(names)
+        if unmatched:
+            names.add(None)
+        removed = 0
+        with self._lock:
+            self.generation += 1
+            for name in names:
+                for question in list(self.entity_index.get(name, ())):
+                    self._unindex(question, self.cache.pop(question))
+                    removed += 1
+        return removed
+
+    def clear(self):
+        """
+        清空答案缓存，清除之前开始计算的答案不再写入
+        :return: 删除的问题数
+        """
+        with self._lock:
+            self.generation += 1
+            removed = len(self.cache)
+            self.cache.clear()
+            self.entity_index.clear()
+        return removed
+
+    def reload(self, dict_paths=None, prepare=None):
+        """
+        重新加载词典和规则（见Question2Sparql.reload），替换后清空答案缓存；加载期间仍然用旧的词典和规则回答
+        :param dict_paths: 外部词典，为None时使用原来的词典
+        :param prepare: 替换之前对新的解析状态调用
+        :return: 报告
+        """
+        start = time.perf_counter()
+        if dict_paths is not None:
+            self.dict_paths = list(dict_paths)
+        report = self.q2s.reload(self.dict_paths, prepare=prepare)
+        report['answers_invalidated'] = self.clear()
+        report['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return report
+
+    def compute(self, question):
+        """
+        不使用缓存回答问题
+        :return: {'query', 'rule', 'answer'}，没有匹配的模板时query为None；ASK查询的answer为布尔值；
+        多个(实体, 属性)组合的问题answer为[{'entity', 'property', 'answer'}, ...]
+        """
+        query, rule = self.q2s.get_sparql_rule(question)
+        entry = {'query': query, 'rule': pipeline_metrics.rule_name(rule) if rule is not None else None,
+                 'answer': None}
+        if query is not None:
+            dishes = self.hierarchy.answer(query) if self.hierarchy is not None else None
+            if dishes is not None:
+                entry['answer'] = dishes
+            else:
+                fuseki = self.fuseki()
+                entry['answer'] = fuseki.get_sparql_result_value(fuseki.get_sparql_result(query))
+        return entry
+
+    def answer(self, question):
+        """
+        :return: {'question', 'query', 'rule', 'answer', 'cached'}
+        """
+        question = normalize(question)
+        entry = self.lookup(question)
+        cached = entry is not None
+        if not cached:
+            generation = self.generation
+            entry = self.compute(question)
+            self.store(question, entry, generation)
+        result = dict(entry)
+        result['question'] = question
+        result['cached'] = cached
+        return result
+
+    def warm_up(self, weighted_questions, budget=30.0, concurrency=4):
+        """
+        按权重从大到小回答问题并写入缓存，超出时间预算后停止
+        :param weighted_questions: [(question, 权重), ...]，权重为预期的出现次数
+        :param budget: 时间预算（秒）
+        :param concurrency: 同时回答的问题数
+        :return: 预热报告
+        """
+        ordered = sorted(((normalize(q), w) for q, w in weighted_questions), key=lambda x: -x[1])
+        total_weight = float(sum(w for _, w in ordered)) or 1.0
+        start = time.perf_counter()
+        deadline = start + budget
+        warmed = failed = 0
+        warmed_weight = 0.0
+        stopped = 'done'
+
+        def work(question):
+            if self.lookup(question) is None:
+                generation = self.generation
+                self.store(question, self.compute(question), generation)
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            pending = list()
+            for question, weight in ordered:
+                if time.perf_counter() >= deadline:
+                    stopped = 'budget'
+                    break
+                pending.append((pool.submit(work, question), weight))
+                # TODO 限制提交的数量，超出预算时不再有大量排队的问题
+                if len(pending) >= concurrency * 2:
+                    future, w = pending.pop(0)
+                    if future.exception() is None:
+                        warmed += 1
+                        warmed_weight += w
+                    else:
+                        failed += 1
+            for future, w in pending:
+                if future.exception() is None:
+                    warmed += 1
+                    warmed_weight += w
+                else:
+                    failed += 1
+
+        with self._lock:
+            # TODO 预热时的查找不计入命中率
+            self.hits = self.misses = 0
+        return {
+            'candidates': len(ordered),
+            'warmed': warmed,
+            'failed': failed,
+            'cached': len(self.cache),
+            'question_coverage': warmed / float(len(ordered)) if ordered else 0.0,
+            'traffic_coverage': warmed_weight / total_weight,
+            'elapsed_s': time.perf_counter() - start,
+            'budget_s': budget,
+            'stopped': stopped,
+        }
+
+    def warm_up_from_log(self, log_path, top=1000, budget=30.0, concurrency=4):
+        """
+        从历史问题日志中取出现次数最多的top个问题预热，traffic_coverage相对于日志中的全部问题
+        """
+        counts = read_question_log(log_path)
+        report = self.warm_up(counts.most_common(top), budget, concurrency)
+        total = sum(counts.values())
+        top_weight = sum(c for _, c in counts.most_common(top))
+        report['traffic_coverage'] *= top_weight / float(total) if total else 0.0
+        report['source'] = log_path
+        return report
+
+    def warm_up_from_corpus(self, budget=30.0, concurrency=4):
+        """
+        用实体×问法生成的问题集预热，每个问题的权重相同
+        """
+        report = self.warm_up([(q, 1) for q in question_temp.generate_corpus(self.dict_paths)], budget, concurrency)
+        report['source'] = 'corpus'
+        return report
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'cached': len(self.cache), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / float(lookups) if lookups else 0.0}
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    server = local_fuseki.start_local_fuseki(['./data/aifoodtime_ntriples.nt'], delay=0.002)
+    service = QAService(['./external_dict/entities_list.txt'], server.url)
+    print(service.warm_up_from_corpus(budget=2.0))
+    for q in ['元宝红烧肉的主料是什么？', '红烧肉类包含哪些菜？', '鱼香肉丝和水煮肉片的主料和辅料是什么？']:
+        print(service.answer(q))
+    print(service.stats())
@@ -7,16 +7,51 @@
 @time: 2020/03/29
 
 """
+import argparse
+import sys
+
+import answer_format
+import category_closure
 import jena_sparql_endpoint
+import pipeline_metrics
 import question2sparql
 
 
+def print_unknown(question):
+    # TODO 查询结果为空，根据OWA，回答“不知道”
+    if ('配料' in question):
+        print("这道菜好像不需要配料哦，试试问我其它问题哈。")
+    else:
+        print('这个我真是不知道，请再问个其它问题，例如：')
+        print('如何制作水煮鱼？')
+
+
+def ask_more():
+    print('\n（还有更多结果，按回车继续，输入其它内容结束）')
+    return input() == ''
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metrics', default=None,
+                        help='每次回答后把各阶段耗时写入该文件，以.prom结尾时使用Prometheus文本格式')
+    parser.add_argument('--page-size', type=int, default=50,
+                        help='结果较多时每页显示的个数')
+    parser.add_argument('--endpoint', action='append', default=None,
+                        help='Fuseki的查询地址，指定多次时在多个副本之间负载均衡')
+    parser.add_argument('--nt', action='append', default=None,
+                        help='计算大类层次结构的三元组文件，可以指定多次')
+    args = parser.parse_args()
+    metrics = pipeline_metrics.PipelineMetrics() if args.metrics else None
+
     # TODO 连接Fuseki服务器。
-    fuseki = jena_sparql_endpoint.JenaFuseki()
+    endpoints = args.endpoint or ['http://localhost:3030/cookbook/query']
+    fuseki = jena_sparql_endpoint.JenaFuseki(endpoints if len(endpoints) > 1 else endpoints[0], hooks=metrics)
     # TODO 初始化自然语言到SPARQL查询的模块，参数是外部词典列表。
     q2s = question2sparql.Question2Sparql(
-        ['./external_dict/entities_list.txt'])
+        ['./external_dict/entities_list.txt'], hooks=metrics)
+    # TODO 大类包括哪些菜（包括子类中的菜品）用预先计算的闭包回答，与问答服务相同，见category_closure.py
+    hierarchy = category_closure.CategoryHierarchy.from_nt(args.nt or ['./data/aifoodtime_ntriples.nt'])
 
     print("\n\n爱好美食的您好啊，小食在此为您提供问答服务")
     print("可以提问的菜品大类包括：1.红烧肉类，2.红烧排骨类，3.可乐鸡翅类，4.糖醋排骨类，5.水煮鱼类")
@@ -28,6 +63,7 @@ if __name__ == '__main__':
     print("红烧肉类包含哪些菜？")
     print("麻辣水煮肉片的食材有哪些？")
     print("水煮肉片的主料是什么？")
+    print("鱼香肉丝和水煮肉片的主料和辅料是什么？")
 
     while True:
         print("\n\n")
@@ -37,7 +73,18 @@ if __name__ == '__main__':
         my_query = q2s.get_sparql(question)
         #print('最终的查询语句:\n{}'.format(my_query))
         print('\n小食：')
-        if my_query is not None:
+        dishes = hierarchy.answer(my_query)
+        if dishes is not None:
+            pages = [dishes[i:i + args.page_size] for i in range(0, len(dishes), args.page_size)]
+            if answer_format.write_answer(pages, sys.stdout, more=ask_more, page_size=args.page_size) == 0:
+                print_unknown(question)
+        # TODO 多个组合的合并查询（带VALUES）一次取回全部结果，按组合分组输出
+        elif my_query is not None and u'SELECT DISTINCT' in my_query and u'VALUES' not in my_query:
+            # TODO 分页查询，先输出第一页，需要时再取后面的页
+            pages = fuseki.iter_pages(my_query, args.page_size)
+            if answer_format.write_answer(pages, sys.stdout, more=ask_more, page_size=args.page_size) == 0:
+                print_unknown(question)
+        elif my_query is not None:
             result = fuseki.get_sparql_result(my_query)
             value = fuseki.get_sparql_result_value(result)
 
@@ -48,20 +95,12 @@ if __name__ == '__main__':
                 else:
                     print('I don\'t know. :(')
             else:
-                # TODO 查询结果为空，根据OWA，回答“不知道”
                 if len(value) == 0:
-                    if ('配料' in question):
-                        print("这道菜好像不需要配料哦，试试问我其它问题哈。")
-                    else:
-                        print('这个我真是不知道，请再问个其它问题，例如：')
-                        print('如何制作水煮鱼？')
-                elif len(value) == 1:
-                    print(value[0])
+                    print_unknown(question)
+                elif isinstance(value[0], dict):
+                    answer_format.write_groups(value, sys.stdout)
                 else:
-                    output = ''
-                    for v in value:
-                        output += v + u'、'
-                    print(output[0:-1])
+                    print(u'、'.join(value))
 
         else:
             # TODO 自然语言问题无法匹配到已有的正则模板上，回答“无法理解”
@@ -73,5 +112,8 @@ if __name__ == '__main__':
             print("麻辣水煮肉片的食材有哪些？")
             print("水煮肉片的主料是什么？")
 
+        if metrics is not None:
+            metrics.dump(args.metrics, 'prometheus' if args.metrics.endswith('.prom') else 'json')
+
         #print('\nquestion: {}'.format(question))
         print('=' * 150)
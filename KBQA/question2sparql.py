@@ -8,16 +8,87 @@
 
 @desc: 将自然语言转为SPARQL查询语句
 
+分词器和规则保存在ParserState中，reload()在后台建立新的ParserState后整体替换（热加载），
+每次解析开始时只读取一次self.state，正在进行的解析使用旧的状态完成。
+
 """
 
+import threading
+import time
+
+import pipeline_metrics
 import question_temp
 import word_tagging
 
 
+class ParserState(object):
+    """
+    分词器和匹配规则，重新加载时整体替换
+    """
+
+    def __init__(self, dict_paths, profiles, check=False):
+        """
+        :param dict_paths: 外部词典
+        :param profiles: 规则领域
+        :param check: 是否检查规则文件有没有变化
+        """
+        clock = time.perf_counter
+        t0 = clock()
+        self.dict_paths = list(dict_paths)
+        self.profiles = tuple(profiles)
+        self.tagger = word_tagging.Tagger(self.dict_paths)
+        self.tagger.warm_up()
+        t1 = clock()
+        self.rules = question_temp.profile_rules(*self.profiles, check=check)
+        t2 = clock()
+        self.build_ms = {'tagger': round((t1 - t0) * 1000, 3), 'rules': round((t2 - t1) * 1000, 3)}
+
+
 class Question2Sparql:
-    def __init__(self, dict_paths):
-        self.tw = word_tagging.Tagger(dict_paths)
-        self.rules = question_temp.rules
+    def __init__(self, dict_paths, hooks=None, profiles=('food',)):
+        """
+        :param dict_paths: 外部词典
+        :param hooks: 计时钩子
+        :param profiles: 使用的规则领域，见data/question_rules.json，默认只加载菜谱的规则
+        """
+        self.state = ParserState(dict_paths, profiles)
+        # TODO 计时钩子，见pipeline_metrics.py，为None时不计时
+        self.hooks = hooks
+        self.version = 1
+        self._reload_lock = threading.Lock()
+
+    @property
+    def tw(self):
+        return self.state.tagger
+
+    @property
+    def rules(self):
+        return self.state.rules
+
+    def reload(self, dict_paths=None, profiles=None, prepare=None):
+        """
+        在调用的线程中重新建立分词器并加载规则，完成后整体替换；替换前开始的解析仍然使用旧的分词器和规则
+        :param dict_paths: 外部词典，为None时使用原来的词典
+        :param profiles: 规则领域，为None时使用原来的领域
+        :param prepare: 替换之前对新的ParserState调用，例如重放增量更新加入的词语
+        :return: 报告，包括各部分的耗时
+        """
+        with self._reload_lock:
+            old = self.state
+            state = ParserState(old.dict_paths if dict_paths is None else dict_paths,
+                                old.profiles if profiles is None else profiles, check=True)
+            if prepare is not None:
+                prepare(state)
+            self.state = state
+            self.version += 1
+        return {
+            'version': self.version,
+            'rules': len(state.rules),
+            # TODO 规则文件没有变化时沿用同一组Rule对象
+            'rules_changed': state.rules != old.rules,
+            'tagger_ms': state.build_ms['tagger'],
+            'rules_ms': state.build_ms['rules'],
+        }
 
     def get_sparql(self, question):
         """
@@ -25,15 +96,79 @@ class Question2Sparql:
         :param question:
         :return:
         """
-        word_objects = self.tw.get_word_objects(question)
+        return self.get_sparql_rule(question)[0]
+
+    def get_sparql_rule(self, question):
+        """
+        与get_sparql相同，同时返回生成查询语句的规则
+        :param question:
+        :return: (query, rule)，没有匹配的模板时为(None, None)
+        """
+        if self.hooks is not None:
+            return self.get_sparql_timed(question)
+
+        # TODO 只读取一次，解析过程中重新加载也不会混用新旧状态
+        state = self.state
+        word_objects = state.tagger.get_word_objects(question)
         queries_dict = dict()
 
-        for rule in self.rules:
-            query, num = rule.apply(word_objects)
+        for rule in state.rules:
+            # TODO 没有匹配到的规则不需要生成查询
+            matches = rule.match(word_objects)
+            if len(matches) == 0:
+                continue
+            query = rule.render(matches)
+
+            if query is not None:
+                queries_dict[rule.condition_num] = (query, rule)
+
+        return self.pick_query(queries_dict) or (None, None)
+
+    def get_sparql_timed(self, question):
+        """
+        与get_sparql_rule相同，同时记录分词、规则匹配、查询生成的耗时和每条规则的命中情况
+        :param question:
+        :return: (query, rule)
+        """
+        hooks = self.hooks
+        clock = time.perf_counter
+        state = self.state
+
+        t0 = clock()
+        word_objects = state.tagger.get_word_objects(question)
+        t1 = clock()
+        hooks.on_stage('tag', t1 - t0)
+
+        queries_dict = dict()
+        match_time = 0.0
+        render_time = 0.0
+        for rule in state.rules:
+            t2 = clock()
+            matches = rule.match(word_objects)
+            t3 = clock()
+            match_time += t3 - t2
+            hooks.on_rule(pipeline_metrics.rule_name(rule), len(matches) > 0)
+            if len(matches) == 0:
+                continue
+            query = rule.render(matches)
+            render_time += clock() - t3
 
             if query is not None:
-                queries_dict[num] = query
+                queries_dict[rule.condition_num] = (query, rule)
 
+        t4 = clock()
+        picked = self.pick_query(queries_dict) or (None, None)
+        hooks.on_stage('match', match_time)
+        hooks.on_stage('render', render_time + clock() - t4)
+        return picked
+
+    @staticmethod
+    def pick_query(queries_dict):
+        """
+        从匹配到的查询中选出最终的查询语句
+        :param queries_dict: {condition_num: query}
+        :return:
+        """
         if len(queries_dict) == 0:
             return None
         elif len(queries_dict) == 1:
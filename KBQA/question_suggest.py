@@ -0,0 +1,331 @@
+# encoding=utf-8
+
+"""
+
+@file: question_suggest.py
+
+@time: 2026/10/19
+
+@desc: 问题补全提示。基于实体前缀树补全菜品和大类名称，并给出question_temp中支持的问法。
+前缀树的每个结点保存子树中排序最靠前的top_k个实体，插入和删除时沿路径更新，补全时直接返回，不需要遍历子树。
+
+"""
+import heapq
+import json
+
+import question_temp
+
+
+# TODO 实体类型，数值越小补全时越靠前
+KIND_CATEGORY = 'category'
+KIND_DISH = 'dish'
+KIND_MATERIAL = 'material'
+
+KIND_RANK = {KIND_CATEGORY: 0, KIND_DISH: 1, KIND_MATERIAL: 2}
+
+# TODO vizdata中节点group与实体类型的对应关系
+GROUP_KIND = {'0': KIND_CATEGORY, '1': KIND_DISH, '2': KIND_MATERIAL}
+
+# TODO 每个结点预先保存的补全个数，与/suggest默认的limit相同
+TOP_K = 10
+
+
+def rank_key(entity):
+    """
+    补全结果的顺序：大类和菜品优先，名称短的优先
+    :param entity: (name, kind)
+    """
+    return KIND_RANK[entity[1]], len(entity[0]), entity[0]
+
+
+class TrieNode(object):
+    __slots__ = ('children', 'name', 'kind', 'top')
+
+    def __init__(self):
+        self.children = dict()
+        self.name = None
+        self.kind = None
+        # TODO 子树（包括自己）中按rank_key排序的前top_k个实体[(name, kind), ...]
+        self.top = list()
+
+
+class EntityTrie:
+    def __init__(self, top_k=TOP_K):
+        self.root = TrieNode()
+        self.size = 0
+        self.top_k = top_k
+
+    def insert(self, name, kind):
+        node = self.root
+        path = [node]
+        for ch in name:
+            child = node.children.get(ch)
+            if child is None:
+                child = TrieNode()
+                node.children[ch] = child
+            node = child
+            path.append(node)
+        if node.name is None:
+            self.size += 1
+        elif node.kind != kind:
+            # TODO 类型变化时排序位置也变化，先从各结点的top中去掉
+            node.kind = kind
+            self.refresh(path, name)
+        node.name = name
+        node.kind = kind
+
+        entity = (name, kind)
+        key = rank_key(entity)
+        for n in reversed(path):
+            if entity in n.top:
+                continue
+            if len(n.top) >= self.top_k and key >= rank_key(n.top[-1]):
+                # TODO 上级结点的候选包含这个结点的候选，第top_k个不会更靠后，也不会进入
+                break
+            i = len(n.top)
+            while i > 0 and key < rank_key(n.top[i - 1]):
+                i -= 1
+            n.top.insert(i, entity)
+            del n.top[self.top_k:]
+
+    def remove(self, name):
+        """
+        删除完整的实体，中间结点保留
+        :param name:
+        :return: 是否删除
+        """
+        node = self.root
+        path = [node]
+        for ch in name:
+            node = node.children.get(ch)
+            if node is None:
+                return False
+            path.append(node)
+        if node.name is None:
+            return False
+        node.name = None
+        node.kind = None
+        self.size -= 1
+        self.refresh(path, name)
+        return True
+
+    def refresh(self, path, name):
+        """
+        从下往上重新计算路径上包含name的结点的top：结点自己的实体加上各子结点的top，取前top_k个
+        :param path: 从根结点到name所在结点的路径
+        :param name:
+        """
+        for n in reversed(path):
+            if not any(e[0] == name for e in n.top):
+                break
+            candidates = [e for c in n.children.values() for e in c.top]
+            if n.name is not None:
+                candidates.append((n.name, n.kind))
+            n.top = heapq.nsmallest(self.top_k, candidates, key=rank_key)
+
+    def find(self, prefix):
+        """
+        返回前缀对应的结点，不存在时返回None
+        :param prefix:
+        :return:
+        """
+        node = self.root
+        for ch in prefix:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def collect(node):
+        """
+        收集结点下所有完整的实体
+        :param node:
+        :return: [(name, kind), ...]
+        """
+        entities = list()
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.name is not None:
+                entities.append((n.name, n.kind))
+            stack.extend(n.children.values())
+        return entities
+
+    def longest_match(self, text, start):
+        """
+        从text[start]开始匹配最长的完整实体
+        :param text:
+        :param start:
+        :return: (name, kind)，没有匹配时返回(None, None)
+        """
+        node = self.root
+        match = (None, None)
+        for ch in text[start:]:
+            node = node.children.get(ch)
+            if node is None:
+                break
+            if node.name is not None:
+                match = (node.name, node.kind)
+        return match
+
+
+class QuestionSuggester:
+    def __init__(self, dict_paths, vizdata_path='./data/vizdata_mimini_aglin.json', max_cache=4096):
+        self.trie = EntityTrie()
+        self.vizdata_path = vizdata_path
+        self.max_cache = max_cache
+        # TODO 前缀到补全结果的缓存，逐字输入时大部分请求直接命中
+        self._completion_cache = dict()
+
+        kinds = self.load_kinds(vizdata_path)
+        for p in dict_paths:
+            with open(p, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 0:
+                        continue
+                    self.trie.insert(parts[0], kinds.get(parts[0], KIND_DISH))
+
+        # TODO 大类结点（group "0"）不一定都在外部词典里
+        for name, kind in kinds.items():
+            if kind == KIND_CATEGORY:
+                self.trie.insert(name, kind)
+
+    @staticmethod
+    def load_kinds(vizdata_path):
+        """
+        从可视化数据中读取实体类型，大类的id形如"1-红烧肉类"
+        :param vizdata_path:
+        :return: {name: kind}
+        """
+        kinds = dict()
+        if vizdata_path is None:
+            return kinds
+        with open(vizdata_path, encoding='utf-8') as f:
+            vizdata = json.load(f)
+        for node in vizdata['nodes']:
+            name = node['id']
+            if node['group'] == '0':
+                name = name.split('-', 1)[-1]
+            kinds[name] = GROUP_KIND.get(node['group'], KIND_DISH)
+        return kinds
+
+    def add_entity(self, name, kind):
+        self.trie.insert(name, kind)
+        self.forget(name)
+
+    def remove_entity(self, name):
+        if self.trie.remove(name):
+            self.forget(name)
+
+    def forget(self, name):
+        """
+        清除补全结果可能包含name的缓存，即前缀是name的前缀的缓存
+        :param name:
+        :return:
+        """
+        for key in [k for k in self._completion_cache if name.startswith(k[0])]:
+            self._completion_cache.pop(key, None)
+
+    def complete(self, prefix, limit=10):
+        """
+        补全实体名称，大类和菜品优先，名称短的优先
+        :param prefix:
+        :param limit: 不超过trie.top_k时直接取结点预先保存的结果，否则遍历子树排序
+        :return: [(name, kind), ...]
+        """
+        key = (prefix, limit)
+        cached = self._completion_cache.get(key)
+        if cached is not None:
+            return cached
+
+        node = self.trie.find(prefix)
+        if node is None:
+            entities = list()
+        elif limit <= self.trie.top_k:
+            entities = node.top[:limit]
+        else:
+            entities = heapq.nsmallest(limit, self.trie.collect(node), key=rank_key)
+
+        if len(self._completion_cache) >= self.max_cache:
+            self._completion_cache.clear()
+        self._completion_cache[key] = entities
+        return entities
+
+    def find_entity(self, question):
+        """
+        找出问句中最后出现的完整实体（同一位置取最长匹配）
+        :param question:
+        :return: (start, name, kind)，没有时返回(-1, None, None)
+        """
+        found = (-1, None, None)
+        i = 0
+        while i < len(question):
+            name, kind = self.trie.longest_match(question, i)
+            if name is not None:
+                found = (i, name, kind)
+                i += len(name)
+            else:
+                i += 1
+        return found
+
+    @staticmethod
+    def question_forms(kind):
+        if kind == KIND_CATEGORY:
+            return question_temp.category_question_forms
+        elif kind == KIND_DISH:
+            return question_temp.food_question_forms
+        else:
+            return list()
+
+    def suggest(self, partial, limit=10):
+        """
+        根据输入了一部分的问题给出补全提示
+        :param partial:
+        :param limit:
+        :return: [{'text': 补全后的问题, 'entity': 实体名称, 'kind': 实体类型}, ...]
+        """
+        partial = partial.strip()
+        suggestions = list()
+        seen = set()
+
+        def add(text, name, kind):
+            if text not in seen and len(suggestions) < limit:
+                seen.add(text)
+                suggestions.append({'text': text, 'entity': name, 'kind': kind})
+
+        if len(partial) == 0:
+            return suggestions
+
+        # TODO 已输入完整实体时，给出以当前输入开头的问法
+        start, entity, kind = self.find_entity(partial)
+        if entity is not None:
+            forms = [form.format(food=entity) for form in self.question_forms(kind)]
+            for text in forms:
+                if text.startswith(partial):
+                    add(text, entity, kind)
+            if start + len(entity) == len(partial):
+                for text in forms:
+                    add(text, entity, kind)
+
+        # TODO 把问句末尾最长的一段当作实体前缀进行补全
+        for i in range(len(partial)):
+            completions = self.complete(partial[i:], limit)
+            if len(completions) == 0:
+                continue
+            for name, kind in completions:
+                if name != partial[i:]:
+                    add(partial[:i] + name, name, kind)
+            break
+
+        return suggestions
+
+
+# TODO 用于测试
+if __name__ == '__main__':
+    suggester = QuestionSuggester(['./external_dict/entities_list.txt'])
+    while True:
+        s = input()
+        for item in suggester.suggest(s):
+            print(item['text'], item['kind'])
@@ -15,10 +15,23 @@
 4. 某个菜品的主料是什么？
 5. 某个菜品的特色是什么？
 6. 某个菜品的制作步骤是什么？
+7. 以上问题的组合，例如某个菜品的主料和辅料是什么？某几个菜品的特色是什么？
+8. 某个菜品的第N步是什么？
+9. 某个菜品一共有几步？
 
 读者可以自己定义其他的匹配规则。
+
+词语模式、匹配规则和属性词规则定义在data/question_rules.json中，按领域分为food和movie两组（profile），
+模式的写法见compile_pattern。某个领域的规则在第一次使用时才编译，编译结果pickle到__pycache__，
+规则文件不变时直接加载，不再解析规则文件。Question2Sparql默认只加载food，
+Question2Sparql.reload()时检查规则文件，有变化才重新编译。
+每条匹配规则编译时绑定同一领域的属性词规则，由Rule.render传给动作，重新加载时随规则一起替换。
+以前定义在本模块中的rules、food_basic_keyword_rules、food_entity等仍然可以访问，第一次访问时编译。
 """
-from refo import finditer, Predicate, Star, Any, Disjunction
+from refo import finditer, Predicate, Star, Question
+import json
+import os
+import pickle
 import re
 
 # TODO SPARQL前缀和模板
@@ -43,6 +56,28 @@ SPARQL_ASK_TEM = u"{prefix}\n" + \
 
 INDENT = "    "
 
+# TODO 第N步中的N，可以是阿拉伯数字或中文数字
+STEP_ORDINAL_RE = re.compile(u"第([0-9零一二两三四五六七八九十百]+)")
+CHINESE_DIGITS = {u'零': 0, u'一': 1, u'二': 2, u'两': 2, u'三': 3, u'四': 4,
+                  u'五': 5, u'六': 6, u'七': 7, u'八': 8, u'九': 9}
+CHINESE_UNITS = {u'十': 10, u'百': 100}
+
+
+def parse_number(text):
+    """
+    "3" -> 3，"十二" -> 12，"二十" -> 20，"一百零五" -> 105
+    """
+    if text.isdigit():
+        return int(text)
+    value = digit = 0
+    for ch in text:
+        if ch in CHINESE_UNITS:
+            value += (digit or 1) * CHINESE_UNITS[ch]
+            digit = 0
+        else:
+            digit = CHINESE_DIGITS[ch]
+    return value + digit
+
 
 class W(Predicate):
     def __init__(self, token=".*", pos=".*"):
@@ -57,19 +92,29 @@ class W(Predicate):
 
 
 class Rule(object):
-    def __init__(self, condition_num, condition=None, action=None):
+    def __init__(self, condition_num, condition=None, action=None, keywords=None):
         assert condition and action
         self.condition = condition
         self.action = action
         self.condition_num = condition_num
+        # TODO 规则所在领域的关键词规则组，与规则一起编译和替换
+        self.keywords = keywords
 
-    def apply(self, sentence):
+    def match(self, sentence):
         matches = []
         for m in finditer(self.condition, sentence):
             i, j = m.span()
             matches.extend(sentence[i:j])
+        return matches
 
-        return self.action(matches), self.condition_num
+    def render(self, matches):
+        """
+        由匹配结果生成查询语句，动作使用同一领域的关键词规则
+        """
+        return self.action(matches, self.keywords)
+
+    def apply(self, sentence):
+        return self.render(self.match(sentence)), self.condition_num
 
 
 class KeywordRule(object):
@@ -94,7 +139,7 @@ class QuestionSet:
         pass
 
     @staticmethod
-    def has_movie_question(word_objects):
+    def has_movie_question(word_objects, keywords=None):
         """
         某演员演了什么电影
         :param word_objects:
@@ -116,7 +161,7 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_actor_question(word_objects):
+    def has_actor_question(word_objects, keywords=None):
         """
         哪些演员参演了某电影
         :param word_objects:
@@ -139,7 +184,7 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_cooperation_question(word_objects):
+    def has_cooperation_question(word_objects, keywords=None):
         """
         演员A和演员B有哪些合作的电影
         :param word_objects:
@@ -170,10 +215,11 @@ class QuestionSet:
             return None
 
     @staticmethod
-    def has_compare_question(word_objects):
+    def has_compare_question(word_objects, keywords=None):
         """
         某演员参演的评分高于X的电影有哪些？
         :param word_objects:
+        :param keywords: 规则所在领域的关键词规则组，见Rule.render
         :return:
         """
         select = u"?x"
@@ -182,7 +228,7 @@ class QuestionSet:
         number = None
         keyword = None
 
-        for r in compare_keyword_rules:
+        for r in keyword_group(keywords, 'movie', 'compare'):
             keyword = r.apply(word_objects)
             if keyword is not None:
                 break
@@ -210,7 +256,7 @@ class QuestionSet:
             return None
 
     @staticmethod
-    def has_movie_type_question(word_objects):
+    def has_movie_type_question(word_objects, keywords=None):
         """
         某演员演了哪些类型的电影
         :param word_objects:
@@ -233,16 +279,17 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_specific_type_movie_question(word_objects):
+    def has_specific_type_movie_question(word_objects, keywords=None):
         """
         某演员演了什么类型（指定类型，喜剧、恐怖等）的电影
         :param word_objects:
+        :param keywords: 规则所在领域的关键词规则组，见Rule.render
         :return:
         """
         select = u"?x"
 
         keyword = None
-        for r in genre_keyword_rules:
+        for r in keyword_group(keywords, 'movie', 'genre'):
             keyword = r.apply(word_objects)
 
             if keyword is not None:
@@ -265,7 +312,7 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_quantity_question(word_objects):
+    def has_quantity_question(word_objects, keywords=None):
         """
         某演员演了多少部电影
         :param word_objects:
@@ -286,7 +333,7 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def is_comedian_question(word_objects):
+    def is_comedian_question(word_objects, keywords=None):
         """
         某演员是喜剧演员吗
         :param word_objects:
@@ -305,15 +352,16 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_basic_person_info_question(word_objects):
+    def has_basic_person_info_question(word_objects, keywords=None):
         """
         某演员的基本信息是什么
         :param word_objects:
+        :param keywords: 规则所在领域的关键词规则组，见Rule.render
         :return:
         """
 
         keyword = None
-        for r in person_basic_keyword_rules:
+        for r in keyword_group(keywords, 'movie', 'person_basic'):
             keyword = r.apply(word_objects)
             if keyword is not None:
                 break
@@ -340,15 +388,16 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_basic_movie_info_question(word_objects):
+    def has_basic_movie_info_question(word_objects, keywords=None):
         """
         某电影的基本信息是什么
         :param word_objects:
+        :param keywords: 规则所在领域的关键词规则组，见Rule.render
         :return:
         """
 
         keyword = None
-        for r in movie_basic_keyword_rules:
+        for r in keyword_group(keywords, 'movie', 'movie_basic'):
             keyword = r.apply(word_objects)
             if keyword is not None:
                 break
@@ -368,35 +417,96 @@ class QuestionSet:
         return sparql
 
     @staticmethod
-    def has_basic_food_info_question(word_objects):
+    def has_basic_food_info_question(word_objects, keywords=None):
         """
-        某电影的基本信息是什么
+        某菜品的基本信息是什么。问题中有多个菜品或多个属性时（例如"水煮鱼的主料和辅料是什么"），
+        所有(菜品, 属性)组合合并为一个查询，见food_info_pairs
         :param word_objects:
+        :param keywords: 规则所在领域的关键词规则组，见Rule.render
         :return:
         """
+        pairs = QuestionSet.food_info_pairs(word_objects, keywords)
+        if len(pairs) == 0:
+            return None
 
-        keyword = None
-        for r in food_basic_keyword_rules:
+        if len(pairs) == 1:
+            food, keyword = pairs[0]
+            e = u"?s :名称 '{food}'. \n" \
+                u"?s {keyword} ?x.".format(food=food, keyword=keyword)
+            return SPARQL_SELECT_TEM.format(
+                prefix=SPARQL_PREXIX, select=u"?x", expression=e)
+
+        # TODO 用VALUES列出所有组合，一次查询得到全部答案，结果按?food ?p分组
+        values = u"\n".join(u"{indent}('{food}' {keyword})".format(indent=INDENT, food=food, keyword=keyword)
+                            for food, keyword in pairs)
+        e = u"VALUES (?food ?p) {{\n{values}\n}}\n" \
+            u"?s :名称 ?food. \n" \
+            u"?s ?p ?x.".format(values=values)
+        return SPARQL_SELECT_TEM.format(
+            prefix=SPARQL_PREXIX, select=u"?food ?p ?x", expression=e)
+
+    @staticmethod
+    def food_info_pairs(word_objects, keywords=None):
+        """
+        问题中所有的(菜品, 属性)组合，例如"鱼香肉丝和水煮肉片的主料和辅料"得到4个组合
+        :param word_objects:
+        :param keywords:
+        :return: [(菜品名称, 属性), ...]
+        """
+        properties = list()
+        for r in keyword_group(keywords, 'food', 'food_basic'):
             keyword = r.apply(word_objects)
-            if keyword is not None:
-                break
+            if keyword is not None and keyword not in properties:
+                properties.append(keyword)
 
-        select = u"?x"
-        sparql = None
+        foods = list()
         for w in word_objects:
-            if w.pos == pos_food:
-                e = u"?s :名称 '{food}'. \n" \
-                    u"?s {keyword} ?x.".format(food=w.token, keyword=keyword)
+            if w.pos == pos_food and w.token not in foods:
+                foods.append(w.token)
 
-                sparql = SPARQL_SELECT_TEM.format(
-                    prefix=SPARQL_PREXIX, select=select, expression=e)
+        return [(food, keyword) for food in foods for keyword in properties]
 
-                break
+    @staticmethod
+    def has_food_step_question(word_objects, keywords=None):
+        """
+        某菜品的第N步是什么，只取这一步的内容，不取整段的制作步骤
+        :param word_objects:
+        :return:
+        """
+        food = None
+        for i, w in enumerate(word_objects):
+            if w.pos == pos_food and food is None:
+                food = w.token
+            elif food is not None and w.token.startswith(u"第"):
+                # TODO "第3步"可能切分为"第"、"3"、"步"
+                m = STEP_ORDINAL_RE.match(u"".join(x.token for x in word_objects[i:i + 2]))
+                if m is None:
+                    continue
+                e = u"?s :名称 '{food}'. \n" \
+                    u"?s :步骤 ?step. \n" \
+                    u"?step :序号 '{n}'. \n" \
+                    u"?step :内容 ?x.".format(food=food, n=parse_number(m.group(1)))
+                return SPARQL_SELECT_TEM.format(
+                    prefix=SPARQL_PREXIX, select=u"?x", expression=e)
+        return None
 
-        return sparql
+    @staticmethod
+    def has_food_step_count_question(word_objects, keywords=None):
+        """
+        某菜品一共有几步
+        :param word_objects:
+        :return:
+        """
+        for w in word_objects:
+            if w.pos == pos_food:
+                e = u"?s :名称 '{food}'. \n" \
+                    u"?s :步骤 ?x.".format(food=w.token)
+                return SPARQL_COUNT_TEM.format(
+                    prefix=SPARQL_PREXIX, select=u"?x", expression=e)
+        return None
 
     @staticmethod
-    def who_born_in_question(word_objects):
+    def who_born_in_question(word_objects, keywords=None):
         """
         谁出生在xx/出生在xxx的有谁
         :param word_objects:
@@ -592,224 +702,316 @@ class PropertyValueSet:
         return u':特色'
 
 
-# TODO 定义关键词
+# TODO 词性
 pos_person = "nr"
 pos_movie = "nz"
 pos_number = "m"
 pos_place = "ns"
 pos_food = "ai"
 
-person_entity = (W(pos=pos_person))
-movie_entity = (W(pos=pos_movie))
-number_entity = (W(pos=pos_number))
-place_entity = (W(pos=pos_place))
-food_entity = (W(pos=pos_food))
-
-adventure = W("冒险")
-fantasy = W("奇幻")
-animation = (W("动画") | W("动画片"))
-drama = (W("剧情") | W("剧情片"))
-thriller = (W("恐怖") | W("恐怖片"))
-action = (W("动作") | W("动作片"))
-comedy = (W("喜剧") | W("喜剧片"))
-history = (W("历史") | W("历史剧"))
-western = (W("西部") | W("西部片"))
-horror = (W("惊悚") | W("惊悚片"))
-crime = (W("犯罪") | W("犯罪片"))
-documentary = (W("纪录") | W("纪录片"))
-science_fiction = (W("科幻") | W("科幻片"))
-mystery = (W("悬疑") | W("悬疑片"))
-music = (W("音乐") | W("音乐片"))
-romance = (W("爱情") | W("爱情片"))
-family = W("家庭")
-war = (W("战争") | W("战争片"))
-TV = W("电视")
-genre = (adventure | fantasy | animation | drama | thriller | action
-         | comedy | history | western | horror | crime | documentary |
-         science_fiction | mystery | music | romance | family | war
-         | TV)
-
-
-actor = (W("演员") | W("艺人") | W("表演者"))
-movie = (W("电影") | W("影片") | W("片子") | W("片") | W("剧"))
-category = (W("类型") | W("种类"))
-several = (W("多少") | W("几部"))
-
-higher = (W("大于") | W("高于"))
-lower = (W("小于") | W("低于"))
-compare = (higher | lower)
-
-# original
-birth = (W("生日") | W("出生") + W("日期") | W("出生"))
-birth_place = (W("出生地") | W("出生"))
-english_name = (W("英文名") | W("英文") + W("名字") | W("外文") + W("名") | W("外文") + W("名字"))
-introduction = (W("介绍") | W("是") + W("谁") | W("简介"))
-# ------
-# vivire card additional person basic
-blood_type = W("血型")
-zodiac_sign = W("星座")
-haki_type = W("霸气")
-height = (W("身高") | W("身长") | W("高度") | W("长度") | W("全长") | W("全高"))
-# ------
-person_basic = (birth | birth_place | english_name | introduction | blood_type | zodiac_sign | haki_type | height)
-
-rating = (W("评分") | W("分") | W("分数"))
-release = (W("上映"))
-movie_basic = (rating | introduction | release)
-
-when = (W("何时") | W("时候"))
-where = (W("哪里") | W("哪儿") | W("何地") | W("何处") | W("在") + W("哪"))
-who = W("谁")
-
-# ai-food-time
-makestep = (W("制作") + W("步骤") | W("做法") | W("烹饪") + W("方法") | W("制作") + W("方法") | W("制作"))
-subtype = (W("包括") | W("子菜品") | W("分为") | W("包含"))
-material = (W("取材") | W("原料") | W("用到") | W("选材") | W("食材"))
-main_component = (W("主料") | W("主要原料"))
-excipient = (W("辅料"))
-ingredient = (W("配料"))
-feature = (W("特色") | W("特点"))
-what = (W("哪些") | W("什么"))
-how = (W("怎样") | W("如何"))
-make = W("制作")
-
-food_basic = (makestep | subtype | material | main_component | excipient | ingredient | feature)
-
-# TODO 问题模板/匹配规则
-"""
-1. 某演员演了什么电影
-2. 某电影有哪些演员出演
-3. 演员A和演员B合作出演了哪些电影
-4. 某演员参演的评分大于X的电影有哪些
-5. 某演员出演过哪些类型的电影
-6. 某演员出演的XX类型电影有哪些。
-7. 某演员出演了多少部电影。
-8. 某演员是喜剧演员吗。
-9. 某人的生日/出生地/英文名/简介/血型/星座/霸气/身高
-10. 某电影的简介/上映日期/评分
-11. 谁出生在xx/出生在xxx的有谁
-"""
-rules = [
-    Rule(condition_num=2, condition=person_entity + Star(Any(), greedy=False) +
-         movie + Star(Any(), greedy=False), action=QuestionSet.has_movie_question),
-    Rule(condition_num=2, condition=(movie_entity + Star(Any(), greedy=False) + actor + Star(Any(), greedy=False)) |
-         (actor + Star(Any(), greedy=False) + movie_entity + Star(Any(), greedy=False)), action=QuestionSet.has_actor_question),
-    Rule(condition_num=3, condition=person_entity + Star(Any(), greedy=False) + person_entity + Star(Any(),
-                                                                                                     greedy=False) + (movie | Star(Any(), greedy=False)), action=QuestionSet.has_cooperation_question),
-    Rule(condition_num=4, condition=person_entity + Star(Any(), greedy=False) + compare + number_entity +
-         Star(Any(), greedy=False) + movie + Star(Any(), greedy=False), action=QuestionSet.has_compare_question),
-    Rule(condition_num=3, condition=person_entity + Star(Any(), greedy=False) + category +
-         Star(Any(), greedy=False) + movie, action=QuestionSet.has_movie_type_question),
-    Rule(condition_num=3, condition=person_entity + Star(Any(), greedy=False) + genre + Star(Any(),
-                                                                                             greedy=False) + (movie | Star(Any(), greedy=False)), action=QuestionSet.has_specific_type_movie_question),
-    Rule(condition_num=3, condition=person_entity + Star(Any(), greedy=False) + several + Star(Any(),
-                                                                                               greedy=False) + (movie | Star(Any(), greedy=False)), action=QuestionSet.has_quantity_question),
-    Rule(condition_num=3, condition=person_entity + Star(Any(), greedy=False) + comedy +
-         actor + Star(Any(), greedy=False), action=QuestionSet.is_comedian_question),
-    Rule(condition_num=3, condition=(person_entity + Star(Any(), greedy=False) + (when | where) + person_basic + Star(Any(), greedy=False)) |
-         (person_entity + Star(Any(), greedy=False) + person_basic + Star(Any(), greedy=False)), action=QuestionSet.has_basic_person_info_question),
-    Rule(condition_num=2, condition=movie_entity + Star(Any(), greedy=False) + movie_basic +
-         Star(Any(), greedy=False), action=QuestionSet.has_basic_movie_info_question),
-    Rule(condition_num=3, condition=(who + Star(Any(), greedy=False) + birth_place + Star(Any(), greedy=False) + place_entity + Star(Any(), greedy=False)) |
-         (birth_place + Star(Any(), greedy=False) + place_entity + Star(Any(), greedy=False) + who), action=QuestionSet.who_born_in_question),
-    #Rule(condition_num=2, condition=(what + Star(Any(), greedy=False) + food_entity + Star(Any(), greedy=False) + food_basic + Star(Any(), greedy=False)) |
-    #     (food_entity + Star(Any(), greedy=False) + food_basic + Star(Any(), greedy=False)), action=QuestionSet.has_basic_food_info_question),
-    Rule(condition_num=2, condition=(food_entity + Star(Any(), greedy=False) + food_basic + Star(Any(), greedy=False)) | (Star(Any(), greedy=False) + make + Star(Any(), greedy=False) + food_entity + Star(Any(), greedy=False)), action=QuestionSet.has_basic_food_info_question),
+# TODO 支持的问法，用于问题补全提示。{food}为菜品或大类名称
+food_question_forms = [
+    u"如何制作{food}？",
+    u"{food}的制作步骤是什么？",
+    u"{food}需要哪些食材？",
+    u"{food}的主料是什么？",
+    u"{food}的辅料是什么？",
+    u"{food}的配料是什么？",
+    u"{food}的特点是什么？",
+    u"{food}的第一步是什么？",
+    u"{food}一共有几步？",
 ]
 
-# TODO 具体的属性词匹配规则
-genre_keyword_rules = [
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + adventure + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_adventure_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + fantasy + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_fantasy_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + animation + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_animation_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + drama + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_drama_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + thriller + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_thriller_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + action + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_action_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + comedy + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_comedy_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + history + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_history_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + western + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_western_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + horror + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_horror_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + crime + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_crime_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + documentary + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_documentary_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + science_fiction + Star(Any(),
-                                                                                             greedy=False) + (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_fiction_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + mystery + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_mystery_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + music + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_music_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + romance + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_romance_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + family + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_family_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + war + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_war_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + TV + Star(Any(), greedy=False) +
-                (movie | Star(Any(), greedy=False)), action=PropertyValueSet.return_tv_value)
+category_question_forms = [
+    u"{food}包括哪些菜？",
+    u"{food}包含哪些菜？",
 ]
 
-compare_keyword_rules = [
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + higher + number_entity + Star(Any(),
-                                                                                                    greedy=False) + movie + Star(Any(), greedy=False), action=PropertyValueSet.return_higher_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + lower + number_entity + Star(Any(),
-                                                                                                   greedy=False) + movie + Star(Any(), greedy=False), action=PropertyValueSet.return_lower_value)
-]
 
-person_basic_keyword_rules = [
-    KeywordRule(condition=(person_entity + Star(Any(), greedy=False) + where + birth_place + Star(Any(), greedy=False)) | (person_entity +
-                                                                                                                           Star(Any(), greedy=False) + birth_place + Star(Any(), greedy=False)), action=PropertyValueSet.return_birth_place_value),
-    KeywordRule(condition=person_entity + Star(Disjunction(Any(), where), greedy=False) +
-                birth + Star(Any(), greedy=False), action=PropertyValueSet.return_birth_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + english_name +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_english_name_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + introduction +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_person_introduction_value),
-    # vivire card additional person basic
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + blood_type +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_blood_type_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + zodiac_sign +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_zodiac_sign_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + haki_type +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_haki_type_value),
-    KeywordRule(condition=person_entity + Star(Any(), greedy=False) + height +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_height_value),
-]
-
-movie_basic_keyword_rules = [
-    KeywordRule(condition=movie_entity + Star(Any(), greedy=False) + introduction +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_movie_introduction_value),
-    KeywordRule(condition=movie_entity + Star(Any(), greedy=False) + release +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_release_value),
-    KeywordRule(condition=movie_entity + Star(Any(), greedy=False) + rating +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_rating_value),
-]
-
-food_basic_keyword_rules = [
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + subtype +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_subtype_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + material +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_material_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + makestep +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_makesteps_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + main_component +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_main_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + excipient +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_excipient_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + ingredient +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_ingredient_value),
-    KeywordRule(condition=food_entity + Star(Any(), greedy=False) + feature +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_features_value),
-    KeywordRule(condition=makestep + Star(Any(), greedy=False) + food_entity +
-                Star(Any(), greedy=False), action=PropertyValueSet.return_makesteps_value),
-]
+def load_entities(dict_paths):
+    """
+    外部词典中的实体名称（每行第一列）
+    """
+    entities = list()
+    for p in dict_paths:
+        with open(p, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) > 0:
+                    entities.append(parts[0])
+    return entities
+
+
+def generate_corpus(dict_paths, forms=None):
+    """
+    实体与问法两两组合生成问题集，用于基准测试和答案缓存的预热
+    :param dict_paths:
+    :param forms: 问法列表，默认为所有问法
+    :return: [question, ...]
+    """
+    if forms is None:
+        forms = food_question_forms + category_question_forms
+    return [form.format(food=e) for e in load_entities(dict_paths) for form in forms]
+
+
+# TODO 规则文件和编译结果的缓存目录
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'question_rules.json')
+RULES_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+# TODO 编译方式变化时加一，使旧的缓存失效
+RULES_CACHE_VERSION = 2
+
+PATTERN_TOKEN_RE = re.compile(r"""
+    (?P<word>'(?:[^'\\]|\\.)*'(?:@\w+)?)
+  | (?P<pos>@\w+)
+  | (?P<lazy>\.\.\.)
+  | (?P<punct>[()|?*])
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<space>\s+)
+  | (?P<error>.)
+""", re.X)
+
+
+class RuleSyntaxError(ValueError):
+    pass
+
+
+def any_word(word):
+    return True
+
+
+class AnyWord(Predicate):
+    """
+    与refo.Any相同，但不使用lambda，编译后的规则可以pickle
+    """
+    def __init__(self):
+        super(AnyWord, self).__init__(any_word)
+
+
+def compile_pattern(text, resolve):
+    """
+    把规则文件中的模式编译为refo的模式：
+    'regex'匹配词语，'regex'@pos同时匹配词性，@pos只匹配词性，名称引用words中定义的模式，
+    ...为非贪婪的任意个词，*为贪婪的任意个词，空格表示连接，|表示或，?表示可选，括号用于分组
+    :param text:
+    :param resolve: 名称 -> 已编译的模式
+    :return:
+    """
+    tokens = list()
+    for m in PATTERN_TOKEN_RE.finditer(text):
+        if m.lastgroup == 'error':
+            raise RuleSyntaxError('unexpected {!r} in pattern: {}'.format(m.group(), text))
+        if m.lastgroup != 'space':
+            tokens.append((m.lastgroup, m.group()))
+    i = [0]
+
+    def peek():
+        return tokens[i[0]][1] if i[0] < len(tokens) else None
+
+    def expr():
+        pattern = seq()
+        while peek() == '|':
+            i[0] += 1
+            pattern = pattern | seq()
+        return pattern
+
+    def seq():
+        pattern = None
+        while peek() not in (None, '|', ')'):
+            x = item()
+            pattern = x if pattern is None else pattern + x
+        if pattern is None:
+            raise RuleSyntaxError('empty pattern: {}'.format(text))
+        return pattern
+
+    def item():
+        kind, value = tokens[i[0]]
+        i[0] += 1
+        if value == '(':
+            x = expr()
+            if peek() != ')':
+                raise RuleSyntaxError('expected ) in pattern: {}'.format(text))
+            i[0] += 1
+        elif kind == 'lazy':
+            x = Star(AnyWord(), greedy=False)
+        elif value == '*':
+            x = Star(AnyWord())
+        elif kind == 'word':
+            end = value.rindex("'")
+            token = value[1:end].replace("\\'", "'")
+            x = W(token, value[end + 2:]) if end + 1 < len(value) else W(token)
+        elif kind == 'pos':
+            x = W(pos=value[1:])
+        elif kind == 'name':
+            x = resolve(value)
+        else:
+            raise RuleSyntaxError('unexpected {!r} in pattern: {}'.format(value, text))
+        if peek() == '?':
+            i[0] += 1
+            x = Question(x)
+        return x
+
+    pattern = expr()
+    if peek() is not None:
+        raise RuleSyntaxError('unexpected {!r} in pattern: {}'.format(peek(), text))
+    return pattern
+
+
+class RuleProfile(object):
+    """
+    一个领域（例如food、movie）编译后的规则
+    """
+    def __init__(self, name, words, rules, keyword_rules):
+        self.name = name
+        # TODO 名称 -> 模式
+        self.words = words
+        self.rules = rules
+        # TODO 关键词规则组名 -> [KeywordRule, ...]
+        self.keyword_rules = keyword_rules
+
+
+def compile_profile(name, spec):
+    """
+    :param name: 领域名称
+    :param spec: 规则文件中profiles下的一项
+    :return: RuleProfile
+    """
+    words = dict()
+    compiling = set()
+
+    def resolve(word):
+        if word not in words:
+            if word not in spec['words']:
+                raise RuleSyntaxError('unknown word {} in profile {}'.format(word, name))
+            if word in compiling:
+                raise RuleSyntaxError('recursive word {} in profile {}'.format(word, name))
+            compiling.add(word)
+            words[word] = compile_pattern(spec['words'][word], resolve)
+        return words[word]
+
+    for word in spec['words']:
+        resolve(word)
+    keyword_rules = dict()
+    for group, group_rules in spec.get('keyword_rules', dict()).items():
+        keyword_rules[group] = [KeywordRule(condition=compile_pattern(r['condition'], resolve),
+                                            action=getattr(PropertyValueSet, r['action'])) for r in group_rules]
+    rules = [Rule(condition_num=r['condition_num'], condition=compile_pattern(r['condition'], resolve),
+                  action=getattr(QuestionSet, r['action']), keywords=keyword_rules) for r in spec.get('rules', [])]
+    return RuleProfile(name, words, rules, keyword_rules)
+
+
+_rule_specs = dict()
+_profiles = dict()
+
+
+def rules_file_key(path):
+    """
+    规则文件的版本：路径、修改时间、大小和缓存格式的版本
+    """
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size, RULES_CACHE_VERSION
+
+
+def rule_spec(path=RULES_PATH, key=None):
+    """
+    读取规则文件，key与上次读取时不同时重新读取
+    """
+    cached = _rule_specs.get(path)
+    if cached is None or (key is not None and cached[0] != key):
+        with open(path, encoding='utf-8') as f:
+            cached = _rule_specs[path] = (key, json.load(f))
+    return cached[1]
+
+
+def profile_names(path=RULES_PATH):
+    return list(rule_spec(path)['profiles'])
+
+
+def load_profile(name, path=RULES_PATH, check=False):
+    """
+    编译一个领域的规则，第一次编译后pickle到__pycache__，规则文件没有变化（路径、修改时间和大小相同）时直接加载
+    :param name: 领域名称，见question_rules.json中的profiles
+    :param path: 规则文件
+    :param check: 已经加载过时是否检查规则文件有没有变化，变化时重新加载（热加载时使用）
+    :return: RuleProfile
+    """
+    cached = _profiles.get((name, path))
+    if cached is not None and not check:
+        return cached[1]
+    key = rules_file_key(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    cache_path = os.path.join(RULES_CACHE_DIR, 'question_rules.{}.pickle'.format(name))
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, profile = pickle.load(f)
+        if cached_key != key:
+            profile = None
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError, AttributeError, ImportError):
+        profile = None
+
+    if profile is None:
+        profiles = rule_spec(path, key)['profiles']
+        if name not in profiles:
+            raise KeyError('unknown rule profile {}'.format(name))
+        profile = compile_profile(name, profiles[name])
+        try:
+            os.makedirs(RULES_CACHE_DIR, exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, profile), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # TODO 目录不可写时只是不缓存
+            pass
+    # TODO 整体替换，正在使用旧规则的调用不受影响
+    _profiles[(name, path)] = (key, profile)
+    return profile
+
+
+def profile_rules(*names, check=False):
+    """
+    若干领域的匹配规则，按领域的顺序
+    """
+    return [rule for name in names for rule in load_profile(name, check=check).rules]
+
+
+def keyword_rules(profile, group):
+    """
+    某个领域的一组属性词匹配规则，例如keyword_rules('food', 'food_basic')
+    """
+    return load_profile(profile).keyword_rules[group]
+
+
+def keyword_group(keywords, profile, group):
+    """
+    动作中使用的关键词规则组
+    :param keywords: 规则所在领域编译后的关键词规则组（Rule.keywords）；为None时（直接调用动作）按领域加载
+    """
+    if keywords is not None:
+        return keywords[group]
+    return keyword_rules(profile, group)
+
+
+def __getattr__(name):
+    """
+    兼容以前直接定义在模块中的rules、xxx_keyword_rules和各个词语模式（例如food_entity），第一次访问时才编译
+    """
+    if name.startswith('__'):
+        raise AttributeError(name)
+    profiles = rule_spec()['profiles']
+    value = None
+    if name == 'rules':
+        value = profile_rules(*profiles)
+    elif name.endswith('_keyword_rules'):
+        group = name[:-len('_keyword_rules')]
+        owner = next((p for p, spec in profiles.items() if group in spec.get('keyword_rules', dict())), None)
+        if owner is not None:
+            value = keyword_rules(owner, group)
+    else:
+        owner = next((p for p, spec in profiles.items() if name in spec['words']), None)
+        if owner is not None:
+            value = load_profile(owner).words[name]
+    if value is None:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
@@ -0,0 +1,113 @@
+# encoding=utf-8
+
+"""
+
+@file: recipe_text.py
+
+@time: 2026/10/19
+
+@desc: 菜谱文本的公共处理，kg_update.py、kg_generator.py、recipe_dedup.py和entities_aglin.py共用，
+保证生成、去重和增量更新得到的三元组一致。
+
++ align_material：原料名称对齐，例如带皮五花肉 -> 五花肉、生姜 -> 姜、冰糖 -> 糖，知识图谱中:选材的取值是对齐后的名称
++ material_names：食材分区中"名称: 用量"形式的各项对齐后的原料名称
++ parse_steps：制作步骤的序号、去掉序号前缀的内容和时长提示，即步骤结点的:序号、:内容和:时长
+
+项目根目录下的脚本把KBQA加入sys.path后导入本模块。
+
+"""
+import re
+
+# TODO 食材分区，与entities_item.json中的键相同
+SECTIONS = ['主料', '辅料', '配料']
+
+# TODO 制作步骤的序号前缀，例如"3: "
+STEP_NUMBER_RE = re.compile(r'^\s*\d+\s*[:：]\s*')
+# TODO 步骤中的时长提示，例如"腌制10分钟"、"煮3-5分钟"、"炖一个半小时"
+DURATION_NUMBER = r'(?:\d+(?:\.\d+)?|[零一二两三四五六七八九十百半几]+)'
+DURATION_RE = re.compile(DURATION_NUMBER + r'(?:\s*[-~～到至]\s*' + DURATION_NUMBER + r')?\s*个?半?\s*(?:分钟|小时|钟头|秒钟|秒)')
+
+
+def ingredient_name(text):
+    """
+    "带皮五花肉: 800克" -> "带皮五花肉"
+    """
+    return text.partition(':')[0].strip().strip('　')
+
+
+def align_material(name):
+    """
+    原料名称对齐，按顺序应用，后面的规则可以覆盖前面的结果
+    :param name: 原料名称
+    :return: 对齐后的名称
+    """
+    target = name.strip('末').strip('段').strip('片')
+    if '五花肉' in target:
+        target = '五花肉'
+    if '糖' in target:
+        target = '糖'
+    if '蒜' in target:
+        target = '蒜'
+    if '姜' in target:
+        target = '姜'
+    if '葱' in target:
+        target = '葱'
+    if '豆瓣酱' in target:
+        target = '豆瓣酱'
+    if '排' in target:
+        target = '排骨'
+    if target == '鸡中翅':
+        target = '鸡翅中'
+    if '草鱼肉' == target:
+        target = '草鱼'
+    if '干' in target and '椒' in target:
+        target = '干辣椒'
+    if '胡椒' in target:
+        target = '胡椒'
+    if '花生' in target:
+        target = '花生'
+    if '醋' in target:
+        target = '醋'
+    if '木耳' in target:
+        target = '木耳'
+    if '酱油' in target:
+        target = '酱油'
+    if '黄瓜' in target:
+        target = '黄瓜'
+    if '青辣椒' in target or '青椒' in target or '红辣椒' in target or '红椒' in target:
+        target = '彩椒'
+    if '辣椒' in target:
+        target = '辣椒'
+    if '里脊' in target:
+        target = '里脊肉'
+    if '豆芽' in target:
+        target = '豆芽'
+    if '意面' == target:
+        target = '意大利面'
+    return target
+
+
+def material_names(values):
+    """
+    :param values: 食材分区中的各项，例如["带皮五花肉: 800克", "冰糖: 80克"]
+    :return: 对齐后去重的原料名称，按出现的顺序
+    """
+    names = list()
+    for value in values:
+        m = align_material(ingredient_name(value))
+        if m and m not in names:
+            names.append(m)
+    return names
+
+
+def parse_steps(steps):
+    """
+    ["1: 里脊肉切片，腌制10分钟。", ...] -> [(1, "里脊肉切片，腌制10分钟。", ["10分钟"]), ...]
+    序号按步骤在列表中的位置，与"第N步"的N一致
+    """
+    result = list()
+    for i, step in enumerate(steps):
+        text = STEP_NUMBER_RE.sub('', step, count=1).strip()
+        durations = list(dict.fromkeys(m.group(0) for m in DURATION_RE.finditer(text)))
+        result.append((i + 1, text, durations))
+    return result
@@ -0,0 +1,267 @@
+# encoding=utf-8
+
+"""
+
+@file: sparql_pool.py
+
+@time: 2026/10/19
+
+@desc: 多个Fuseki副本之间的负载均衡、对冲请求和故障摘除，由JenaFuseki在传入多个地址时使用。
+
++ 负载均衡：随机取两个可用副本，选择 最近延迟的EWMA * (进行中的请求数 + 1) 较小的一个
++ 对冲请求：请求超过该副本最近延迟的hedge_percentile分位数仍未返回时，向另一个副本再发一次，取先返回的结果
++ 故障摘除：连续失败eject_after次的副本在eject_seconds内不再分配请求，之后再试探，成功后恢复
++ 失败转移：请求失败时立即换一个未试过的副本重试
+
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+def percentile(sorted_values, q):
+    """
+    最近秩法的分位数
+    """
+    if len(sorted_values) == 0:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+class Replica:
+    def __init__(self, url, window=256, ewma_alpha=0.2):
+        self.url = url
+        self.latencies = deque(maxlen=window)
+        self.ewma_alpha = ewma_alpha
+        self.ewma = None
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+
+    def load(self):
+        return (self.ewma or 0.0) * (self.inflight + 1)
+
+    def ejected(self, now):
+        return now < self.ejected_until
+
+    def latency(self, q):
+        return percentile(sorted(self.latencies), q)
+
+    def to_dict(self, now):
+        ordered = sorted(self.latencies)
+        return {
+            'url': self.url,
+            'requests': self.requests,
+            'failures': self.failures,
+            'hedges': self.hedges,
+            'ejections': self.ejections,
+            'ejected': self.ejected(now),
+            'inflight': self.inflight,
+            'p50': percentile(ordered, 0.5),
+            'p95': percentile(ordered, 0.95),
+            'p99': percentile(ordered, 0.99),
+        }
+
+
+class ReplicaPool:
+    def __init__(self, urls, hedge_percentile=0.95, hedge_min_samples=20, hedge_default=0.05,
+                 eject_after=3, eject_seconds=30.0, max_workers=16, window=256, seed=None):
+        """
+        :param urls: 副本的查询地址
+        :param hedge_percentile: 超过该分位数的延迟时发送对冲请求，为None时不对冲
+        :param hedge_min_samples: 副本的延迟样本不足时使用hedge_default作为对冲的等待时间
+        :param hedge_default: 秒
+        :param eject_after: 连续失败多少次后摘除
+        :param eject_seconds: 摘除的时长
+        :param max_workers: 发送请求的线程数
+        """
+        if len(urls) == 0:
+            raise ValueError('at least one endpoint is required')
+        self.replicas = [Replica(url, window) for url in urls]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default = hedge_default
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+
+    def executor(self):
+        # TODO fork之后子进程中没有父进程的线程，需要重新创建线程池（见prefork.py）
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def pick(self, exclude=()):
+        """
+        选择一个副本，所有副本都被摘除时选择最早恢复的那个
+        :return: Replica，没有可选的副本时为None
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [r for r in self.replicas if r not in exclude]
+            if len(candidates) == 0:
+                return None
+            healthy = [r for r in candidates if not r.ejected(now)]
+            if len(healthy) == 0:
+                return min(candidates, key=lambda r: r.ejected_until)
+            if len(healthy) == 1:
+                return healthy[0]
+            a, b = self.rng.sample(healthy, 2)
+            return a if a.load() <= b.load() else b
+
+    def hedge_delay(self, replica):
+        if self.hedge_percentile is None or len(self.replicas) < 2:
+            return None
+        with self._lock:
+            if len(replica.latencies) < self.hedge_min_samples:
+                return self.hedge_default
+            return replica.latency(self.hedge_percentile)
+
+    def _call(self, replica, func, client_errors):
+        with self._lock:
+            replica.inflight += 1
+            replica.requests += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = func(replica.url)
+            ok = True
+            return result
+        except client_errors:
+            # TODO 查询本身的错误（例如语法错误）说明副本是正常的
+            ok = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                replica.inflight -= 1
+                if ok:
+                    replica.latencies.append(elapsed)
+                    a = replica.ewma_alpha
+                    replica.ewma = elapsed if replica.ewma is None else a * elapsed + (1 - a) * replica.ewma
+                    replica.consecutive_failures = 0
+                    replica.ejected_until = 0.0
+                else:
+                    replica.failures += 1
+                    replica.consecutive_failures += 1
+                    if replica.consecutive_failures >= self.eject_after:
+                        if not replica.ejected(time.monotonic()):
+                            replica.ejections += 1
+                        replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def execute(self, func, client_errors=(), discard=None):
+        """
+        在选出的副本上执行func(url)，必要时发送对冲请求或失败转移
+        :param func: 接收副本地址，返回结果
+        :param client_errors: 这些异常直接抛出，不计为副本的故障
+        :param discard: 对冲请求中较晚返回的结果会传给discard，例如关闭响应
+        :return: 最先成功返回的结果
+        """
+        tried = list()
+        pending = dict()
+        last_error = None
+        hedged = False
+
+        def submit():
+            replica = self.pick(exclude=tried)
+            if replica is None:
+                return None
+            tried.append(replica)
+            pending[self.executor().submit(self._call, replica, func, client_errors)] = replica
+            return replica
+
+        primary = submit()
+        delay = self.hedge_delay(primary)
+        while pending:
+            timeout = delay if not hedged and delay is not None else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if len(done) == 0:
+                hedged = True
+                replica = submit()
+                if replica is not None:
+                    with self._lock:
+                        replica.hedges += 1
+                continue
+            for future in done:
+                pending.pop(future)
+                try:
+                    result = future.result()
+                except client_errors:
+                    self._discard(pending, discard)
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if len(pending) == 0:
+                        submit()
+                    continue
+                self._discard(pending, discard)
+                return result
+        raise last_error
+
+    @staticmethod
+    def _discard(pending, discard):
+        if discard is None:
+            return
+        for future in pending:
+            future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [r.to_dict(now) for r in self.replicas]
+
+    def close(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+
+
+# TODO 用于测试：三个本地副本，其中一个偶尔停顿，另有一个无法连接的地址
+if __name__ == '__main__':
+    import socket
+
+    import jena_sparql_endpoint
+    import local_fuseki
+
+    nt = ['./data/aifoodtime_ntriples.nt']
+    store = local_fuseki.TripleStore()
+    store.load(nt[0])
+    servers = [
+        local_fuseki.start_local_fuseki(nt, delay=0.002, jitter=0.002, store=store),
+        local_fuseki.start_local_fuseki(nt, delay=0.002, jitter=0.002, store=store),
+        local_fuseki.start_local_fuseki(nt, delay=0.002, jitter=0.002, store=store, pause=0.3, pause_rate=0.05),
+    ]
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    dead = 'http://127.0.0.1:{}/cookbook/query'.format(sock.getsockname()[1])
+    sock.close()
+    urls = [s.url for s in servers] + [dead]
+
+    query = "PREFIX : <http://kg.course/ai-food-time/>\nSELECT DISTINCT ?x WHERE {\n?s :名称 '元宝红烧肉'. \n?s :主料 ?x.}"
+    for name, options in [('no hedge', {'hedge_percentile': None}), ('hedge p95', {'hedge_percentile': 0.95})]:
+        fuseki = jena_sparql_endpoint.JenaFuseki(urls, **options)
+        latencies = list()
+        for _ in range(400):
+            start = time.perf_counter()
+            fuseki.get_sparql_result_value(fuseki.get_sparql_result(query))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print('{}: p50 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms'.format(
+            name, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, latencies[-1] * 1000))
+        for r in fuseki.pool.stats():
+            print('    {url}: requests {requests}, failures {failures}, hedges {hedges}, '
+                  'ejections {ejections}, ejected {ejected}'.format(**r))
+        fuseki.pool.close()
@@ -0,0 +1,122 @@
+# encoding=utf-8
+
+"""
+
+@file: test_hot_reload.py
+
+@time: 2026/10/19
+
+@desc: 增量更新后重新加载的测试：/update加入或删除的实体在/reload之后仍然能回答和补全。
+
+使用本地Fuseki替身和外部词典的临时副本，不修改external_dict。在KBQA目录下运行：
+python -m unittest test_hot_reload
+
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import jena_sparql_endpoint
+import kg_update
+import local_fuseki
+import qa_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NT_PATH = os.path.join(HERE, 'data', 'aifoodtime_ntriples.nt')
+DICT_PATH = os.path.join(HERE, 'external_dict', 'entities_list.txt')
+
+
+class UpdateReloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwd = os.getcwd()
+        # TODO 补全索引默认的可视化数据路径相对于KBQA目录
+        os.chdir(HERE)
+        cls.tmp = tempfile.mkdtemp()
+        cls.dict_path = os.path.join(cls.tmp, 'entities_list.txt')
+        shutil.copy(DICT_PATH, cls.dict_path)
+        cls.fuseki = local_fuseki.start_local_fuseki([NT_PATH])
+        cls.server = qa_server.make_server('127.0.0.1', 0, [cls.dict_path], [NT_PATH], cls.fuseki.url)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = 'http://127.0.0.1:{}'.format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.fuseki.shutdown()
+        cls.fuseki.server_close()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        os.chdir(cls.cwd)
+
+    def get(self, path, **params):
+        with urlopen('{}{}?{}'.format(self.base, path, urlencode(params))) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def post(self, path, body):
+        request = Request(self.base + path, data=json.dumps(body, ensure_ascii=False).encode('utf-8'),
+                          headers={'Content-Type': 'application/json; charset=utf-8'})
+        with urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def update(self, name, item):
+        """
+        与kg_update.py --server相同：先更新Fuseki，再把差异发给/update
+        """
+        delta = qa_server.QAHandler.updater.dish_delta(name, item)
+        jena_sparql_endpoint.JenaFuseki(self.fuseki.url).update('\n;\n'.join(delta.to_updates()))
+        return self.post('/update', delta.to_dict())
+
+    def suggestions(self, partial):
+        return {s['entity']: s['kind'] for s in self.get('/suggest', q=partial)['suggestions']}
+
+    def test_added_dish_survives_reload(self):
+        report = self.update('测试新菜', {'主料': ['带皮五花肉: 1斤', '冰糖: 1块']})
+        self.assertEqual(report['words_added'], ['测试新菜'])
+        before = self.get('/answer', q='测试新菜的主料是什么？')
+        self.assertEqual(sorted(before['answer']), ['冰糖: 1块', '带皮五花肉: 1斤'])
+
+        reload_report = self.post('/reload', {})
+        self.assertGreaterEqual(reload_report['replayed'], 1)
+        after = self.get('/answer', q='测试新菜的主料是什么？')
+        self.assertIsNotNone(after['query'])
+        self.assertFalse(after['cached'])
+        self.assertEqual(sorted(after['answer']), ['冰糖: 1块', '带皮五花肉: 1斤'])
+        self.assertEqual(self.suggestions('测试新').get('测试新菜'), 'dish')
+
+    def test_added_category_keeps_kind(self):
+        self.update('测试大类', {'子菜品': ['1. 元宝红烧肉', '2. 山楂红烧肉']})
+        self.post('/reload', {})
+        # TODO 外部词典中没有类型，补全索引中仍然是大类
+        self.assertEqual(self.suggestions('测试大').get('测试大类'), 'category')
+        answer = self.get('/answer', q='测试大类包括哪些菜？')
+        self.assertEqual(sorted(answer['answer']), ['元宝红烧肉', '山楂红烧肉'])
+
+    def test_removed_dish_stays_removed(self):
+        self.assertIn('栗子红烧肉', self.suggestions('栗子'))
+        report = self.update('栗子红烧肉', None)
+        self.assertIn('栗子红烧肉', report['words_removed'])
+        self.post('/reload', {})
+        self.assertNotIn('栗子红烧肉', self.suggestions('栗子'))
+        self.assertIsNone(self.get('/answer', q='栗子红烧肉的主料是什么？')['query'])
+
+    def test_update_rejected_without_writable_dict(self):
+        updater = qa_server.QAHandler.updater
+        dict_path = updater.dict_path
+        updater.dict_path = None
+        try:
+            with self.assertRaises(HTTPError) as cm:
+                self.post('/update', kg_update.TripleDelta(list(), list()).to_dict())
+            self.assertEqual(cm.exception.code, 400)
+        finally:
+            updater.dict_path = dict_path
+
+
+if __name__ == '__main__':
+    unittest.main()
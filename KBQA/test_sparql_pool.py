@@ -0,0 +1,141 @@
+# encoding=utf-8
+
+"""
+
+@file: test_sparql_pool.py
+
+@time: 2026/10/19
+
+@desc: 多副本查询的测试：对冲请求降低p99延迟，连续失败的副本被摘除并在恢复后重新使用，查询语法错误直接抛出不做失败转移。
+
+副本是不同延迟的本地Fuseki替身，共用同一个TripleStore。在KBQA目录下运行：
+python -m unittest test_sparql_pool
+
+"""
+import os
+import random
+import socket
+import threading
+import time
+import unittest
+
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
+
+import jena_sparql_endpoint
+import local_fuseki
+import sparql_pool
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NT_PATH = os.path.join(HERE, 'data', 'aifoodtime_ntriples.nt')
+
+QUERY = "PREFIX : <http://kg.course/ai-food-time/>\nSELECT DISTINCT ?x WHERE {\n?s :名称 '元宝红烧肉'. \n?s :主料 ?x.}"
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def stop(server):
+    server.shutdown()
+    server.server_close()
+
+
+class ReplicaPoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.store = local_fuseki.TripleStore()
+        cls.store.load(NT_PATH)
+        cls.servers = list()
+
+    @classmethod
+    def tearDownClass(cls):
+        for server in cls.servers:
+            stop(server)
+
+    def setUp(self):
+        # TODO 替身的停顿用全局的random
+        random.seed(1)
+
+    def start(self, **options):
+        server = local_fuseki.start_local_fuseki([NT_PATH], store=self.store, **options)
+        self.servers.append(server)
+        return server
+
+    def fuseki(self, urls, **options):
+        fuseki = jena_sparql_endpoint.JenaFuseki(urls, seed=1, **options)
+        self.addCleanup(fuseki.pool.close)
+        return fuseki
+
+    def p99(self, fuseki, clients=8, requests=50):
+        """
+        clients个线程并发查询，进行中的请求较多时较慢的副本也会分到请求
+        """
+        latencies = list()
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(requests):
+                start = time.perf_counter()
+                fuseki.get_sparql_result(QUERY)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sparql_pool.percentile(sorted(latencies), 0.99)
+
+    def test_hedging_lowers_p99(self):
+        # TODO 一个副本平时较快但有10%的请求停顿0.3秒，另一个副本稳定在20毫秒
+        steady = self.start(delay=0.02, jitter=0.002)
+        stalling = self.start(delay=0.003, jitter=0.002, pause=0.3, pause_rate=0.1)
+        urls = [steady.url, stalling.url]
+
+        plain = self.p99(self.fuseki(urls, hedge_percentile=None))
+        hedged_fuseki = self.fuseki(urls, hedge_percentile=0.8)
+        hedged = self.p99(hedged_fuseki)
+        self.assertGreaterEqual(plain, 0.3)
+        self.assertLess(hedged, plain / 2)
+        self.assertGreater(sum(r['hedges'] for r in hedged_fuseki.pool.stats()), 0)
+
+    def test_ejected_replica_is_readmitted(self):
+        live = self.start()
+        port = free_port()
+        down = 'http://127.0.0.1:{}/cookbook/query'.format(port)
+        fuseki = self.fuseki([live.url, down], hedge_percentile=None, eject_after=2, eject_seconds=0.5)
+        replica = fuseki.pool.replicas[1]
+
+        # TODO 没有延迟样本的副本负载为0，先被选中，失败后转移到可用的副本
+        for _ in range(4):
+            self.assertTrue(fuseki.get_sparql_result_value(fuseki.get_sparql_result(QUERY)))
+        self.assertEqual(replica.failures, 2)
+        self.assertEqual(replica.ejections, 1)
+        self.assertTrue(fuseki.pool.stats()[1]['ejected'])
+
+        self.servers.append(local_fuseki.start_local_fuseki([NT_PATH], port=port, store=self.store))
+        time.sleep(0.6)
+        fuseki.get_sparql_result(QUERY)
+        stats = fuseki.pool.stats()[1]
+        self.assertFalse(stats['ejected'])
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(replica.consecutive_failures, 0)
+        self.assertEqual(len(replica.latencies), 1)
+
+    def test_bad_query_is_not_retried(self):
+        urls = [self.start().url, self.start().url]
+        fuseki = self.fuseki(urls, hedge_percentile=None, eject_after=1)
+        with self.assertRaises(QueryBadFormed):
+            fuseki.get_sparql_result('SELECT ?x WHERE {')
+        stats = fuseki.pool.stats()
+        self.assertEqual(sum(r['requests'] for r in stats), 1)
+        self.assertEqual(sum(r['failures'] for r in stats), 0)
+        self.assertFalse(any(r['ejected'] for r in stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
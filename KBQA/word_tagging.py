@@ -21,24 +21,55 @@ class Word(object):
 
 class Tagger:
     def __init__(self, dict_paths):
+        # TODO 每个Tagger使用自己的分词器，不修改jieba的全局分词器；重新加载词典时在新的Tagger中建立，
+        # TODO 正在使用旧Tagger分词的请求不受影响
+        self.dt = jieba.Tokenizer()
+        self.pt = pseg.POSTokenizer(self.dt)
+
         # TODO 加载外部词典
         for p in dict_paths:
-            jieba.load_userdict(p)
+            self.dt.load_userdict(p)
 
         # TODO jieba不能正确切分的词语，我们人工调整其频率。
-        jieba.suggest_freq(('制作', '方法'), True)
-        jieba.suggest_freq(('制作'), True)
-        jieba.suggest_freq(('如何', '制作'), True)
+        self.dt.suggest_freq(('制作', '方法'), True)
+        self.dt.suggest_freq(('制作'), True)
+        self.dt.suggest_freq(('如何', '制作'), True)
+
+    def add_words(self, words, tag='ai'):
+        """
+        向已加载的词典中加入实体，与外部词典中"名称 ai"一行的效果相同
+        :param words:
+        :param tag:
+        :return:
+        """
+        for w in words:
+            self.dt.add_word(w, tag=tag)
+
+    def del_words(self, words):
+        """
+        从已加载的词典中删除实体，同时去掉它的词性
+        :param words:
+        :return:
+        """
+        for w in words:
+            self.dt.del_word(w)
+            self.dt.user_word_tag_tab.pop(w, None)
+            self.pt.word_tag_tab.pop(w, None)
+
+    def warm_up(self):
+        """
+        第一次分词时合并外部词典的词性，提前完成
+        """
+        self.get_word_objects('如何制作水煮鱼？')
 
-    @staticmethod
-    def get_word_objects(sentence):
+    def get_word_objects(self, sentence):
         # type: (str) -> list
         """
         把自然语言转为Word对象
         :param sentence:
         :return:
         """
-        return [Word(word, tag) for word, tag in pseg.cut(sentence)]
+        return [Word(word, tag) for word, tag in self.pt.cut(sentence)]
 
 
 # TODO 用于测试
@@ -0,0 +1,370 @@
+# encoding=utf-8
+
+"""
+
+@file: kg_generator.py
+
+@time: 2026/10/19
+
+@desc: 生成pro规模的合成菜谱知识图谱，用于离线的扩展性测试。
+
+从真实数据（entities_item.json和vizdata.json）中统计原料个数、原料、特色和制作步骤长度的分布，
+按分布采样生成指定数量的菜品和大类，同时输出：
++ entities_item.json：菜品和大类信息，与visualization/entities_item_mimini.json格式相同
++ vizdata.json：可视化数据，与visualization/vizdata.json格式相同
++ ntriples.nt：三元组，与KBQA/data/aifoodtime_ntriples.nt格式相同，包括制作步骤的步骤结点
++ entities_list.txt：外部词典，与KBQA/external_dict/entities_list.txt格式相同
+
+用法：
+python kg_generator.py --dishes 10000 --categories 362 --output ./synthetic/10k
+
+--nested时生成嵌套的大类：修饰词+真实大类属于真实大类，修饰词+菜名的大类属于同一修饰词的大类（存在时），
+例如红烧肉类 ⊃ 麻辣红烧肉类 ⊃ 麻辣元宝红烧肉类，用<上级大类> :属于 "子类名称"表示，见KBQA/category_closure.py
+
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'KBQA'))
+from recipe_text import SECTIONS, align_material, parse_steps
+
+triple_template = "<http://kg.course/ai-food-time/{}> <http://kg.course/ai-food-time/{}> \"{}\" .\n"
+link_template = "<http://kg.course/ai-food-time/{}> <http://kg.course/ai-food-time/{}> <http://kg.course/ai-food-time/{}> .\n"
+
+# TODO 合成菜名时使用的修饰词，参考真实数据中的变体写法
+MODIFIERS = ['家常', '麻辣', '香辣', '秘制', '私房', '小清新版', '懒人版', '改良版', '家庭版',
+             '快手', '酱香', '蒜香', '川味', '湘味', '粤式', '无油版', '下饭', '外婆', '农家', '老式']
+
+
+def split_item(text):
+    """
+    "带皮五花肉: 800克" -> ("带皮五花肉", "800克")
+    """
+    name, _, amount = text.partition(':')
+    return name.strip().strip('\u3000'), amount.strip()
+
+
+def escape_literal(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class RecipeDistribution:
+    """
+    真实数据中的经验分布，采样时直接从观测值中均匀抽取，重复出现的值自然带有权重
+    """
+    def __init__(self, entities_item_path, vizdata_path):
+        with open(entities_item_path, encoding='utf-8') as f:
+            items = json.load(f)
+        with open(vizdata_path, encoding='utf-8') as f:
+            vizdata = json.load(f)
+
+        self.dish_names = list()
+        self.section_counts = {s: list() for s in SECTIONS}
+        self.section_items = {s: list() for s in SECTIONS}
+        self.feature_values = dict()
+        self.step_counts = list()
+        self.step_texts = list()
+
+        for name, item in items.items():
+            if '子菜品' in item:
+                continue
+            self.dish_names.append(name)
+            for s in SECTIONS:
+                values = item.get(s, [])
+                self.section_counts[s].append(len(values))
+                self.section_items[s].extend(values)
+            for feature in item.get('特色', []):
+                key, value = split_item(feature)
+                self.feature_values.setdefault(key, list()).append(value)
+            steps = item.get('制作步骤', [])
+            self.step_counts.append(len(steps))
+            for step in steps:
+                _, _, text = step.partition(':')
+                if text.strip():
+                    self.step_texts.append(text.strip())
+
+        # TODO 真实大类及其菜品，大类id形如"1-红烧肉类"
+        self.categories = dict()
+        for link in vizdata['links']:
+            if link['relation'] == '属于':
+                category = link['source'].split('-', 1)[-1]
+                self.categories.setdefault(category, list()).append(link['target'])
+        self.dish_category = dict()
+        for category, dishes in self.categories.items():
+            for d in dishes:
+                self.dish_category[d] = category
+
+
+class KGGenerator:
+    def __init__(self, dist, num_dishes, num_categories, seed=0, nested=False):
+        self.dist = dist
+        self.num_dishes = num_dishes
+        self.num_categories = num_categories
+        self.nested = nested
+        self.rng = random.Random(seed)
+
+    def category_names(self):
+        """
+        先使用真实的大类，不够时用修饰词+真实大类生成，再不够时用修饰词+真实菜名生成
+        :return: [(category, base_category), ...]
+        """
+        real = sorted(self.dist.categories)
+        names = [(c, c) for c in real]
+        seen = set(real)
+        candidates = [(m + c, c) for m in MODIFIERS for c in real]
+        candidates += [(m + d + '类', self.dist.dish_category.get(d, real[0]))
+                       for m in [''] + MODIFIERS for d in self.dist.dish_names]
+        for name, base in candidates:
+            if len(names) >= self.num_categories:
+                break
+            if name not in seen:
+                seen.add(name)
+                names.append((name, base))
+        n = 1
+        while len(names) < self.num_categories:
+            name = '{}{}类'.format(real[n % len(real)][:-1], n)
+            if name not in seen:
+                seen.add(name)
+                names.append((name, real[n % len(real)]))
+            n += 1
+        return names[:self.num_categories]
+
+    @staticmethod
+    def category_parents(categories):
+        """
+        嵌套大类的上级：修饰词+菜名的大类优先属于同一修饰词的大类，否则属于它的真实大类
+        :param categories: [(category, base_category), ...]
+        :return: [上级大类的序号或None, ...]
+        """
+        index = {name: i for i, (name, _) in enumerate(categories)}
+        parents = list()
+        for i, (name, base) in enumerate(categories):
+            parent = None
+            if name != base:
+                parent = index.get(base)
+                for m in MODIFIERS:
+                    if name.startswith(m) and index.get(m + base) not in (None, i):
+                        parent = index[m + base]
+                        break
+            parents.append(parent)
+        return parents
+
+    def dish_names(self):
+        """
+        真实菜名、修饰词+真实菜名，之后加编号，保证不重名
+        :return: 迭代(dish, base_dish)
+        """
+        bases = self.dist.dish_names
+        seen = set(bases)
+        count = 0
+        for b in bases:
+            yield b, b
+            count += 1
+            if count >= self.num_dishes:
+                return
+        for m in MODIFIERS:
+            for b in bases:
+                if m + b not in seen and not b.startswith(m):
+                    seen.add(m + b)
+                    yield m + b, b
+                    count += 1
+                    if count >= self.num_dishes:
+                        return
+        n = 2
+        while True:
+            for m in [''] + MODIFIERS:
+                for b in bases:
+                    name = '{}{}{}号'.format(m, b, n)
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                    yield name, b
+                    count += 1
+                    if count >= self.num_dishes:
+                        return
+            n += 1
+
+    def make_item(self):
+        rng = self.rng
+        dist = self.dist
+        item = dict()
+        for s in SECTIONS:
+            k = rng.choice(dist.section_counts[s])
+            if k == 0:
+                continue
+            values = list()
+            names = set()
+            for _ in range(k * 3):
+                value = rng.choice(dist.section_items[s])
+                name = split_item(value)[0]
+                if name not in names:
+                    names.add(name)
+                    values.append(value)
+                if len(values) >= k:
+                    break
+            item[s] = values
+        item['特色'] = ['{}: {}'.format(key, rng.choice(values))
+                      for key, values in sorted(dist.feature_values.items())]
+        steps = rng.choice(dist.step_counts)
+        item['制作步骤'] = ['{}: {}'.format(i + 1, rng.choice(dist.step_texts)) for i in range(steps)]
+        return item
+
+    def generate(self, output_dir, indent=None):
+        """
+        逐个生成菜品并流式写出，只在内存中保留菜名、大类成员和原料名称
+        :return: 统计信息
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        rng = self.rng
+        categories = self.category_names()
+        by_base = dict()
+        for i, (name, base) in enumerate(categories):
+            by_base.setdefault(base, list()).append(i)
+        members = [list() for _ in categories]
+        subcategories = [list() for _ in categories]
+        if self.nested:
+            for i, parent in enumerate(self.category_parents(categories)):
+                if parent is not None:
+                    subcategories[parent].append(i)
+        materials = set()
+        stats = {'dishes': 0, 'categories': len(categories), 'triples': 0, 'links': 0}
+
+        item_f = open(os.path.join(output_dir, 'entities_item.json'), 'w', encoding='utf-8')
+        nt_f = open(os.path.join(output_dir, 'ntriples.nt'), 'w', encoding='utf-8')
+        viz_f = open(os.path.join(output_dir, 'vizdata.json'), 'w', encoding='utf-8')
+        try:
+            item_f.write('{')
+            viz_f.write('{"links": [')
+            first_link = True
+            dish_id = 0
+            for dish, base in self.dish_names():
+                dish_id += 1
+                item = self.make_item()
+                base_category = self.dist.dish_category.get(base)
+                choices = by_base.get(base_category) or range(len(categories))
+                members[rng.choice(choices)].append(dish)
+
+                item_f.write('{}\n{}: {}'.format('' if dish_id == 1 else ',', json.dumps(dish, ensure_ascii=False),
+                                                  json.dumps(item, ensure_ascii=False, indent=indent)))
+
+                nt_f.write(triple_template.format(dish_id, '名称', escape_literal(dish)))
+                stats['triples'] += 1
+                dish_materials = list()
+                for s in SECTIONS:
+                    for value in item.get(s, []):
+                        nt_f.write(triple_template.format(dish_id, s, escape_literal(value)))
+                        stats['triples'] += 1
+                        m = align_material(split_item(value)[0])
+                        if m and m not in dish_materials:
+                            dish_materials.append(m)
+                for value in item['特色']:
+                    nt_f.write(triple_template.format(dish_id, '特色', escape_literal(value)))
+                    stats['triples'] += 1
+                # TODO 没有步骤时不输出，与kg_update.py的item_triples相同
+                if item['制作步骤']:
+                    nt_f.write(triple_template.format(dish_id, '制作步骤', escape_literal(''.join(item['制作步骤']))))
+                    stats['triples'] += 1
+                for n, text, durations in parse_steps(item['制作步骤']):
+                    step_id = '{}-步骤{}'.format(dish_id, n)
+                    nt_f.write(link_template.format(dish_id, '步骤', step_id))
+                    nt_f.write(triple_template.format(step_id, '序号', n))
+                    nt_f.write(triple_template.format(step_id, '内容', escape_literal(text)))
+                    stats['triples'] += 3
+                    for d in durations:
+                        nt_f.write(triple_template.format(step_id, '时长', escape_literal(d)))
+                        stats['triples'] += 1
+
+                for m in dish_materials:
+                    materials.add(m)
+                    nt_f.write(triple_template.format(dish_id, '选材', escape_literal(m)))
+                    stats['triples'] += 1
+                    link = {'relation': '选材', 'source': dish, 'target': m, 'value': 3}
+                    viz_f.write(('' if first_link else ',') + '\n' + json.dumps(link, ensure_ascii=False))
+                    first_link = False
+                    stats['links'] += 1
+            stats['dishes'] = dish_id
+
+            # TODO 大类接在菜品之后编号，与aifoodtime_ntriples.nt相同
+            for i, (name, _) in enumerate(categories):
+                cid = dish_id + i + 1
+                key = '{}-{}'.format(i + 1, name)
+                nt_f.write(triple_template.format(cid, '名称', escape_literal(name)))
+                stats['triples'] += 1
+                for dish in members[i]:
+                    nt_f.write(triple_template.format(cid, '属于', escape_literal(dish)))
+                    stats['triples'] += 1
+                    link = {'relation': '属于', 'source': key, 'target': dish, 'value': 3}
+                    viz_f.write(('' if first_link else ',') + '\n' + json.dumps(link, ensure_ascii=False))
+                    first_link = False
+                    stats['links'] += 1
+                for j in subcategories[i]:
+                    nt_f.write(triple_template.format(cid, '属于', escape_literal(categories[j][0])))
+                    stats['triples'] += 1
+                    link = {'relation': '属于', 'source': key, 'target': '{}-{}'.format(j + 1, categories[j][0]),
+                            'value': 3}
+                    viz_f.write(('' if first_link else ',') + '\n' + json.dumps(link, ensure_ascii=False))
+                    first_link = False
+                    stats['links'] += 1
+                sub = {'子菜品': ['{}. {}'.format(j + 1, d) for j, d in enumerate(members[i])]}
+                if subcategories[i]:
+                    sub['子类'] = [categories[j][0] for j in subcategories[i]]
+                item_f.write(',\n{}: {}'.format(json.dumps(key, ensure_ascii=False),
+                                                json.dumps(sub, ensure_ascii=False, indent=indent)))
+            item_f.write('\n}\n')
+
+            viz_f.write('\n], "nodes": [')
+            nodes = [{'class': '菜品大类', 'group': '0', 'id': '{}-{}'.format(i + 1, name), 'size': '16'}
+                     for i, (name, _) in enumerate(categories)]
+            first_node = True
+            for node in nodes:
+                viz_f.write(('' if first_node else ',') + '\n' + json.dumps(node, ensure_ascii=False))
+                first_node = False
+            for dishes in members:
+                for dish in dishes:
+                    node = {'class': '精品特色菜', 'group': '1', 'id': dish, 'size': '10'}
+                    viz_f.write(',\n' + json.dumps(node, ensure_ascii=False))
+            # TODO 与菜品或大类同名的原料共用一个结点
+            names = set(name for name, _ in categories)
+            for dishes in members:
+                names.update(dishes)
+            for m in sorted(materials - names):
+                node = {'class': '原料', 'group': '2', 'id': m, 'size': '8'}
+                viz_f.write(',\n' + json.dumps(node, ensure_ascii=False))
+            viz_f.write('\n]}\n')
+        finally:
+            item_f.close()
+            nt_f.close()
+            viz_f.close()
+
+        # TODO 外部词典：菜品、大类和原料
+        with open(os.path.join(output_dir, 'entities_list.txt'), 'w', encoding='utf-8') as f:
+            for name in sorted(names | materials):
+                f.write(name + ' ai' + '\n')
+        stats['materials'] = len(materials)
+        return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成合成的pro规模菜谱知识图谱')
+    parser.add_argument('--dishes', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=362)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--items', default='./visualization/entities_item.json')
+    parser.add_argument('--vizdata', default='./visualization/vizdata.json')
+    parser.add_argument('--output', default=None, help='默认为./synthetic/<菜品数>')
+    parser.add_argument('--indent', type=int, default=None, help='entities_item.json中每个菜品的缩进')
+    parser.add_argument('--nested', action='store_true', help='生成嵌套的大类')
+    args = parser.parse_args()
+
+    output = args.output or os.path.join('./synthetic', str(args.dishes))
+    start = time.time()
+    dist = RecipeDistribution(args.items, args.vizdata)
+    generator = KGGenerator(dist, args.dishes, args.categories, args.seed, args.nested)
+    stats = generator.generate(output, args.indent)
+    print('dishes: {dishes}, categories: {categories}, materials: {materials}, '
+          'links: {links}, triples: {triples}'.format(**stats))
+    print('write path: {}, cost {:.1f}s'.format(output, time.time() - start))
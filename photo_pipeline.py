@@ -0,0 +1,155 @@
+# encoding=utf-8
+
+"""
+
+@file: photo_pipeline.py
+
+@time: 2026/10/19
+
+@desc: 批量生成菜品图片的缩略图和WebP版本，用多进程并行处理。
+
+对recipe_photo中的每张图片按--widths生成不同宽度的JPEG和WebP（不放大，宽度不小于原图时只生成原尺寸），
+输出文件名带有原图sha256的前8位，便于浏览器长期缓存。manifest.json以菜品名称为键，记录原图的sha256、
+尺寸和各版本的路径；再次运行时原图sha256不变且输出文件都存在的图片直接跳过，原图变化或删除时清理旧的输出。
+
+用法：
+python photo_pipeline.py
+python photo_pipeline.py --input ./visualization/recipe_photo --output ./visualization/recipe_photo_derived --widths 64 128
+
+需要安装Pillow。
+
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png')
+FORMATS = {'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+           'webp': ('WEBP', {'quality': 80, 'method': 6})}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def derive(source, sha256, output_dir, widths):
+    """
+    生成一张图片的所有版本，在子进程中运行
+    :return: manifest中的一项
+    """
+    dish = os.path.splitext(os.path.basename(source))[0]
+    with Image.open(source) as image:
+        image = image.convert('RGB')
+        width, height = image.size
+        targets = sorted(set(min(w, width) for w in widths))
+        variants = dict()
+        for w in targets:
+            h = max(1, round(height * w / width))
+            resized = image if w == width else image.resize((w, h), Image.LANCZOS)
+            os.makedirs(os.path.join(output_dir, str(w)), exist_ok=True)
+            variants[str(w)] = dict()
+            for ext, (fmt, options) in FORMATS.items():
+                name = '{}/{}.{}.{}'.format(w, dish, sha256[:8], ext)
+                resized.save(os.path.join(output_dir, name), fmt, **options)
+                variants[str(w)][ext] = name
+    return dish, {'source': os.path.basename(source), 'sha256': sha256,
+                  'width': width, 'height': height, 'variants': variants}
+
+
+def entry_files(entry):
+    return [name for formats in entry['variants'].values() for name in formats.values()]
+
+
+def up_to_date(entry, sha256, output_dir, widths):
+    if entry is None or entry['sha256'] != sha256:
+        return False
+    if sorted(entry['variants'], key=int) != [str(w) for w in sorted(set(min(w, entry['width']) for w in widths))]:
+        return False
+    return all(os.path.exists(os.path.join(output_dir, name)) for name in entry_files(entry))
+
+
+def remove_files(names, output_dir):
+    for name in names:
+        path = os.path.join(output_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run(input_dir, output_dir, widths, workers=None):
+    """
+    增量处理input_dir中的图片并写出manifest.json
+    :return: 统计信息
+    """
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = dict()
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    sources = sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir)
+                     if name.lower().endswith(IMAGE_EXTS))
+    stats = {'total': len(sources), 'skipped': 0, 'derived': 0, 'removed': 0, 'failed': 0}
+    jobs = list()
+    present = set()
+    for source in sources:
+        dish = os.path.splitext(os.path.basename(source))[0]
+        present.add(dish)
+        sha256 = file_sha256(source)
+        if up_to_date(manifest.get(dish), sha256, output_dir, widths):
+            stats['skipped'] += 1
+        else:
+            jobs.append((dish, source, sha256))
+
+    # TODO 原图已删除的菜品
+    for dish in [d for d in manifest if d not in present]:
+        remove_files(entry_files(manifest.pop(dish)), output_dir)
+        stats['removed'] += 1
+
+    if jobs:
+        os.makedirs(output_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(dish, pool.submit(derive, source, sha256, output_dir, widths))
+                       for dish, source, sha256 in jobs]
+            for dish, future in futures:
+                try:
+                    _, entry = future.result()
+                except (OSError, ValueError) as e:
+                    print('failed: {} ({})'.format(dish, e))
+                    stats['failed'] += 1
+                    continue
+                old = manifest.get(dish)
+                if old is not None:
+                    remove_files(set(entry_files(old)) - set(entry_files(entry)), output_dir)
+                manifest[dish] = entry
+                stats['derived'] += 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifest.items())), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, manifest_path)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成菜品图片的缩略图和WebP版本')
+    parser.add_argument('--input', default='./visualization/recipe_photo')
+    parser.add_argument('--output', default='./visualization/recipe_photo_derived')
+    parser.add_argument('--widths', type=int, nargs='+', default=[64, 128, 320])
+    parser.add_argument('--workers', type=int, default=None, help='默认为CPU个数')
+    args = parser.parse_args()
+
+    start = time.time()
+    stats = run(args.input, args.output, args.widths, args.workers)
+    print('total: {total}, derived: {derived}, skipped: {skipped}, '
+          'removed: {removed}, failed: {failed}'.format(**stats))
+    print('write path: {}, cost {:.1f}s'.format(args.output, time.time() - start))
@@ -0,0 +1,322 @@
+# encoding=utf-8
+
+"""
+
+@file: recipe_dedup.py
+
+@time: 2026/10/19
+
+@desc: 找出entities_item.json中近似重复的菜品（例如家常鱼香肉丝、家常版鱼香肉丝、家庭版鱼香肉丝），输出合并报告或合并后的数据。
+
+每个菜品取三组特征：去掉"家常版"等修饰词后菜名的二字片段，对齐后的原料名称集合（KBQA/recipe_text.py，与知识图谱的:选材相同），
+以及制作步骤文本的k字符片段集合。三组特征分别计算MinHash签名。菜名片段只用于分桶：按LSH分段（每段r行，同一段签名相同的菜品
+落入同一个桶）找出候选对，只比较落入同一个桶的菜品，总耗时与菜品数大致成线性关系。候选对的两个菜名必须只相差修饰词或编号后缀
+（例如家常版鱼香肉丝和鱼香肉丝），红烧排骨面、土豆红烧排骨和红烧排骨多了菜品本身的字，红烧糖醋排骨和糖醋排骨做法不同，都不合并。
+再用签名中相同位置取值相等的比例估计原料和步骤的Jaccard相似度（numpy批量计算），加权和（--weights）不低于--threshold减去
+估计误差的候选对，用精确的Jaccard相似度复核，不低于--threshold时判定为重复。
+真实数据中同名变体的原料和步骤往往由不同的人撰写，差别较大，默认的阈值较低，只排除做法完全不同的同名菜品。
+
+按名称长度从短到长依次选取尚未归类的菜品作为簇的保留菜品，与它直接判定为重复且尚未归类的菜品作为它的别名，
+避免经由中间菜品传递合并（例如红烧肉—元宝红烧肉—元宝红烧肉2号）形成过大的簇。报告中给出别名与保留菜品精确的Jaccard相似度。
+--collapse输出去掉别名菜品后的entities_item.json，大类的子菜品列表改为保留的菜品并去重。
+
+用法：
+python recipe_dedup.py ./visualization/entities_item.json --report ./visualization/dedup_report.json
+python recipe_dedup.py ./synthetic/10000/entities_item.json --threshold 0.6 --collapse ./synthetic/10000/entities_item_dedup.json
+
+需要安装numpy。
+
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from kg_generator import MODIFIERS, SECTIONS
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'KBQA'))
+from recipe_text import STEP_NUMBER_RE, material_names
+
+# TODO 与datasketch相同的哈希族：(a * x + b) mod (2^61 - 1)，取低32位
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+# TODO 菜名分桶时LSH的S形曲线拐点，只相差修饰词的菜名片段完全相同
+NAME_BAND_THRESHOLD = 0.8
+# TODO 签名估计的相似度比阈值低不超过该值的候选对也用精确的Jaccard相似度复核，64行签名的标准差约为0.06
+ESTIMATE_SLACK = 0.1
+
+# TODO 菜名中表示变体的修饰词，较长的先去掉
+NAME_MODIFIERS = sorted(set(MODIFIERS + ['家常版', '家庭', '简单的', '简单版', '简易版', '大众', '山寨版', '改良', '升级版']),
+                        key=len, reverse=True)
+
+PARTS = ('name', 'ingredients', 'steps')
+# TODO 参与相似度加权的特征，菜名只用于分桶
+SCORED_PARTS = PARTS[1:]
+
+NON_TEXT_RE = re.compile(r'[\s，。、；：:,.;！!？?（）()\-—~～]+')
+# TODO 编号后缀，例如红烧肉2号
+NUMBER_SUFFIX_RE = re.compile(r'\d+号$')
+
+
+def name_core(name):
+    """
+    去掉修饰词和编号后缀后的菜名，例如家常版鱼香肉丝 -> 鱼香肉丝；只相差修饰词的菜名core相同
+    """
+    core = NUMBER_SUFFIX_RE.sub('', name)
+    for m in NAME_MODIFIERS:
+        core = core.replace(m, '')
+    return core or name
+
+
+def name_shingles(name):
+    """
+    去掉修饰词后菜名的二字片段
+    """
+    core = name_core(name)
+    if len(core) < 2:
+        return {core}
+    return set(core[i:i + 2] for i in range(len(core) - 1))
+
+
+def ingredient_set(item):
+    return set(material_names(value for section in SECTIONS for value in item.get(section, [])))
+
+
+def step_shingles(item, k=3):
+    """
+    去掉步骤序号和标点后，步骤文本的k字符片段
+    """
+    text = ''.join(NON_TEXT_RE.sub('', STEP_NUMBER_RE.sub('', step)) for step in item.get('制作步骤', []))
+    if len(text) <= k:
+        return {text} if text else set()
+    return set(text[i:i + k] for i in range(len(text) - k + 1))
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / float(len(a | b))
+
+
+class MinHasher:
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, (1 << 61) - 1, num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, (1 << 61) - 1, num_perm, dtype=np.uint64)
+
+    def signature(self, features):
+        """
+        :param features: 字符串集合
+        :return: uint64数组，长度为num_perm；空集合的签名全部为MAX_HASH
+        """
+        if not features:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint64)
+        hv = np.array([zlib.crc32(f.encode('utf-8')) for f in features], dtype=np.uint64)
+        # TODO uint64乘法溢出时回绕，与datasketch的做法相同
+        phv = ((np.outer(hv, self.a) + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return phv.min(axis=0)
+
+
+def choose_bands(num_perm, threshold):
+    """
+    选择分段数b和每段行数r（b*r=num_perm），使S形曲线的拐点(1/b)^(1/r)最接近threshold
+    """
+    best = None
+    for r in range(1, num_perm + 1):
+        if num_perm % r:
+            continue
+        b = num_perm // r
+        gap = abs((1.0 / b) ** (1.0 / r) - threshold)
+        if best is None or gap < best[0]:
+            best = (gap, b, r)
+    return best[1], best[2]
+
+
+def estimate_similarity(signatures, left, right, batch_size=100000):
+    """
+    用MinHash签名估计Jaccard相似度
+    :param signatures: 签名矩阵，每行一个菜品
+    :param left: 候选对左侧菜品的下标数组
+    :param right: 候选对右侧菜品的下标数组
+    :return: float数组
+    """
+    result = np.empty(len(left), dtype=np.float64)
+    for s in range(0, len(left), batch_size):
+        e = s + batch_size
+        result[s:e] = (signatures[left[s:e]] == signatures[right[s:e]]).mean(axis=1)
+    return result
+
+
+def find_duplicates(items, threshold=0.2, weights=(0.7, 0.3), num_perm=64, shingle=3, max_bucket=200, seed=1):
+    """
+    :param items: {菜品名称: entities_item.json中的一项}，大类（带子菜品的项）不参与比较
+    :param threshold: 合并的相似度阈值
+    :param weights: 原料、步骤相似度的权重
+    :param max_bucket: 超过该大小的桶只与桶中的前max_bucket个菜品比较，避免常见的签名段导致平方级的比较
+    :return: (簇的列表, 统计信息)
+    """
+    start = time.perf_counter()
+    names = [name for name, item in items.items() if '子菜品' not in item]
+    features = [[name_shingles(n), ingredient_set(items[n]), step_shingles(items[n], shingle)] for n in names]
+
+    hasher = MinHasher(num_perm, seed)
+    bands, rows = choose_bands(num_perm, NAME_BAND_THRESHOLD)
+    signatures = [np.empty((len(names), num_perm), dtype=np.uint64) for _ in PARTS]
+    buckets = dict()
+    for i in range(len(names)):
+        for part in range(len(PARTS)):
+            signatures[part][i] = hasher.signature(features[i][part])
+        sig = signatures[0][i]
+        for band in range(bands):
+            key = (band, sig[band * rows:(band + 1) * rows].tobytes())
+            buckets.setdefault(key, list()).append(i)
+    signed = time.perf_counter()
+
+    # TODO 同一组菜品常常在多个段中落入同一个桶，成员相同的桶只展开一次
+    groups = set()
+    oversized = 0
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        if len(members) > max_bucket:
+            oversized += 1
+            members = members[:max_bucket]
+        groups.add(tuple(members))
+    pair_codes = [np.zeros(0, dtype=np.int64)]
+    for members in groups:
+        members = np.array(members, dtype=np.int64)
+        x, y = np.triu_indices(len(members), 1)
+        pair_codes.append(members[x] * len(names) + members[y])
+    pair_codes = np.unique(np.concatenate(pair_codes))
+    left, right = pair_codes // max(len(names), 1), pair_codes % max(len(names), 1)
+
+    # TODO 菜名多了菜品本身的字（红烧排骨面、土豆红烧排骨）或做法（红烧糖醋排骨）的不是同一道菜
+    cores = [name_core(n) for n in names]
+    same_name = np.array([cores[i] == cores[j] for i, j in zip(left.tolist(), right.tolist())],
+                         dtype=bool)
+    left, right = left[same_name], right[same_name]
+
+    total_weight = float(sum(weights))
+    estimated = np.zeros(len(left), dtype=np.float64)
+    for part, weight in zip(range(1, len(PARTS)), weights):
+        if weight > 0:
+            estimated += weight * estimate_similarity(signatures[part], left, right)
+    estimated /= total_weight
+
+    def score(i, j):
+        return sum(weight * jaccard(features[i][part], features[j][part])
+                   for part, weight in zip(range(1, len(PARTS)), weights)) / total_weight
+
+    # TODO 签名只用于筛选，是否合并按精确的Jaccard相似度判断
+    verified = [(i, j) for i, j, e in zip(left.tolist(), right.tolist(), estimated.tolist())
+                if e >= threshold - ESTIMATE_SLACK]
+    matched = [(i, j) for i, j in verified if score(i, j) >= threshold]
+
+    neighbors = dict()
+    for i, j in matched:
+        neighbors.setdefault(i, list()).append(j)
+        neighbors.setdefault(j, list()).append(i)
+
+    # TODO 名称最短的通常是基础做法，例如鱼香肉丝；别名必须与保留的菜品直接判定为重复
+    order = sorted(neighbors, key=lambda i: (len(names[i]), names[i]))
+    assigned = set()
+    clusters = list()
+    for keep in order:
+        if keep in assigned:
+            continue
+        members = sorted((i for i in neighbors[keep] if i not in assigned), key=lambda i: (len(names[i]), names[i]))
+        if not members:
+            continue
+        assigned.add(keep)
+        assigned.update(members)
+        clusters.append({
+            'canonical': names[keep],
+            'members': [dict([('name', names[i])] + [
+                (part + '_similarity', round(jaccard(features[keep][k], features[i][k]), 3))
+                for k, part in enumerate(PARTS)] + [('score', round(score(keep, i), 3))]) for i in members],
+        })
+    clusters.sort(key=lambda c: (-len(c['members']), c['canonical']))
+
+    stats = {
+        'dishes': len(names),
+        'bands': bands,
+        'rows': rows,
+        'buckets': len(buckets),
+        'oversized_buckets': oversized,
+        'candidate_pairs': len(pair_codes),
+        'all_pairs': len(names) * (len(names) - 1) // 2,
+        'same_name_pairs': len(left),
+        'verified_pairs': len(verified),
+        'duplicate_pairs': len(matched),
+        'clusters': len(clusters),
+        'aliases': sum(len(c['members']) for c in clusters),
+        'signature_s': round(signed - start, 3),
+        'total_s': round(time.perf_counter() - start, 3),
+    }
+    return clusters, stats
+
+
+def collapse(items, clusters):
+    """
+    去掉别名菜品，大类的子菜品改为保留的菜品
+    :return: 新的entities_item字典
+    """
+    aliases = {m['name']: c['canonical'] for c in clusters for m in c['members']}
+    result = dict()
+    for name, item in items.items():
+        if name in aliases:
+            continue
+        if '子菜品' in item:
+            subs = list()
+            for sub in item['子菜品']:
+                dish = sub.split('. ', 1)[-1]
+                dish = aliases.get(dish, dish)
+                if dish not in subs:
+                    subs.append(dish)
+            item = dict(item, 子菜品=['{}. {}'.format(i + 1, d) for i, d in enumerate(subs)])
+        result[name] = item
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='用MinHash LSH找出近似重复的菜品')
+    parser.add_argument('items', nargs='?', default='./visualization/entities_item.json')
+    parser.add_argument('--threshold', type=float, default=0.2, help='合并的相似度阈值')
+    parser.add_argument('--weights', type=float, nargs=2, default=[0.7, 0.3], help='原料、步骤相似度的权重')
+    parser.add_argument('--num-perm', type=int, default=64, help='MinHash签名的长度')
+    parser.add_argument('--shingle', type=int, default=3, help='步骤文本片段的长度')
+    parser.add_argument('--max-bucket', type=int, default=200)
+    parser.add_argument('--report', default=None, help='合并报告（JSON）')
+    parser.add_argument('--collapse', default=None, help='输出合并后的entities_item.json')
+    args = parser.parse_args()
+
+    with open(args.items, encoding='utf-8') as f:
+        items = json.load(f)
+    clusters, stats = find_duplicates(items, args.threshold, args.weights, args.num_perm, args.shingle,
+                                      args.max_bucket)
+    print('dishes: {dishes}, candidate pairs: {candidate_pairs} of {all_pairs}, same name: {same_name_pairs}, '
+          'duplicate pairs: {duplicate_pairs}, '
+          'clusters: {clusters}, aliases: {aliases}, cost {total_s}s'.format(**stats))
+    for c in clusters[:10]:
+        print('{}: {}'.format(c['canonical'], ', '.join(m['name'] for m in c['members'])))
+
+    if args.report is not None:
+        report = {'format': 'cookbook-dedup-report', 'version': 1, 'source': args.items,
+                  'threshold': args.threshold, 'weights': dict(zip(SCORED_PARTS, args.weights)),
+                  'num_perm': args.num_perm, 'shingle': args.shingle, 'stats': stats, 'clusters': clusters,
+                  'aliases': {m['name']: c['canonical'] for c in clusters for m in c['members']}}
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print('write path: {}'.format(args.report))
+    if args.collapse is not None:
+        collapsed = collapse(items, clusters)
+        with open(args.collapse, 'w', encoding='utf-8') as f:
+            json.dump(collapsed, f, ensure_ascii=False, indent=4)
+        print('{} -> {} entries, write path: {}'.format(len(items), len(collapsed), args.collapse))
@@ -0,0 +1,409 @@
+# encoding=utf-8
+
+"""
+
+@file: viz_export.py
+
+@time: 2026/10/19
+
+@desc: 把vizdata导出为紧凑格式，供index.html加载。
+
+紧凑格式把结点存成按列的表，边存成整数下标数组，关系名称用编号代替：
+{
+    "format": "cookbook-viz-compact", "version": 1,
+    "classes": ["菜品大类", "精品特色菜", "原料"],       # 下标即group
+    "relations": ["选材", "属于"],
+    "nodes": {"id": [...], "group": [...], "size": [...], "x": [...], "y": [...]},
+    "links": [source, target, relation, source, target, relation, ...],
+    "value": 3                                          # 所有边的value相同时只存一个，否则为列表
+}
+同时输出gzip和brotli（如果安装了brotli）预压缩文件。
+
+shard按菜品大类（group为0的结点）切分：每个大类一个分片，包含大类、属于它的菜品以及这些菜品的原料，
+不属于任何大类的菜品放在最后一个分片中。manifest.json只包含大类结点和各分片的文件名，
+index.html先加载manifest，用户点击大类后才加载对应的分片，首次加载的数据量与知识图谱的总规模无关。
+
+search生成搜索框使用的索引search.json（shard时同时生成）：对大类、菜品和原料名称的每个1~2字的子串建立倒排表，
+倒排表中是结点的下标（结点按名称长度排序，倒排表存相邻下标的差值）；每个结点记录它所在的分片。浏览器中查询词不超过2个字时直接查表，
+更长时取其中倒排表最短的2字子串再逐个验证，不需要扫描已加载的结点和边，也能找到尚未加载的分片中的结点。
+
+用法：
+python viz_export.py compact ./visualization/vizdata_mimini_aglin.json
+python viz_export.py shard ./visualization/vizdata_mimini_aglin.json
+python viz_export.py search ./visualization/vizdata_mimini_aglin.json
+python viz_export.py bench ./visualization/vizdata.json
+
+"""
+import argparse
+import gzip
+import json
+import os
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPACT_FORMAT = 'cookbook-viz-compact'
+COMPACT_VERSION = 1
+MANIFEST_FORMAT = 'cookbook-viz-manifest'
+MANIFEST_VERSION = 1
+SEARCH_FORMAT = 'cookbook-viz-search'
+SEARCH_VERSION = 1
+
+CATEGORY_GROUP = '0'
+
+DEFAULT_CLASSES = ['菜品大类', '精品特色菜', '原料']
+
+
+def to_compact(vizdata):
+    """
+    :param vizdata: {"links": [...], "nodes": [...]}
+    :return: 紧凑格式的字典
+    """
+    nodes = vizdata['nodes']
+    index = {node['id']: i for i, node in enumerate(nodes)}
+
+    classes = list(DEFAULT_CLASSES)
+    for node in nodes:
+        g = int(node['group'])
+        while len(classes) <= g:
+            classes.append('')
+        classes[g] = node.get('class', classes[g])
+
+    table = {
+        'id': [node['id'] for node in nodes],
+        'group': [int(node['group']) for node in nodes],
+        'size': [int(node['size']) for node in nodes],
+    }
+    if len(nodes) > 0 and 'x' in nodes[0]:
+        table['x'] = [node['x'] for node in nodes]
+        table['y'] = [node['y'] for node in nodes]
+
+    relations = list()
+    relation_code = dict()
+    links = list()
+    values = list()
+    for link in vizdata['links']:
+        code = relation_code.get(link['relation'])
+        if code is None:
+            code = relation_code[link['relation']] = len(relations)
+            relations.append(link['relation'])
+        links.extend((index[link['source']], index[link['target']], code))
+        values.append(link.get('value', 1))
+
+    return {
+        'format': COMPACT_FORMAT,
+        'version': COMPACT_VERSION,
+        'classes': classes,
+        'relations': relations,
+        'nodes': table,
+        'links': links,
+        'value': values[0] if len(set(values)) == 1 else values,
+    }
+
+
+def from_compact(compact):
+    """
+    还原为vizdata格式，与index.html中的decodeCompact相同
+    """
+    table = compact['nodes']
+    classes = compact['classes']
+    nodes = list()
+    for i, node_id in enumerate(table['id']):
+        g = table['group'][i]
+        node = {'class': classes[g], 'group': str(g), 'id': node_id, 'size': str(table['size'][i])}
+        if 'x' in table:
+            node['x'] = table['x'][i]
+            node['y'] = table['y'][i]
+        nodes.append(node)
+
+    value = compact['value']
+    links = list()
+    flat = compact['links']
+    for k in range(0, len(flat), 3):
+        links.append({
+            'relation': compact['relations'][flat[k + 2]],
+            'source': table['id'][flat[k]],
+            'target': table['id'][flat[k + 1]],
+            'value': value[k // 3] if isinstance(value, list) else value,
+        })
+    return {'links': links, 'nodes': nodes}
+
+
+def dumps_compact(compact):
+    return json.dumps(compact, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def write_variants(path, data):
+    """
+    写出原文件以及.gz、.br预压缩文件
+    :return: {path: size}
+    """
+    sizes = dict()
+    with open(path, 'wb') as f:
+        f.write(data)
+    sizes[path] = len(data)
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    with open(path + '.gz', 'wb') as f:
+        f.write(gz)
+    sizes[path + '.gz'] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        with open(path + '.br', 'wb') as f:
+            f.write(br)
+        sizes[path + '.br'] = len(br)
+    return sizes
+
+
+def compact_path(vizdata_path):
+    root, _ = os.path.splitext(vizdata_path)
+    return root + '.compact.json'
+
+
+def split_shards(vizdata):
+    """
+    按大类切分，同时属于多个大类的菜品和共用的原料会出现在多个分片中
+    :return: (大类结点列表, [(大类id或None, 分片的vizdata), ...])
+    """
+    nodes = {node['id']: node for node in vizdata['nodes']}
+    members = dict()
+    materials = dict()
+    for link in vizdata['links']:
+        if link['relation'] == '属于':
+            members.setdefault(link['source'], list()).append(link)
+        else:
+            materials.setdefault(link['source'], list()).append(link)
+
+    categories = [node for node in vizdata['nodes'] if node['group'] == CATEGORY_GROUP]
+    shards = list()
+    covered = set()
+    for category in categories:
+        links = list()
+        for link in members.get(category['id'], list()):
+            links.append(link)
+            links.extend(materials.get(link['target'], list()))
+        shards.append((category['id'], links))
+        covered.update(link['target'] for link in members.get(category['id'], list()))
+
+    # TODO 不属于任何大类的菜品
+    rest = list()
+    for node in vizdata['nodes']:
+        if node['group'] != CATEGORY_GROUP and node['id'] not in covered:
+            rest.extend(materials.get(node['id'], list()))
+    if rest:
+        shards.append((None, rest))
+
+    result = list()
+    for category_id, links in shards:
+        ids = dict.fromkeys([category_id] if category_id is not None else [])
+        for link in links:
+            ids[link['source']] = None
+            ids[link['target']] = None
+        result.append((category_id, {'links': links, 'nodes': [nodes[i] for i in ids if i in nodes]}))
+    return categories, result
+
+
+def search_name(node):
+    """
+    大类id形如"1-红烧肉类"，只索引名称部分
+    """
+    if node['group'] == CATEGORY_GROUP:
+        return node['id'].split('-', 1)[-1].lower()
+    return node['id'].lower()
+
+
+def delta_encode(postings):
+    return [postings[0]] + [b - a for a, b in zip(postings, postings[1:])]
+
+
+def delta_decode(deltas):
+    postings = list()
+    i = 0
+    for d in deltas:
+        i += d
+        postings.append(i)
+    return postings
+
+
+def build_search_index(vizdata, shards=None, max_gram=2):
+    """
+    :param vizdata:
+    :param shards: split_shards返回的分片，为None时不记录分片
+    :param max_gram: 子串的最大长度
+    :return: 索引字典
+    """
+    nodes = sorted(vizdata['nodes'], key=lambda node: (len(search_name(node)), node['id']))
+    located = dict()
+    for k, (_, shard) in enumerate(shards or list()):
+        for node in shard['nodes']:
+            located.setdefault(node['id'], list()).append(k)
+
+    grams = dict()
+    for i, node in enumerate(nodes):
+        name = search_name(node)
+        seen = set()
+        for n in range(1, max_gram + 1):
+            for start in range(len(name) - n + 1):
+                gram = name[start:start + n]
+                if gram not in seen:
+                    seen.add(gram)
+                    grams.setdefault(gram, list()).append(i)
+
+    index = {
+        'format': SEARCH_FORMAT,
+        'version': SEARCH_VERSION,
+        'max_gram': max_gram,
+        'ids': [node['id'] for node in nodes],
+        'groups': [int(node['group']) for node in nodes],
+        'grams': {gram: delta_encode(postings) for gram, postings in grams.items()},
+    }
+    if shards is not None:
+        # TODO 只在一个分片中的结点直接存分片编号
+        index['shards'] = [located.get(node['id'], list()) for node in nodes]
+        index['shards'] = [s[0] if len(s) == 1 else s for s in index['shards']]
+    return index
+
+
+def search(index, query, limit=None):
+    """
+    与index.html中的searchIndex相同
+    :return: 匹配的结点下标，按名称长度排序
+    """
+    query = query.lower()
+    max_gram = index['max_gram']
+    if len(query) <= max_gram:
+        hits = delta_decode(index['grams'].get(query, list()))
+    else:
+        postings = [index['grams'].get(query[i:i + max_gram], list())
+                    for i in range(len(query) - max_gram + 1)]
+        ids = index['ids']
+        groups = index['groups']
+        hits = [i for i in delta_decode(min(postings, key=len))
+                if query in search_name({'id': ids[i], 'group': str(groups[i])})]
+    return hits if limit is None else hits[:limit]
+
+
+def write_shards(vizdata, output_dir, compress=False):
+    """
+    写出分片、manifest.json和search.json
+    :return: manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    categories, shards = split_shards(vizdata)
+    compact = to_compact({'links': [], 'nodes': categories})
+
+    files = list()
+    for k, (category_id, shard) in enumerate(shards):
+        name = '{}.json'.format(k)
+        data = dumps_compact(to_compact(shard))
+        if compress:
+            write_variants(os.path.join(output_dir, name), data)
+        else:
+            with open(os.path.join(output_dir, name), 'wb') as f:
+                f.write(data)
+        files.append({'file': name, 'category': category_id, 'nodes': len(shard['nodes']),
+                      'links': len(shard['links']), 'bytes': len(data)})
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'version': MANIFEST_VERSION,
+        'classes': compact['classes'],
+        'categories': compact['nodes'],
+        'shards': files,
+    }
+    data = dumps_compact(manifest)
+    with open(os.path.join(output_dir, 'manifest.json'), 'wb') as f:
+        f.write(data)
+    data = dumps_compact(build_search_index(vizdata, shards))
+    if compress:
+        write_variants(os.path.join(output_dir, 'search.json'), data)
+    else:
+        with open(os.path.join(output_dir, 'search.json'), 'wb') as f:
+            f.write(data)
+    return manifest
+
+
+def shard_dir(vizdata_path):
+    root, _ = os.path.splitext(vizdata_path)
+    return root + '_shards'
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(vizdata_path, repeat=5):
+    """
+    比较原始格式、压缩空白的JSON和紧凑格式的大小和解析时间
+    :return: [(格式, 原始大小, gzip大小, brotli大小, 解析时间), ...]
+    """
+    with open(vizdata_path, 'rb') as f:
+        original = f.read()
+    vizdata = json.loads(original)
+    minified = json.dumps(vizdata, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    compact = dumps_compact(to_compact(vizdata))
+
+    rows = list()
+    for name, data, decode in [('original', original, json.loads),
+                               ('minified', minified, json.loads),
+                               ('compact', compact, lambda d: from_compact(json.loads(d)))]:
+        gz = len(gzip.compress(data, compresslevel=9))
+        br = len(brotli.compress(data, quality=11)) if brotli is not None else None
+        rows.append((name, len(data), gz, br, best_time(lambda: decode(data), repeat)))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出可视化数据')
+    sub = parser.add_subparsers(dest='command')
+    p = sub.add_parser('compact', help='导出紧凑格式及预压缩文件')
+    p.add_argument('vizdata')
+    p.add_argument('--output', default=None, help='默认为<vizdata>.compact.json')
+    p = sub.add_parser('shard', help='按大类切分为分片和manifest')
+    p.add_argument('vizdata')
+    p.add_argument('--output', default=None, help='默认为<vizdata>_shards目录')
+    p.add_argument('--compress', action='store_true', help='同时输出预压缩文件')
+    p = sub.add_parser('search', help='生成不分片数据的搜索索引')
+    p.add_argument('vizdata')
+    p.add_argument('--output', default=None, help='默认为<vizdata>.search.json')
+    p.add_argument('--max-gram', type=int, default=2)
+    p = sub.add_parser('bench', help='比较各格式的大小和解析时间')
+    p.add_argument('vizdata')
+    p.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        with open(args.vizdata, encoding='utf-8') as f:
+            vizdata = json.load(f)
+        output = args.output or compact_path(args.vizdata)
+        for path, size in write_variants(output, dumps_compact(to_compact(vizdata))).items():
+            print('write path: {} ({} bytes)'.format(path, size))
+    elif args.command == 'shard':
+        with open(args.vizdata, encoding='utf-8') as f:
+            vizdata = json.load(f)
+        output = args.output or shard_dir(args.vizdata)
+        manifest = write_shards(vizdata, output, args.compress)
+        sizes = [s['bytes'] for s in manifest['shards']]
+        print('{} shards, max {} bytes, total {} bytes'.format(len(sizes), max(sizes or [0]), sum(sizes)))
+        print('write path: {}'.format(output))
+    elif args.command == 'search':
+        with open(args.vizdata, encoding='utf-8') as f:
+            vizdata = json.load(f)
+        root, _ = os.path.splitext(args.vizdata)
+        output = args.output or root + '.search.json'
+        index = build_search_index(vizdata, max_gram=args.max_gram)
+        for path, size in write_variants(output, dumps_compact(index)).items():
+            print('write path: {} ({} bytes)'.format(path, size))
+    elif args.command == 'bench':
+        print('{:<10}{:>12}{:>12}{:>12}{:>14}'.format('format', 'raw', 'gzip', 'brotli', 'parse(ms)'))
+        for name, raw, gz, br, t in bench(args.vizdata, args.repeat):
+            print('{:<10}{:>12}{:>12}{:>12}{:>14.2f}'.format(name, raw, gz, br if br is not None else '-', t * 1000))
+    else:
+        parser.print_help()
@@ -0,0 +1,173 @@
+# encoding=utf-8
+
+"""
+
+@file: viz_layout.py
+
+@time: 2026/10/19
+
+@desc: 离线计算可视化数据的力导向布局，把结点坐标x、y写回vizdata文件。
+
+力的定义和参数与index.html中的d3.forceSimulation相同（forceLink、forceManyBody、forceCenter，
+300次迭代），用numpy对所有结点同时计算。结点数不超过--exact-max时斥力逐对精确计算，
+否则把结点划分到网格中，每个结点只与各网格的质心计算斥力（单层的Barnes-Hut近似）。
+index.html读到带坐标的数据时直接绘制，不再在浏览器里运行力模拟。
+
+用法：
+python viz_layout.py ./visualization/vizdata_mimini_aglin.json
+python viz_layout.py ./synthetic/10000/vizdata.json --output ./synthetic/10000/vizdata_layout.json
+
+"""
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+# TODO 与index.html中svg1的大小和d3的默认参数一致
+WIDTH = 860
+HEIGHT = 560
+LINK_DISTANCE = 30.0
+CHARGE_STRENGTH = -30.0
+VELOCITY_DECAY = 0.6
+ALPHA_MIN = 0.001
+ITERATIONS = 300
+
+
+def initial_positions(n):
+    """
+    d3的初始布局：按黄金角排列的螺旋
+    """
+    i = np.arange(n, dtype=np.float64)
+    radius = 10.0 * np.sqrt(0.5 + i)
+    angle = i * math.pi * (3 - math.sqrt(5))
+    return np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+
+
+def link_force(pos, vel, src, dst, bias, strength, alpha):
+    delta = (pos[dst] + vel[dst]) - (pos[src] + vel[src])
+    dist = np.sqrt((delta ** 2).sum(axis=1))
+    dist[dist == 0] = 1e-6
+    k = (dist - LINK_DISTANCE) / dist * alpha * strength
+    delta *= k[:, None]
+    np.add.at(vel, dst, -delta * bias[:, None])
+    np.add.at(vel, src, delta * (1 - bias)[:, None])
+
+
+def repulsion(p, targets, mass, alpha):
+    """
+    targets中各点（质量为mass）对p中各结点的斥力产生的速度增量。
+    sum(w * (t - p)) 写成 w @ t - p * sum(w)，避免生成n*m*2的中间数组
+    """
+    dx = targets[None, :, 0] - p[:, 0, None]
+    dy = targets[None, :, 1] - p[:, 1, None]
+    l = dx * dx + dy * dy
+    # TODO 与d3相同，距离过近时限制力的大小；重合的点（包括结点自身）不产生斥力
+    l = np.where(l < 1.0, np.sqrt(l), l)
+    l[l == 0] = np.inf
+    w = (CHARGE_STRENGTH * alpha) * mass[None, :] / l
+    return w @ targets - p * w.sum(axis=1)[:, None], w
+
+
+def charge_exact(pos, vel, alpha, block=1024):
+    """
+    逐对计算斥力，分块以控制内存
+    """
+    ones = np.ones(len(pos))
+    for start in range(0, len(pos), block):
+        dv, _ = repulsion(pos[start:start + block], pos, ones, alpha)
+        vel[start:start + block] += dv
+
+
+def charge_grid(pos, vel, alpha, cells=64, block=1024):
+    """
+    网格近似：每个结点只与所有网格的质心计算斥力
+    """
+    lo = pos.min(axis=0)
+    span = np.maximum(pos.max(axis=0) - lo, 1e-6)
+    idx = np.minimum(((pos - lo) / span * cells).astype(np.int64), cells - 1)
+    cell = idx[:, 0] * cells + idx[:, 1]
+    mass = np.bincount(cell, minlength=cells * cells).astype(np.float64)
+    cx = np.bincount(cell, weights=pos[:, 0], minlength=cells * cells)
+    cy = np.bincount(cell, weights=pos[:, 1], minlength=cells * cells)
+    used = mass > 0
+    mass, cx, cy = mass[used], cx[used], cy[used]
+    centroids = np.stack([cx / mass, cy / mass], axis=1)
+    own = np.searchsorted(np.flatnonzero(used), cell)
+
+    for start in range(0, len(pos), block):
+        p = pos[start:start + block]
+        dv, w = repulsion(p, centroids, mass, alpha)
+        # TODO 结点自身所在的网格去掉自己的质量
+        rows = np.arange(len(p))
+        own_cell = own[start:start + block]
+        w_own = w[rows, own_cell] / mass[own_cell]
+        dv -= w_own[:, None] * (centroids[own_cell] - p)
+        vel[start:start + block] += dv
+
+
+def layout(vizdata, iterations=ITERATIONS, exact_max=5000, width=WIDTH, height=HEIGHT):
+    """
+    计算布局，直接修改vizdata中的结点，增加x、y
+    :return: 迭代次数
+    """
+    nodes = vizdata['nodes']
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    links = [(index[l['source']], index[l['target']]) for l in vizdata['links']
+             if l['source'] in index and l['target'] in index]
+    n = len(nodes)
+    if n == 0:
+        return 0
+
+    src = np.array([s for s, _ in links], dtype=np.int64)
+    dst = np.array([t for _, t in links], dtype=np.int64)
+    count = np.bincount(np.concatenate([src, dst]), minlength=n).astype(np.float64)
+    bias = count[src] / (count[src] + count[dst])
+    strength = 1.0 / np.minimum(count[src], count[dst])
+
+    pos = initial_positions(n)
+    vel = np.zeros_like(pos)
+    center = np.array([width / 2.0, height / 2.0])
+    alpha = 1.0
+    alpha_decay = 1 - ALPHA_MIN ** (1.0 / ITERATIONS)
+
+    for _ in range(iterations):
+        alpha += (0 - alpha) * alpha_decay
+        if len(links) > 0:
+            link_force(pos, vel, src, dst, bias, strength, alpha)
+        if n <= exact_max:
+            charge_exact(pos, vel, alpha)
+        else:
+            charge_grid(pos, vel, alpha)
+        pos -= pos.mean(axis=0) - center
+        vel *= VELOCITY_DECAY
+        pos += vel
+
+    for node, (x, y) in zip(nodes, pos):
+        node['x'] = round(float(x), 2)
+        node['y'] = round(float(y), 2)
+    return iterations
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='离线计算vizdata的力导向布局')
+    parser.add_argument('vizdata')
+    parser.add_argument('--output', default=None, help='默认写回输入文件')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--exact-max', type=int, default=5000,
+                        help='结点数超过该值时斥力使用网格近似')
+    parser.add_argument('--indent', type=int, default=4)
+    args = parser.parse_args()
+
+    with open(args.vizdata, encoding='utf-8') as f:
+        vizdata = json.load(f)
+    start = time.time()
+    layout(vizdata, args.iterations, args.exact_max)
+    print('{} nodes, {} links, cost {:.1f}s'.format(len(vizdata['nodes']), len(vizdata['links']),
+                                                  time.time() - start))
+
+    output = args.output or args.vizdata
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(vizdata, f, ensure_ascii=False, indent=args.indent)
+    print('write path: {}'.format(output))